@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - API Call Scheduler
+
+Every Google API call goes through one process-wide scheduler. Each API has
+a token bucket sized to its quota and a concurrency limit; retryable failures
+(429/RESOURCE_EXHAUSTED, 5xx, timeouts) are retried with exponential backoff
+and full jitter. Throttling halves the API's concurrency and slows its bucket,
+and both recover additively as calls succeed, so throughput settles just
+under the quota ceiling. Calls, retries, throttles and failures are counted
+per API for the run summary.
+"""
+import random
+import socket
+import threading
+import time
+from telemetry import get_tracer
+
+# Sustained requests per second and burst size per API, kept under the default quotas
+API_RATE_LIMITS = {
+    'sqladmin': (10.0, 20),
+    'monitoring': (50.0, 100),
+    'cloudasset': (6.0, 10),
+    'cloudresourcemanager': (10.0, 20)
+}
+DEFAULT_RATE_LIMIT = (10.0, 20)
+
+# Concurrent calls per API: starting point and ceiling of the adaptive limit
+INITIAL_CONCURRENCY = 8
+MAX_CONCURRENCY = 32
+
+# Retry policy
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# Throttling multiplies an API's rate by this; each success wins back RATE_RECOVERY of the configured rate
+THROTTLE_RATE_FACTOR = 0.7
+RATE_RECOVERY = 0.01
+MIN_RATE_FRACTION = 0.05
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+THROTTLE_MARKERS = ('RESOURCE_EXHAUSTED', 'rateLimitExceeded', 'userRateLimitExceeded', 'Quota exceeded')
+
+def _status(exc):
+    """HTTP status of an API error: googleapiclient HttpError or google.api_core exception."""
+    status = getattr(getattr(exc, 'resp', None), 'status', None)
+    if status is None:
+        status = getattr(exc, 'code', None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+def is_throttle(exc):
+    """Whether the error means the API quota was exceeded."""
+    if _status(exc) == 429:
+        return True
+    return any(marker in str(exc) for marker in THROTTLE_MARKERS)
+
+def is_retryable(exc):
+    """Whether the call may succeed if repeated (throttling, server errors, timeouts)."""
+    if is_throttle(exc) or _status(exc) in RETRYABLE_STATUS:
+        return True
+    return isinstance(exc, (socket.timeout, ConnectionError, TimeoutError))
+
+def _retry_after(exc):
+    """Seconds asked for by a Retry-After header, if any."""
+    headers = getattr(exc, 'resp', None)
+    try:
+        return float(headers.get('retry-after')) if headers is not None and headers.get('retry-after') else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+def _method_name(func):
+    """Telemetry name of an API call: a discovery request's methodId, else the function name."""
+    method_id = getattr(getattr(func, '__self__', None), 'methodId', None)
+    if method_id:
+        return method_id.split('.', 1)[-1]
+    return getattr(func, '__name__', 'call')
+
+def backoff_delay(attempt, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS):
+    """Full-jitter exponential backoff for the given retry attempt (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until the tokens are available."""
+    
+    def __init__(self, rate, burst):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def acquire(self, tokens=1):
+        """Take tokens, sleeping while the bucket is short; returns the seconds waited."""
+        tokens = min(float(tokens), self.burst)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+    
+    def throttled(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate * THROTTLE_RATE_FACTOR)
+    
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY)
+
+class ApiLimiter:
+    """Quota, adaptive concurrency and counters of one API."""
+    
+    def __init__(self, api, rate, burst, concurrency=INITIAL_CONCURRENCY, max_concurrency=MAX_CONCURRENCY):
+        self.api = api
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(min(concurrency, max_concurrency))
+        self._in_flight = 0
+        self._slots = threading.Condition()
+        self.calls = 0
+        self.retries = 0
+        self.throttles = 0
+        self.failures = 0
+        self.wait_seconds = 0.0
+    
+    def acquire(self, cost=1):
+        start = time.monotonic()
+        with self._slots:
+            while self._in_flight >= int(self.concurrency):
+                self._slots.wait()
+            self._in_flight += 1
+            self.calls += 1
+        self.bucket.acquire(cost)
+        waited = time.monotonic() - start
+        with self._slots:
+            self.wait_seconds += waited
+    
+    def release(self, throttled=False):
+        with self._slots:
+            self._in_flight -= 1
+            if throttled:
+                # Multiplicative decrease, additive increase (one slot per limit's worth of successes)
+                self.throttles += 1
+                self.concurrency = max(1.0, self.concurrency / 2)
+            else:
+                self.concurrency = min(float(self.max_concurrency), self.concurrency + 1 / self.concurrency)
+            self._slots.notify_all()
+        if throttled:
+            self.bucket.throttled()
+        else:
+            self.bucket.succeeded()
+    
+    def summary(self):
+        return (f"{self.api}: {self.calls} calls, {self.retries} retries ({self.throttles} throttled), "
+                f"{self.failures} failed, {self.wait_seconds:.1f}s waiting for quota, "
+                f"concurrency {int(self.concurrency)}, {self.bucket.rate:.1f} req/s")
+
+class ApiScheduler:
+    """Runs API calls under per-API limiters with retry and backoff."""
+    
+    def __init__(self, rate_limits=None, max_retries=MAX_RETRIES):
+        self.rate_limits = dict(API_RATE_LIMITS if rate_limits is None else rate_limits)
+        self.max_retries = max_retries
+        self._limiters = {}
+        self._lock = threading.Lock()
+    
+    def limiter(self, api):
+        limiter = self._limiters.get(api)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(api)
+                if limiter is None:
+                    rate, burst = self.rate_limits.get(api, DEFAULT_RATE_LIMIT)
+                    limiter = self._limiters[api] = ApiLimiter(api, rate, burst)
+        return limiter
+    
+    def call(self, api, func, *args, cost=1, method=None, **kwargs):
+        """Call func(*args, **kwargs) as a request to api, retrying retryable errors.
+        
+        cost is the number of quota units the call uses (e.g. the size of an
+        HTTP batch). method names the call in telemetry (default: the
+        request's methodId or the function name). The last error is raised
+        once retries are exhausted.
+        """
+        limiter = self.limiter(api)
+        tracer = get_tracer()
+        if tracer is not None and method is None:
+            method = _method_name(func)
+        attempt = 0
+        while True:
+            limiter.acquire(cost)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if tracer is not None:
+                    tracer.record_rpc(api, method, start, time.perf_counter(), error=True)
+                throttled = is_throttle(e)
+                limiter.release(throttled)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    with limiter._slots:
+                        limiter.failures += 1
+                    if tracer is not None:
+                        tracer.count(f"{api}.failures")
+                    raise
+                attempt += 1
+                with limiter._slots:
+                    limiter.retries += 1
+                if tracer is not None:
+                    tracer.count(f"{api}.retries")
+                    if throttled:
+                        tracer.count(f"{api}.throttles")
+                time.sleep(max(backoff_delay(attempt), _retry_after(e) or 0))
+                continue
+            if tracer is not None:
+                tracer.record_rpc(api, method, start, time.perf_counter())
+            limiter.release()
+            return result
+    
+    def stats(self):
+        """{api: ApiLimiter} of every API called so far."""
+        return dict(self._limiters)
+    
+    def print_summary(self):
+        """Print per-API call, retry and throttle counts."""
+        if not self._limiters:
+            return
+        print("API calls:")
+        for api in sorted(self._limiters):
+            print(f"  {self._limiters[api].summary()}")
+        failures = sum(limiter.failures for limiter in self._limiters.values())
+        if failures:
+            print(f"  Warning: {failures} calls failed after retries; affected instances may be missing details or metrics")
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_api_scheduler():
+    """The process-wide scheduler shared by every API module."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ApiScheduler()
+    return _scheduler
+
+def set_api_scheduler(scheduler):
+    """Replace the process-wide scheduler (e.g. one without quota limits for benchmarks)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+
+def call_api(api, func, *args, **kwargs):
+    """Run one API call through the shared scheduler (see ApiScheduler.call)."""
+    return get_api_scheduler().call(api, func, *args, **kwargs)
@@ -2,44 +2,113 @@
 """
 Cloud SQL Inventory - Asset Search
 """
-from google.cloud import asset_v1
-import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from clients import get_asset_client
+from api_scheduler import call_api, is_retryable
+import telemetry
 
-def search_sql_instances(credentials, scope):
-    """Search for SQL instances across projects using Cloud Asset API."""
-    client = asset_v1.AssetServiceClient(credentials=credentials)
+logger = logging.getLogger(__name__)
+
+def _search_page(client, scope, page_token=""):
+    """One page of the Cloud Asset search for SQL instances under scope: (results, next page token).
     
+    Every page is its own scheduled (throttled and retried) API call; the
+    pager's first response holds exactly the page that was requested.
+    """
     # Use empty query string - filtering happens via asset_types parameter
     query = ""
     
-    print(f"Searching for Cloud SQL instances across {scope}...")
-    try:
-        response = client.search_all_resources(
-            request={
-                "scope": scope,
-                "query": query,
-                "asset_types": ["sqladmin.googleapis.com/Instance"],
-            }
-        )
-        
-        sql_instances = []
-        for result in response:
+    request = {
+        "scope": scope,
+        "query": query,
+        "asset_types": ["sqladmin.googleapis.com/Instance"],
+    }
+    if page_token:
+        request["page_token"] = page_token
+    response = call_api('cloudasset', client.search_all_resources, request=request)
+    return list(response.results), response.next_page_token
+
+def _iter_sql_instances(client, scope, first_page):
+    """Yield instance records page by page, starting from first_page.
+    
+    A later page that still fails after the scheduler's retries raises, so a
+    truncated search is never mistaken for the complete one.
+    """
+    results, page_token = first_page
+    while True:
+        for result in results:
             # Extract project from resource name format: //cloudsql.googleapis.com/projects/{project}/instances/{instance}
             # or //sqladmin.googleapis.com/projects/{project}/instances/{instance}
             resource_name = result.name
             project_id = resource_name.split('/')[4] if '/projects/' in resource_name else None
             
             if project_id:
-                instance_data = {
+                yield {
                     "name": result.display_name,
                     "project_id": project_id,
                     "resource_name": resource_name,
                     "location": result.location,
-                    "raw_resource": json.loads(result.additional_attributes.value) if result.additional_attributes else {}
+                    "update_time": result.update_time.isoformat() if result.update_time else "",
                 }
-                sql_instances.append(instance_data)
-            
-        return sql_instances
+        if not page_token:
+            return
+        results, page_token = _search_page(client, scope, page_token)
+
+def iter_sql_instances(credentials, scope, client=None):
+    """Stream SQL instances under scope using Cloud Asset API.
+    
+    A scope that can't be searched (e.g. access denied) yields nothing;
+    transient errors that outlast the retries raise.
+    """
+    client = client or get_asset_client(credentials)
+    
+    logger.info("Searching for Cloud SQL instances across %s...", scope)
+    try:
+        first_page = _search_page(client, scope)
     except Exception as e:
-        print(f"Error searching for SQL instances: {str(e)}")
-        return []
\ No newline at end of file
+        if is_retryable(e):
+            raise
+        logger.warning("Error searching for SQL instances in %s: %s", scope, e)
+        return iter(())
+    return _iter_sql_instances(client, scope, first_page)
+
+def search_sql_instances(credentials, scope, client=None):
+    """Search for SQL instances across projects using Cloud Asset API."""
+    return list(iter_sql_instances(credentials, scope, client))
+
+def search_scope_sql_instances(credentials, scope):
+    """Stream an organizations/{id} or folders/{id} scope as a single paginated search.
+    
+    Returns None when the scope can't be searched (e.g. the caller only has
+    project-level access) so the caller can fall back to per-project search.
+    """
+    client = get_asset_client(credentials)
+    
+    logger.info("Searching for Cloud SQL instances across %s...", scope)
+    try:
+        first_page = _search_page(client, scope)
+    except Exception as e:
+        logger.warning("Error searching %s, falling back to per-project search: %s", scope, e)
+        return None
+    return _iter_sql_instances(client, scope, first_page)
+
+def search_projects_sql_instances(credentials, project_ids, max_workers=1):
+    """Stream SQL instances of each project, searched concurrently over one shared client.
+    
+    Projects are yielded in the order given.
+    """
+    client = get_asset_client(credentials)
+    
+    def search_project(project_id):
+        with telemetry.span('asset_search', project_id=project_id):
+            return search_sql_instances(credentials, f"projects/{project_id}", client=client)
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for project_id, sql_instances in zip(project_ids, executor.map(search_project, project_ids)):
+            if sql_instances:
+                logger.info("Found %d Cloud SQL instances in project %s.", len(sql_instances), project_id)
+                yield from sql_instances
+            else:
+                logger.info("No Cloud SQL instances found in project %s.", project_id)
+                telemetry.count('asset_search.empty_projects')
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - Benchmark Suite
+
+Times collection, the optimizer, CSV output and table rendering against
+synthetic fleets served by fake_gcp, and records peak traced memory. Results
+are written as JSON; a previous results file can be given as a baseline, and
+the run fails when any benchmark got slower or bigger by more than the
+threshold:
+
+    python benchmarks.py --sizes 100,1000,10000 --output bench.json
+    python benchmarks.py --sizes 100,1000,10000 --baseline bench.json --threshold 0.2
+
+process_sql_instances_default times collection as `main.py collect` runs
+it by default: with percentiles, over a metrics store that an untimed first
+run has already backfilled, as on every scheduled run after the first.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from api_scheduler import API_RATE_LIMITS, ApiScheduler, get_api_scheduler, set_api_scheduler
+from asset_search import search_projects_sql_instances
+from clients import set_backend
+from columnar_optimizer import generate_optimization_report_frame
+from csvToTable import convert_csv_to_table
+from fake_gcp import FakeBackend, generate_fleet
+from metrics_store import MetricsStore
+from output import save_to_csv
+from sql_details import process_sql_instances, INVENTORY_FIELDS
+from sql_optimizer import generate_optimization_report, generate_cost_saving_estimate, get_instance_recommendations
+
+BENCHMARKS = (
+    'process_sql_instances',
+    'process_sql_instances_default',
+    'generate_optimization_report',
+    'generate_optimization_report_frame',
+    'generate_cost_saving_estimate',
+    'save_to_csv',
+    'convert_csv_to_table'
+)
+
+DEFAULT_SIZES = (100, 1000, 10000)
+INSTANCES_PER_PROJECT = 50
+
+# Simulated API round trip and collection concurrency
+DEFAULT_LATENCY_SECONDS = 0.02
+DEFAULT_WORKERS = 16
+# Timed runs per benchmark; the best is reported
+DEFAULT_REPEAT = 3
+
+# Relative slowdown (or memory growth) that counts as a regression
+DEFAULT_THRESHOLD = 0.2
+# Timings below this are too noisy to compare
+MIN_COMPARABLE_SECONDS = 0.01
+
+def _measure(func, repeat, memory):
+    """Best and mean wall time over repeat runs, plus the peak traced memory of one more run."""
+    times = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return min(times), sum(times) / len(times), peak
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(sizes=DEFAULT_SIZES, benchmarks=BENCHMARKS, latency=DEFAULT_LATENCY_SECONDS, workers=DEFAULT_WORKERS,
+              repeat=DEFAULT_REPEAT, memory=True, percentiles=False, seed=0):
+    """Run the benchmarks on a synthetic fleet of each size; returns the results document."""
+    results = []
+    previous_scheduler = get_api_scheduler()
+    # Quota pacing would measure the rate limits, not the code
+    set_api_scheduler(ApiScheduler({api: (1e9, 1e9) for api in API_RATE_LIMITS}))
+    
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, 'w') as devnull:
+        try:
+            for size in sizes:
+                projects = -(-size // INSTANCES_PER_PROJECT)
+                fleet = generate_fleet(projects, INSTANCES_PER_PROJECT, seed=seed)
+                set_backend(FakeBackend(fleet, latency=latency, page_size=500, seed=seed))
+                
+                with contextlib.redirect_stdout(devnull):
+                    instances = list(search_projects_sql_instances(None, fleet.projects, max_workers=workers))[:size]
+                    records = process_sql_instances(instances, None, max_workers=workers, percentiles=percentiles)
+                frame = pd.DataFrame.from_records(records)
+                recommendations = [(record, get_instance_recommendations(record)) for record in records]
+                csv_path = os.path.join(workdir, f"inventory_{size}.csv")
+                
+                store = None
+                if 'process_sql_instances_default' in benchmarks:
+                    store = MetricsStore(os.path.join(workdir, f"metrics_{size}.db"))
+                    with contextlib.redirect_stdout(devnull):
+                        process_sql_instances(instances, None, max_workers=workers, percentiles=True, metrics_store=store)
+                
+                cases = {
+                    'process_sql_instances': lambda: process_sql_instances(instances, None, max_workers=workers,
+                                                                           percentiles=percentiles),
+                    'process_sql_instances_default': lambda: process_sql_instances(instances, None, max_workers=workers,
+                                                                                   percentiles=True, metrics_store=store),
+                    'generate_optimization_report': lambda: generate_optimization_report(records),
+                    'generate_optimization_report_frame': lambda: generate_optimization_report_frame(frame),
+                    'generate_cost_saving_estimate': lambda: [
+                        generate_cost_saving_estimate(record, recs) for record, recs in recommendations
+                    ],
+                    'save_to_csv': lambda: save_to_csv(records, csv_path, fieldnames=INVENTORY_FIELDS),
+                    'convert_csv_to_table': lambda: convert_csv_to_table(csv_path)
+                }
+                if 'convert_csv_to_table' in benchmarks and 'save_to_csv' not in benchmarks:
+                    with contextlib.redirect_stdout(devnull):
+                        save_to_csv(records, csv_path, fieldnames=INVENTORY_FIELDS)
+                
+                for name in benchmarks:
+                    with contextlib.redirect_stdout(devnull):
+                        best, mean, peak = _measure(cases[name], repeat, memory)
+                    result = {
+                        'benchmark': name,
+                        'size': size,
+                        'seconds': round(best, 6),
+                        'mean_seconds': round(mean, 6),
+                        'per_instance_us': round(best / size * 1e6, 3),
+                        'peak_memory_mb': round(peak / 2**20, 3) if peak is not None else None
+                    }
+                    results.append(result)
+                    memory_text = f", peak {result['peak_memory_mb']:.1f} MB" if peak is not None else ''
+                    print(f"{name:<36} {size:>7} instances: {best:8.3f}s{memory_text}")
+                if store is not None:
+                    store.close()
+        finally:
+            set_backend(None)
+            set_api_scheduler(previous_scheduler)
+    
+    return {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'latency_seconds': latency,
+            'workers': workers,
+            'repeat': repeat,
+            'percentiles': percentiles
+        },
+        'results': results
+    }
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Print each benchmark against the baseline; returns the regressions beyond threshold."""
+    previous = {(result['benchmark'], result['size']): result for result in baseline.get('results', [])}
+    regressions = []
+    
+    print(f"{'benchmark':<36} {'size':>7} {'baseline':>10} {'current':>10} {'change':>8}")
+    for result in results['results']:
+        old = previous.get((result['benchmark'], result['size']))
+        if old is None:
+            continue
+        
+        time_change = result['seconds'] / old['seconds'] - 1 if old['seconds'] else 0.0
+        slower = time_change > threshold and max(result['seconds'], old['seconds']) >= MIN_COMPARABLE_SECONDS
+        memory_change = None
+        bigger = False
+        if result.get('peak_memory_mb') and old.get('peak_memory_mb'):
+            memory_change = result['peak_memory_mb'] / old['peak_memory_mb'] - 1
+            bigger = memory_change > threshold
+        
+        flag = '  REGRESSION' if slower or bigger else ''
+        memory_text = f" (memory {memory_change:+.0%})" if memory_change is not None else ''
+        print(f"{result['benchmark']:<36} {result['size']:>7} {old['seconds']:>9.3f}s {result['seconds']:>9.3f}s "
+              f"{time_change:>+8.0%}{memory_text}{flag}")
+        if slower or bigger:
+            regressions.append((result, old))
+    return regressions
+
+def main(argv=None):
+    """Command line: run the suite, write JSON results and optionally check them against a baseline."""
+    parser = argparse.ArgumentParser(description="Benchmark the Cloud SQL inventory tool on synthetic fleets.")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated fleet sizes (e.g. 100,1000,10000,100000)")
+    parser.add_argument('--only', help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY_SECONDS, help="simulated API round trip in seconds")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="collection concurrency")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="timed runs per benchmark (best is kept)")
+    parser.add_argument('--percentiles', action='store_true', help="collect 5-minute points and percentiles")
+    parser.add_argument('--no-memory', action='store_true', help="skip the traced peak-memory run")
+    parser.add_argument('--seed', type=int, default=0, help="synthetic fleet seed")
+    parser.add_argument('--output', default='benchmark_results.json', help="where to write the JSON results")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown or memory growth that fails the run (default 0.2)")
+    args = parser.parse_args(argv)
+    
+    benchmarks = BENCHMARKS
+    if args.only:
+        benchmarks = tuple(name.strip() for name in args.only.split(',') if name.strip())
+        unknown = [name for name in benchmarks if name not in BENCHMARKS]
+        if unknown:
+            parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    
+    results = run_suite(sizes, benchmarks, args.latency, args.workers, args.repeat, not args.no_memory,
+                        args.percentiles, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results have been saved to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}")
+            return 1
+        print("No regressions against the baseline.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
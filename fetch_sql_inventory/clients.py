@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - Shared API Clients
+
+The Google client libraries are imported when the first client is built, so
+offline commands don't pay for them.
+"""
+import threading
+
+_lock = threading.Lock()
+_grpc_clients = {}
+_thread_local = threading.local()
+
+# Stand-in serving every API instead of GCP (see fake_gcp), or None for the real APIs
+_backend = None
+
+def set_backend(backend):
+    """Serve all API clients from backend (a fake_gcp backend); None restores the real APIs."""
+    global _backend
+    _backend = backend
+
+def get_backend():
+    """The installed stand-in backend, or None."""
+    return _backend
+
+def _get_grpc_client(client_class, credentials):
+    """Return the process-wide gRPC client of client_class for these credentials.
+    
+    gRPC clients are thread-safe and keep their channel open, so one instance
+    is shared by every worker.
+    """
+    key = (client_class, credentials)
+    client = _grpc_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _grpc_clients.get(key)
+            if client is None:
+                client = client_class(credentials=credentials)
+                _grpc_clients[key] = client
+    return client
+
+def get_asset_client(credentials):
+    """Shared Cloud Asset API client."""
+    if _backend is not None:
+        return _backend.asset_client(credentials)
+    return _real_asset_client(credentials)
+
+def _real_asset_client(credentials):
+    from google.cloud import asset_v1
+    return _get_grpc_client(asset_v1.AssetServiceClient, credentials)
+
+def get_monitoring_client(credentials):
+    """Shared Cloud Monitoring API client."""
+    if _backend is not None:
+        return _backend.monitoring_client(credentials)
+    return _real_monitoring_client(credentials)
+
+def _real_monitoring_client(credentials):
+    from google.cloud import monitoring_v3
+    return _get_grpc_client(monitoring_v3.MetricServiceClient, credentials)
+
+def get_discovery_service(api, version, credentials):
+    """Return a discovery-based API client for the calling thread.
+    
+    httplib2 is not thread-safe, so each thread gets its own service object
+    backed by its own authorized HTTP session; it is built once per thread and
+    reused (keeping the connection alive) for every later call on that thread.
+    The reuse only pays off while the thread lives, so callers keep one worker
+    pool for a whole run (see sql_details.iter_sql_instance_details).
+    """
+    if _backend is not None:
+        return _backend.discovery_service(api, version, credentials)
+    return _thread_discovery_service(api, version, credentials)
+
+def _thread_discovery_service(api, version, credentials):
+    services = getattr(_thread_local, 'services', None)
+    if services is None:
+        services = _thread_local.services = {}
+    
+    key = (api, version, credentials)
+    service = services.get(key)
+    if service is None:
+        import httplib2
+        import google_auth_httplib2
+        from googleapiclient.discovery import build
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+        service = build(api, version, http=http, cache_discovery=False)
+        services[key] = service
+    return service
+
+def get_sqladmin_service(credentials):
+    """Per-thread SQL Admin API client."""
+    return get_discovery_service('sqladmin', 'v1', credentials)
+
+def get_resource_manager_service(credentials):
+    """Per-thread Cloud Resource Manager API client."""
+    return get_discovery_service('cloudresourcemanager', 'v1', credentials)
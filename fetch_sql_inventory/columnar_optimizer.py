@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Optimizer - Columnar engine for recommendations and cost estimates
+
+Evaluates the same rules and pricing formulas as sql_optimizer, but over whole
+DataFrame columns: machine tiers are parsed once per distinct tier and the
+threshold rules and costs are computed with NumPy. Rows whose values the
+vectorized path can't represent exactly (missing or unparsable numbers, non-text
+tiers or database versions) are handed to the row-by-row functions so the
+results are identical.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_float_dtype, is_integer_dtype, is_numeric_dtype
+from sql_optimizer import (
+    GCP_PRICING, HA_MODIFIER, MIN_MEMORY_GB, MIN_DISK_SIZE_GB, METRIC_FIELDS,
+    is_missing, extract_machine_specs, is_at_minimum_spec, get_region_pricing, get_db_version_modifier,
+    get_instance_recommendations, estimate_costs, format_cost_details,
+    report_header, instance_report_lines, instance_report, report_summary
+)
+from optimizer_models import Recommendation, CostEstimate
+from tier_catalog import get_tier_catalog
+
+# Columns produced by analyze_inventory_frame
+ANALYSIS_COLUMNS = [
+    'vcpus', 'memory_gb', 'at_minimum_spec', 'recommendations',
+    'current_cpu_cost', 'current_memory_cost', 'current_storage_cost', 'current_total_cost',
+    'optimized_cpu_cost', 'optimized_memory_cost', 'optimized_storage_cost', 'optimized_total_cost',
+    'monthly_savings', 'savings_percentage', 'no_optimization_possible'
+]
+
+# Inventory columns read when rendering an instance's report lines
+REPORT_COLUMNS = {
+    'name', 'project_id', 'tier', 'location', 'database_version', 'availability_type', 'disk_size_gb',
+    'cpu_util', 'memory_util', 'disk_util', 'connections'
+}
+
+def _column(df, name, default):
+    """Column values as a numpy object array of native Python values (default when the column is missing)."""
+    if name not in df.columns:
+        return np.array([default] * len(df), dtype=object)
+    return np.array(df[name].tolist(), dtype=object)
+
+def _missing(df, name):
+    """Which values of a column are missing (None, '' or NaN, like is_missing); all of them if the column is."""
+    if name not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    series = df[name]
+    if is_numeric_dtype(series) and not is_bool_dtype(series):
+        return series.isna().to_numpy()
+    return np.fromiter((is_missing(value) for value in series.tolist()), dtype=bool, count=len(series))
+
+def _float_column(df, name):
+    """float() of every value in a column; returns (values, valid).
+    
+    Missing values (and a missing column) are NaN but valid, as metrics
+    without data; only unparsable values are invalid.
+    """
+    if name not in df.columns:
+        return np.full(len(df), np.nan), np.ones(len(df), dtype=bool)
+    series = df[name]
+    if is_numeric_dtype(series) and not is_bool_dtype(series):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan), np.ones(len(series), dtype=bool)
+    values = np.empty(len(series))
+    valid = np.ones(len(series), dtype=bool)
+    for i, value in enumerate(series.tolist()):
+        if is_missing(value):
+            values[i] = np.nan
+            continue
+        try:
+            values[i] = float(value)
+        except (TypeError, ValueError):
+            values[i] = np.nan
+            valid[i] = False
+    return values, valid
+
+def _int_column(df, name, default='0'):
+    """int() of every value in a column; returns (values, valid)."""
+    if name not in df.columns:
+        return np.full(len(df), int(default), dtype=np.int64), np.ones(len(df), dtype=bool)
+    series = df[name]
+    if is_integer_dtype(series) and not is_bool_dtype(series):
+        return series.to_numpy(dtype=np.int64), np.ones(len(series), dtype=bool)
+    if is_float_dtype(series):
+        values = series.to_numpy(dtype=np.float64)
+        valid = np.isfinite(values)
+        return np.trunc(np.where(valid, values, 0)).astype(np.int64), valid
+    values = np.zeros(len(series), dtype=np.int64)
+    valid = np.ones(len(series), dtype=bool)
+    for i, value in enumerate(series.tolist()):
+        try:
+            values[i] = int(value)
+        except (TypeError, ValueError, OverflowError):
+            valid[i] = False
+    return values, valid
+
+def _utilization_column(df, column, percentile):
+    """Vectorized get_utilization: the percentile column where present, the base column otherwise (NaN without data)."""
+    values, valid = _float_column(df, column)
+    if not percentile or f"{column}_{percentile}" not in df.columns:
+        return values, valid
+    
+    # get_utilization falls back to the base column for None, '' and NaN
+    pct_values, pct_valid = _float_column(df, f"{column}_{percentile}")
+    use_pct = ~_missing(df, f"{column}_{percentile}")
+    return np.where(use_pct, pct_values, values), np.where(use_pct, pct_valid, valid)
+
+def _is_text(values):
+    """Which entries of an object array are str."""
+    return np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+
+def _tier_table(tiers):
+    """Parse every distinct tier once; returns (codes, per-tier dict of arrays)."""
+    codes, uniques = pd.factorize(pd.Series(tiers, dtype=object), use_na_sentinel=True)
+    
+    table = {key: [] for key in (
+        'vcpus', 'memory_mb', 'shared_core', 'at_min', 'cpu_half', 'cpu_sixty', 'cpu_up',
+        'memory_low_gb', 'memory_low_target', 'memory_high_target'
+    )}
+    catalog = get_tier_catalog()
+    for tier in uniques:
+        spec = catalog.spec(tier if isinstance(tier, str) else '')
+        vcpus, memory_mb = spec.vcpus, spec.memory_mb
+        memory_low_gb = max(MIN_MEMORY_GB * 1024, int(memory_mb * 0.7)) / 1024
+        
+        table['vcpus'].append(vcpus)
+        table['memory_mb'].append(memory_mb)
+        table['shared_core'].append(spec.shared_core)
+        table['at_min'].append(spec.at_minimum)
+        table['cpu_half'].append(catalog.reduced_vcpus(tier if isinstance(tier, str) else ''))
+        table['cpu_sixty'].append(max(1, int(vcpus * 0.6)))
+        table['cpu_up'].append(vcpus + 2)
+        table['memory_low_gb'].append(memory_low_gb)
+        table['memory_low_target'].append(round(memory_low_gb, 1))
+        table['memory_high_target'].append(int(memory_mb * 1.3) / 1024)
+    
+    # Object arrays keep each value's Python type (2 vs 0.5 vCPUs) for the messages
+    return codes, {key: np.array(values, dtype=object) for key, values in table.items()}
+
+def _build(kind, rows, **columns):
+    """One Recommendation of the given kind per row, with fields taken from equally long arrays."""
+    fields = list(columns)
+    values = zip(*(np.asarray(column, dtype=object)[rows].tolist() for column in columns.values()))
+    if not fields:
+        values = (() for _ in rows)
+    return np.array([Recommendation(kind, **dict(zip(fields, row))) for row in values], dtype=object)
+
+def _fallback_rows(df, rows, percentile):
+    """Row-by-row recommendations and cost floats for the given row positions."""
+    records = df.iloc[rows].to_dict('records')
+    results = []
+    for record in records:
+        recommendations = get_instance_recommendations(record, percentile)
+        results.append((record, recommendations, estimate_costs(record, recommendations)))
+    return results
+
+def analyze_inventory_frame(df, percentile=None):
+    """Compute recommendations and cost estimates for a whole inventory DataFrame.
+    
+    Returns a DataFrame (same index as df) with ANALYSIS_COLUMNS, matching
+    get_instance_recommendations and generate_cost_saving_estimate row for row,
+    plus a boolean 'row_fallback' column marking rows evaluated row by row.
+    Costs are NaN for instances missing a tier or disk size. Metrics without
+    data are NaN, which no threshold rule fires on.
+    """
+    n = len(df)
+    
+    cpu_util, cpu_valid = _utilization_column(df, 'cpu_util', percentile)
+    memory_util, memory_valid = _utilization_column(df, 'memory_util', percentile)
+    disk_util, disk_valid = _utilization_column(df, 'disk_util', percentile)
+    connections_float, connections_valid = _utilization_column(df, 'connections', percentile)
+    connections_measured = ~np.isnan(connections_float)
+    connections_valid &= ~np.isinf(connections_float)
+    connections = np.trunc(np.where(connections_measured & connections_valid, connections_float, 0)).astype(np.int64)
+    disk_size_gb, disk_size_valid = _int_column(df, 'disk_size_gb')
+    
+    tiers = _column(df, 'tier', '')
+    db_versions = _column(df, 'database_version', '')
+    # Rows without a tier or disk size go to the row functions, which skip them
+    tier_valid = _is_text(tiers) & (tiers != '')
+    if 'disk_size_gb' not in df.columns:
+        disk_size_valid[:] = False
+    db_version_valid = _is_text(db_versions)
+    
+    valid = cpu_valid & memory_valid & disk_valid & connections_valid & disk_size_valid & tier_valid & db_version_valid
+    
+    # Machine specs, parsed once per distinct tier
+    codes, tier_table = _tier_table(tiers)
+    codes = np.where(codes < 0, 0, codes)
+    if len(tier_table['vcpus']) == 0:
+        # No usable tier at all: parse the empty tier so every lookup has a row
+        codes, tier_table = _tier_table([''])
+        codes = np.zeros(n, dtype=np.int64)
+    take = lambda key: tier_table[key][codes]
+    vcpus = take('vcpus').astype(np.float64)
+    memory_mb = take('memory_mb').astype(np.float64)
+    memory_gb = memory_mb / 1024
+    shared_core = take('shared_core').astype(bool)
+    at_min = take('at_min').astype(bool)
+    
+    states = _column(df, 'state', '')
+    runnable = states == 'RUNNABLE'
+    activation_never = _column(df, 'activation_policy', '') == 'NEVER'
+    
+    # Every rule yields a mask and the Recommendation for the rows it fires on, in rule order
+    rules = []
+    vcpus_value = take('vcpus')
+    
+    low_connections = connections_measured & (vcpus > 1) & (connections < vcpus * 20) & ~at_min
+    rules.append((low_connections, lambda rows: _build(
+        'low_connections', rows, current_vcpus=vcpus_value, connections=connections)))
+    
+    cpu_very_low = cpu_util < 0.05
+    cpu_very_low_reduce = cpu_very_low & (vcpus > 1) & ~at_min
+    cpu_shared_core = cpu_very_low & ~cpu_very_low_reduce & ~shared_core & ~at_min
+    cpu_low = ~cpu_very_low & (cpu_util < 0.2)
+    cpu_low_reduce = cpu_low & (vcpus > 2) & ~at_min
+    cpu_low_monitor = cpu_low & ~cpu_low_reduce & ~at_min
+    cpu_high = ~cpu_very_low & ~cpu_low & (cpu_util > 0.8)
+    rules.append((cpu_very_low_reduce, lambda rows: _build(
+        'cpu_very_low_reduce', rows, current_vcpus=vcpus_value, utilization=cpu_util, target_vcpus=take('cpu_half'))))
+    rules.append((cpu_shared_core, lambda rows: _build(
+        'cpu_shared_core', rows, current_vcpus=vcpus_value, utilization=cpu_util)))
+    rules.append((cpu_low_reduce, lambda rows: _build(
+        'cpu_low_reduce', rows, current_vcpus=vcpus_value, utilization=cpu_util, target_vcpus=take('cpu_sixty'))))
+    rules.append((cpu_low_monitor, lambda rows: _build(
+        'cpu_low_monitor', rows, current_vcpus=vcpus_value, utilization=cpu_util)))
+    rules.append((cpu_high, lambda rows: _build(
+        'cpu_high', rows, current_vcpus=vcpus_value, utilization=cpu_util, target_vcpus=take('cpu_up'))))
+    
+    memory_low_case = (memory_util < 0.3) & (memory_gb > MIN_MEMORY_GB)
+    memory_low = memory_low_case & (take('memory_low_gb').astype(np.float64) < memory_gb)
+    memory_high = ~memory_low_case & (memory_util > 0.85)
+    rules.append((memory_low, lambda rows: _build(
+        'memory_low', rows, current_memory_gb=memory_gb, utilization=memory_util, target_memory_gb=take('memory_low_target'))))
+    rules.append((memory_high, lambda rows: _build(
+        'memory_high', rows, current_memory_gb=memory_gb, utilization=memory_util, target_memory_gb=take('memory_high_target'))))
+    
+    disk_very_low_case = (disk_util < 0.2) & (disk_size_gb > MIN_DISK_SIZE_GB)
+    disk_low_case = ~disk_very_low_case & (disk_util < 0.5) & (disk_size_gb > 100)
+    disk_high = ~disk_very_low_case & ~disk_low_case & (disk_util > 0.85)
+    disk_very_low_target = np.maximum(MIN_DISK_SIZE_GB, np.trunc(disk_size_gb * 0.6)).astype(np.int64)
+    disk_low_target = np.maximum(MIN_DISK_SIZE_GB, np.trunc(disk_size_gb * 0.7)).astype(np.int64)
+    disk_high_target = np.trunc(disk_size_gb * 1.3).astype(np.int64)
+    disk_very_low = disk_very_low_case & (disk_very_low_target < disk_size_gb)
+    disk_low = disk_low_case & (disk_low_target < disk_size_gb)
+    rules.append((disk_very_low, lambda rows: _build(
+        'disk_very_low', rows, current_disk_gb=disk_size_gb, utilization=disk_util, target_disk_gb=disk_very_low_target)))
+    rules.append((disk_low, lambda rows: _build(
+        'disk_low', rows, current_disk_gb=disk_size_gb, utilization=disk_util, target_disk_gb=disk_low_target)))
+    rules.append((disk_high, lambda rows: _build(
+        'disk_high', rows, current_disk_gb=disk_size_gb, utilization=disk_util, target_disk_gb=disk_high_target)))
+    
+    never_activated = activation_never & (cpu_util == 0) & (memory_util == 0)
+    unused = connections_measured & (connections == 0) & (cpu_util < 0.01)
+    rules.append((never_activated, lambda rows: _build('never_activated', rows)))
+    rules.append((unused, lambda rows: _build('unused', rows, connections=connections, utilization=cpu_util)))
+    
+    # Build the message matrix (rows x rules) for running, vectorizable instances
+    active = valid & runnable
+    messages = np.full((n, len(rules)), None, dtype=object)
+    for j, (mask, render) in enumerate(rules):
+        rows = np.flatnonzero(mask & active)
+        if len(rows):
+            messages[rows, j] = render(rows)
+    
+    at_min_underused = active & at_min & (cpu_util < 0.2) & (memory_util < 0.3)
+    unmeasured = np.column_stack([np.isnan(cpu_util), np.isnan(memory_util), np.isnan(disk_util), ~connections_measured])
+    recommendations = np.empty(n, dtype=object)
+    for i in np.flatnonzero(active):
+        recs = [message for message in messages[i] if message is not None]
+        if at_min_underused[i]:
+            recs = [rec for rec in recs if not rec.reduces_resources]
+            if not any(rec.kind == 'unused' for rec in recs):
+                recs.append(Recommendation('at_minimum'))
+        if unmeasured[i].any():
+            missing = [field for field, absent in zip(METRIC_FIELDS, unmeasured[i]) if absent]
+            recs.append(Recommendation('missing_metrics', note=', '.join(missing)))
+        if not recs:
+            recs.append(Recommendation('appropriately_sized'))
+        recommendations[i] = recs
+    for i in np.flatnonzero(valid & ~runnable):
+        recommendations[i] = [Recommendation('not_running', note=f"{states[i]}")]
+    
+    # Pricing, looked up once per distinct region and database version
+    region_codes, regions = pd.factorize(pd.Series(_column(df, 'location', 'us-central1'), dtype=object))
+    region_pricing = [get_region_pricing(region) for region in regions] + [GCP_PRICING["default"]]
+    cpu_price = np.array([pricing["cpu"] for pricing in region_pricing])[region_codes]
+    memory_price = np.array([pricing["memory"] for pricing in region_pricing])[region_codes]
+    storage_price = np.array([pricing["storage"] for pricing in region_pricing])[region_codes]
+    
+    version_codes, versions = pd.factorize(pd.Series(db_versions, dtype=object))
+    version_modifiers = [get_db_version_modifier(version) if isinstance(version, str) else 1.0 for version in versions] + [1.0]
+    db_modifier = np.array(version_modifiers)[version_codes]
+    
+    ha_modifier = np.where(_column(df, 'availability_type', 'ZONAL') == 'REGIONAL', HA_MODIFIER, 1.0)
+    
+    # Same operation order as estimate_costs so the floats match exactly
+    current_cpu = vcpus * cpu_price * 730 * db_modifier * ha_modifier
+    current_memory = memory_gb * memory_price * 730 * db_modifier * ha_modifier
+    current_storage = disk_size_gb * storage_price * ha_modifier
+    current_total = current_cpu + current_memory + current_storage
+    
+    no_optimization = at_min_underused & ~unused
+    new_vcpus = np.where(active & cpu_very_low_reduce, take('cpu_half').astype(np.float64),
+                         np.where(active & cpu_low_reduce, take('cpu_sixty').astype(np.float64), vcpus))
+    new_memory_gb = np.where(active & memory_low, take('memory_low_target').astype(np.float64), memory_gb)
+    disk_reduced = active & ~at_min_underused
+    new_disk = np.where(disk_reduced & disk_very_low, disk_very_low_target,
+                        np.where(disk_reduced & disk_low, disk_low_target, disk_size_gb))
+    new_vcpus = np.where(no_optimization, vcpus, new_vcpus)
+    new_memory_gb = np.where(no_optimization, memory_gb, new_memory_gb)
+    new_disk = np.where(no_optimization, disk_size_gb, new_disk)
+    
+    optimized_cpu = new_vcpus * cpu_price * 730 * db_modifier * ha_modifier
+    optimized_memory = new_memory_gb * memory_price * 730 * db_modifier * ha_modifier
+    optimized_storage = new_disk * storage_price * ha_modifier
+    optimized_total = optimized_cpu + optimized_memory + optimized_storage
+    
+    savings = current_total - np.minimum(optimized_total, current_total)
+    keep_current = (optimized_total > current_total) | no_optimization | (savings <= 0)
+    optimized_cpu = np.where(keep_current, current_cpu, optimized_cpu)
+    optimized_memory = np.where(keep_current, current_memory, optimized_memory)
+    optimized_storage = np.where(keep_current, current_storage, optimized_storage)
+    optimized_total = np.where(keep_current, current_total, optimized_total)
+    savings = np.where(keep_current, 0.0, savings)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        savings_percentage = np.where(~keep_current & (current_total > 0), savings / current_total * 100, 0.0)
+    
+    analysis = pd.DataFrame({
+        'vcpus': take('vcpus'),
+        'memory_gb': memory_gb,
+        'at_minimum_spec': at_min,
+        'recommendations': recommendations,
+        'current_cpu_cost': current_cpu,
+        'current_memory_cost': current_memory,
+        'current_storage_cost': current_storage,
+        'current_total_cost': current_total,
+        'optimized_cpu_cost': optimized_cpu,
+        'optimized_memory_cost': optimized_memory,
+        'optimized_storage_cost': optimized_storage,
+        'optimized_total_cost': optimized_total,
+        'monthly_savings': savings,
+        'savings_percentage': savings_percentage,
+        'no_optimization_possible': active & no_optimization,
+        'row_fallback': ~valid
+    }, index=df.index)
+    
+    # Rows the vectorized path can't represent go through the row-by-row functions
+    fallback = np.flatnonzero(~valid)
+    cost_columns = (
+        ('current_cpu_cost', 'current_cpu'), ('current_memory_cost', 'current_memory'),
+        ('current_storage_cost', 'current_storage'), ('current_total_cost', 'current_total'),
+        ('optimized_cpu_cost', 'optimized_cpu'), ('optimized_memory_cost', 'optimized_memory'),
+        ('optimized_storage_cost', 'optimized_storage'), ('optimized_total_cost', 'optimized_total'),
+        ('monthly_savings', 'savings'), ('savings_percentage', 'savings_percentage'),
+        ('no_optimization_possible', 'no_optimization_possible')
+    )
+    for position, (record, recs, costs) in zip(fallback, _fallback_rows(df, fallback, percentile)):
+        tier = record.get('tier', '')
+        tier = tier if isinstance(tier, str) else ''
+        fallback_vcpus, fallback_memory_mb = extract_machine_specs(tier)
+        analysis.iat[position, analysis.columns.get_loc('vcpus')] = fallback_vcpus
+        analysis.iat[position, analysis.columns.get_loc('memory_gb')] = fallback_memory_mb / 1024
+        analysis.iat[position, analysis.columns.get_loc('at_minimum_spec')] = is_at_minimum_spec(tier)
+        analysis.iat[position, analysis.columns.get_loc('recommendations')] = recs
+        for column, key in cost_columns:
+            # Instances that can't be priced (no tier or disk size) have no costs
+            value = getattr(costs, key) if costs is not None else (False if key == 'no_optimization_possible' else np.nan)
+            analysis.iat[position, analysis.columns.get_loc(column)] = value
+    
+    return analysis
+
+def _analysis_costs(row):
+    """CostEstimate from an analysis row."""
+    return CostEstimate(
+        current_cpu=row.current_cpu_cost,
+        current_memory=row.current_memory_cost,
+        current_storage=row.current_storage_cost,
+        current_total=row.current_total_cost,
+        optimized_cpu=row.optimized_cpu_cost,
+        optimized_memory=row.optimized_memory_cost,
+        optimized_storage=row.optimized_storage_cost,
+        optimized_total=row.optimized_total_cost,
+        savings=row.monthly_savings,
+        savings_percentage=row.savings_percentage,
+        no_optimization_possible=bool(row.no_optimization_possible)
+    )
+
+def generate_optimization_report_frame(df, percentile=None):
+    """Columnar equivalent of generate_optimization_report for an inventory DataFrame."""
+    analysis = analyze_inventory_frame(df, percentile)
+    
+    # Only the columns the report lines read are turned into records
+    report_columns = [column for column in df.columns if column in REPORT_COLUMNS or (percentile and column.endswith(f"_{percentile}"))]
+    records = df[report_columns].to_dict('records')
+    
+    # The report shows the mean utilization, whatever statistic the rules used
+    cpu_util, cpu_valid = _float_column(df, 'cpu_util')
+    memory_util, memory_valid = _float_column(df, 'memory_util')
+    disk_util, disk_valid = _float_column(df, 'disk_util')
+    connections, connections_valid = _float_column(df, 'connections')
+    metrics_valid = cpu_valid & memory_valid & disk_valid & connections_valid & ~np.isinf(connections)
+    
+    total_current_cost = 0
+    total_optimized_cost = 0
+    skipped = 0
+    report = report_header(len(df), percentile)
+    
+    for i, (record, row) in enumerate(zip(records, analysis.itertuples(index=False))):
+        if row.row_fallback or not metrics_valid[i]:
+            lines, current_cost, optimized_cost = instance_report(df.iloc[i:i + 1].to_dict('records')[0], percentile)
+        else:
+            costs = _analysis_costs(row)
+            lines = instance_report_lines(record, row.vcpus, row.memory_gb, cpu_util[i], memory_util[i], disk_util[i],
+                                          None if np.isnan(connections[i]) else int(connections[i]),
+                                          row.recommendations, format_cost_details(costs), percentile)
+            current_cost, optimized_cost = costs.current_total, costs.optimized_total
+        
+        report.extend(lines)
+        if current_cost is not None:
+            total_current_cost += current_cost
+            total_optimized_cost += optimized_cost
+        else:
+            skipped += 1
+    
+    report.extend(report_summary(total_current_cost, total_optimized_cost, skipped))
+    return report
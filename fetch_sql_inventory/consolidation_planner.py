@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Optimizer - Fleet consolidation planner
+
+Underutilized instances that could share a server (same project, region,
+database version and availability type) are bin-packed by their measured CPU,
+memory, disk and connection demand with first-fit decreasing. Each bin becomes
+one instance of the cheapest catalog tier that holds its load, priced with the
+same tables as the rest of the optimizer.
+"""
+import csv
+import math
+import numpy as np
+import pandas as pd
+from sql_optimizer import (
+    MIN_DISK_SIZE_GB, HA_MODIFIER, TARGET_CPU_UTILIZATION, TARGET_MEMORY_UTILIZATION,
+    get_region_pricing, utilization_array
+)
+from optimizer_models import ConsolidationPlan
+from tier_catalog import get_tier_catalog
+
+# Instances below both thresholds are consolidation candidates
+CONSOLIDATION_CPU_THRESHOLD = 0.2
+CONSOLIDATION_MEMORY_THRESHOLD = 0.3
+
+# Largest tier a consolidated instance may use
+CONSOLIDATION_MAX_TIER = 'db-standard-8'
+
+# Capacity assumptions for a consolidated instance
+CONNECTIONS_PER_VCPU = 100  # Same rule of thumb as the connection recommendation
+TARGET_DISK_UTILIZATION = 0.8
+
+GROUP_COLUMNS = ['project_id', 'location', 'database_version', 'availability_type']
+
+def first_fit_decreasing(demand, capacity):
+    """Pack items (rows of demand) into the fewest bins of the given capacity.
+    
+    Items are placed largest first (by their largest share of capacity) into
+    the first bin with room in every dimension. Returns (bin index per item,
+    number of bins). Items that don't fit an empty bin must be filtered out
+    by the caller.
+    """
+    count, dimensions = demand.shape
+    order = np.argsort(-(demand / capacity).max(axis=1), kind='stable')
+    remaining = np.empty((count, dimensions), dtype=np.float64)
+    assignment = np.empty(count, dtype=np.int64)
+    bins = 0
+    
+    for item in order:
+        fits = np.flatnonzero((remaining[:bins] >= demand[item]).all(axis=1)) if bins else ()
+        if len(fits):
+            target = fits[0]
+        else:
+            target = bins
+            remaining[target] = capacity
+            bins += 1
+        remaining[target] -= demand[item]
+        assignment[item] = target
+    
+    return assignment, bins
+
+def _instance_demand(df, percentile):
+    """Per-instance used vCPUs, memory GB, disk GB and connections, plus current monthly cost."""
+    catalog = get_tier_catalog()
+    specs = [catalog.spec(tier if isinstance(tier, str) else '') for tier in df['tier'].tolist()]
+    vcpus = np.array([spec.vcpus for spec in specs], dtype=np.float64)
+    memory_gb = np.array([spec.memory_gb for spec in specs], dtype=np.float64)
+    disk_size_gb = pd.to_numeric(df['disk_size_gb'], errors='coerce').to_numpy(dtype=np.float64)
+    
+    cpu_util = utilization_array(df, 'cpu_util', percentile)
+    memory_util = utilization_array(df, 'memory_util', percentile)
+    disk_util = utilization_array(df, 'disk_util', percentile)
+    connections = utilization_array(df, 'connections', percentile)
+    
+    demand = np.column_stack([vcpus * cpu_util, memory_gb * memory_util, disk_size_gb * disk_util, connections])
+    
+    current_cost = np.empty(len(df), dtype=np.float64)
+    for i, (spec, region, db_version, availability_type, disk) in enumerate(zip(
+            specs, df['location'].tolist(), df['database_version'].tolist(),
+            df['availability_type'].tolist(), disk_size_gb)):
+        cpu_cost, memory_cost = catalog.monthly_cost(spec.name, region, db_version, availability_type)
+        ha_modifier = HA_MODIFIER if availability_type == 'REGIONAL' else 1.0
+        current_cost[i] = cpu_cost + memory_cost + disk * get_region_pricing(region)["storage"] * ha_modifier
+    
+    return demand, current_cost, cpu_util, memory_util
+
+def _cheapest_tier(load, region, db_version, availability_type, max_tier):
+    """Cheapest catalog tier (and its compute + memory cost) that holds a bin's load with headroom."""
+    catalog = get_tier_catalog()
+    limit = catalog.spec(max_tier)
+    sqlserver = db_version.startswith('SQLSERVER')
+    best = None
+    for spec in catalog.tiers():
+        if spec.vcpus > limit.vcpus or spec.memory_mb > limit.memory_mb or (sqlserver and spec.shared_core):
+            continue
+        if (load[0] > spec.vcpus * TARGET_CPU_UTILIZATION or load[1] > spec.memory_gb * TARGET_MEMORY_UTILIZATION
+                or load[3] > max(1, spec.vcpus) * CONNECTIONS_PER_VCPU):
+            continue
+        cost = sum(catalog.monthly_cost(spec.name, region, db_version, availability_type))
+        if best is None or cost < best[1]:
+            best = (spec.name, cost)
+    return best
+
+def plan_consolidation(instances, percentile=None, max_tier=CONSOLIDATION_MAX_TIER):
+    """Plan which underutilized instances to merge, and onto which tier.
+    
+    instances is a list of inventory records or a DataFrame. Only RUNNABLE
+    instances under CONSOLIDATION_CPU_THRESHOLD and
+    CONSOLIDATION_MEMORY_THRESHOLD are considered. Returns ConsolidationPlan
+    objects for the bins that merge two or more instances at a lower monthly
+    cost, largest savings first.
+    """
+    df = instances if isinstance(instances, pd.DataFrame) else pd.DataFrame(list(instances))
+    required = GROUP_COLUMNS + ['name', 'tier', 'state', 'disk_size_gb', 'cpu_util', 'memory_util', 'disk_util', 'connections']
+    if df.empty or any(column not in df.columns for column in required):
+        return []
+    
+    df = df[df['state'] == 'RUNNABLE']
+    df = df[df[GROUP_COLUMNS + ['tier']].map(lambda value: isinstance(value, str)).all(axis=1) & (df['tier'] != '')]
+    if df.empty:
+        return []
+    
+    demand, current_cost, cpu_util, memory_util = _instance_demand(df, percentile)
+    eligible = (
+        np.isfinite(demand).all(axis=1) & np.isfinite(current_cost)
+        & (cpu_util < CONSOLIDATION_CPU_THRESHOLD) & (memory_util < CONSOLIDATION_MEMORY_THRESHOLD)
+    )
+    
+    limit = get_tier_catalog().spec(max_tier)
+    capacity = np.array([
+        limit.vcpus * TARGET_CPU_UTILIZATION, limit.memory_gb * TARGET_MEMORY_UTILIZATION,
+        np.inf, max(1, limit.vcpus) * CONNECTIONS_PER_VCPU
+    ])
+    # Instances that wouldn't fit a bin on their own stay where they are
+    eligible &= (demand <= capacity).all(axis=1)
+    
+    names = df['name'].to_numpy(dtype=object)
+    plans = []
+    positions = np.flatnonzero(eligible)
+    groups = df.iloc[positions].groupby(GROUP_COLUMNS, sort=False).indices
+    for (project_id, region, db_version, availability_type), members in groups.items():
+        if len(members) < 2:
+            continue
+        members = positions[members]
+        assignment, bins = first_fit_decreasing(demand[members], capacity)
+        if bins == len(members):
+            continue
+        
+        storage_price = get_region_pricing(region)["storage"] * (HA_MODIFIER if availability_type == 'REGIONAL' else 1.0)
+        for bin_index in range(bins):
+            packed = members[assignment == bin_index]
+            if len(packed) < 2:
+                continue
+            load = demand[packed].sum(axis=0)
+            tier = _cheapest_tier(load, region, db_version, availability_type, max_tier)
+            if tier is None:
+                continue
+            disk_gb = max(MIN_DISK_SIZE_GB, math.ceil(load[2] / TARGET_DISK_UTILIZATION))
+            plan = ConsolidationPlan(
+                project_id=project_id,
+                region=region,
+                database_version=db_version,
+                availability_type=availability_type,
+                members=names[packed].tolist(),
+                target_tier=tier[0],
+                target_disk_gb=disk_gb,
+                current_monthly_cost=float(current_cost[packed].sum()),
+                consolidated_monthly_cost=tier[1] + disk_gb * storage_price
+            )
+            if plan.savings > 0:
+                plans.append(plan)
+    
+    plans.sort(key=lambda plan: plan.savings, reverse=True)
+    return plans
+
+def consolidation_report_lines(plans):
+    """Report section listing each consolidation and its projected savings."""
+    report = []
+    report.append("=== Consolidation Plan ===")
+    if not plans:
+        report.append("No consolidation opportunities found.")
+        report.append("")
+        return report
+    
+    merged = sum(len(plan.members) for plan in plans)
+    total_savings = sum(plan.savings for plan in plans)
+    report.append(f"{merged} underutilized instances can be merged into {len(plans)} instances")
+    report.append(f"Projected monthly savings: ${total_savings:.2f} (annual: ${total_savings * 12:.2f})")
+    report.append("")
+    for plan in plans:
+        report.append(f"Project: {plan.project_id}, Region: {plan.region}, {plan.database_version}, {plan.availability_type}")
+        report.append(f"  Merge: {', '.join(plan.members)}")
+        report.append(f"  Onto: {plan.target_tier} with {plan.target_disk_gb} GB storage")
+        report.append(f"  Monthly cost: ${plan.current_monthly_cost:.2f} -> ${plan.consolidated_monthly_cost:.2f} "
+                      f"(saves ${plan.savings:.2f})")
+        report.append("")
+    return report
+
+def write_consolidation_csv(plans, filename):
+    """Write one row per consolidation plan."""
+    fieldnames = ['project_id', 'region', 'database_version', 'availability_type', 'members', 'target_tier',
+                  'target_disk_gb', 'current_monthly_cost', 'consolidated_monthly_cost', 'monthly_savings']
+    with open(filename, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        writer.writeheader()
+        for plan in plans:
+            writer.writerow({
+                'project_id': plan.project_id,
+                'region': plan.region,
+                'database_version': plan.database_version,
+                'availability_type': plan.availability_type,
+                'members': ';'.join(plan.members),
+                'target_tier': plan.target_tier,
+                'target_disk_gb': plan.target_disk_gb,
+                'current_monthly_cost': f"{plan.current_monthly_cost:.2f}",
+                'consolidated_monthly_cost': f"{plan.consolidated_monthly_cost:.2f}",
+                'monthly_savings': f"{plan.savings:.2f}"
+            })
@@ -2,32 +2,44 @@
 """
 Cloud SQL Inventory - Credentials Management
 """
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import logging
+from clients import get_resource_manager_service
+from api_scheduler import call_api
 
-def get_credentials(service_account_file):
-    """Get credentials from service account key file."""
+logger = logging.getLogger(__name__)
+
+SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+def get_credentials(service_account_file=None):
+    """Get credentials from a service account key file, or Application Default Credentials when none is given."""
+    if not service_account_file:
+        import google.auth
+        credentials, _ = google.auth.default(scopes=SCOPES)
+        print(f"Using Application Default Credentials ({getattr(credentials, 'service_account_email', 'user account')})")
+        return credentials
+    
+    from google.oauth2 import service_account
     credentials = service_account.Credentials.from_service_account_file(
         service_account_file, 
-        scopes=["https://www.googleapis.com/auth/cloud-platform"]
+        scopes=SCOPES
     )
     print(f"Using service account email: {credentials.service_account_email}")
     return credentials
 
 def list_accessible_projects(credentials):
     """List all projects the service account has access to."""
-    service = build('cloudresourcemanager', 'v1', credentials=credentials)
+    service = get_resource_manager_service(credentials)
     
     try:
         request = service.projects().list()
         projects = []
         
         while request is not None:
-            response = request.execute()
+            response = call_api('cloudresourcemanager', request.execute)
             projects.extend(response.get('projects', []))
             request = service.projects().list_next(previous_request=request, previous_response=response)
         
         return [p['projectId'] for p in projects if p.get('lifecycleState') == 'ACTIVE']
     except Exception as e:
-        print(f"Error listing projects: {str(e)}")
+        logger.error("Error listing projects: %s", e)
         return []
\ No newline at end of file
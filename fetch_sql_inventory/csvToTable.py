@@ -6,8 +6,18 @@ import csv
 import sys
 import os
 
-def convert_csv_to_table(csv_filename):
-    """Convert a CSV file to a formatted text table."""
+def _line_template(col_widths):
+    """str.format template for one '| a | b |' table line, each value left-aligned in its padded column."""
+    return '|' + '|'.join(f' {{:<{width - 2}}} ' for width in col_widths) + '|\n'
+
+def convert_csv_to_table(csv_filename, column_widths=None):
+    """Convert a CSV file to a formatted text table.
+    
+    The file is streamed, so memory doesn't grow with its size. Column widths
+    are found in a first pass over the file unless column_widths (the longest
+    value of each column, header included) is given by a writer that already
+    knows them, in which case the file is read once.
+    """
     if not os.path.exists(csv_filename):
         print(f"Error: File {csv_filename} not found.")
         return False
@@ -17,42 +27,52 @@ def convert_csv_to_table(csv_filename):
     txt_filename = f"{base_name}_table.txt"
     
     try:
-        # Read CSV data
+        if column_widths is None:
+            # First pass: longest value of each column (rows are padded/cut to the header)
+            with open(csv_filename, 'r', newline='') as csv_file:
+                reader = csv.reader(csv_file)
+                headers = next(reader)  # Get header row
+                column_widths = [len(header) for header in headers]
+                for row in reader:
+                    if len(row) == len(column_widths):
+                        column_widths = list(map(max, column_widths, map(len, row)))
+                    else:
+                        column_widths = [max(width, len(value)) for width, value in zip(column_widths, row)] + column_widths[len(row):]
+        
         with open(csv_filename, 'r', newline='') as csv_file:
             reader = csv.reader(csv_file)
             headers = next(reader)  # Get header row
-            rows = list(reader)     # Get all data rows
-        
-        if not rows:
-            print(f"Warning: No data found in {csv_filename}")
-            with open(txt_filename, 'w') as txt_file:
-                txt_file.write("No data found in CSV file.\n")
-            return True
-        
-        # Calculate column widths (maximum width of any value in that column)
-        col_widths = [max(len(str(row[i])) if i < len(row) else 0 for row in [headers] + rows) + 2 
-                     for i in range(len(headers))]
-        
-        # Generate the table
-        with open(txt_filename, 'w') as txt_file:
-            # Create header row
-            header_row = '|' + '|'.join(f' {headers[i]:<{col_widths[i]-2}} ' for i in range(len(headers))) + '|'
-            separator = '+' + '+'.join('-' * width for width in col_widths) + '+'
+            first_row = next(reader, None)
             
-            # Write header
-            txt_file.write(separator + '\n')
-            txt_file.write(header_row + '\n')
-            txt_file.write(separator + '\n')
+            if first_row is None:
+                print(f"Warning: No data found in {csv_filename}")
+                with open(txt_filename, 'w') as txt_file:
+                    txt_file.write("No data found in CSV file.\n")
+                return True
             
-            # Write data rows
-            for row in rows:
-                # Make sure row has enough values
-                row_data = row + [''] * (len(headers) - len(row))
-                data_row = '|' + '|'.join(f' {str(row_data[i]):<{col_widths[i]-2}} ' for i in range(len(headers))) + '|'
-                txt_file.write(data_row + '\n')
+            col_widths = [width + 2 for width in column_widths]
+            line = _line_template(col_widths).format
+            columns = len(headers)
+            padding = [''] * columns
             
-            # Write bottom separator
-            txt_file.write(separator + '\n')
+            # Generate the table, one row at a time
+            with open(txt_filename, 'w') as txt_file:
+                separator = '+' + '+'.join('-' * width for width in col_widths) + '+\n'
+                
+                # Write header
+                txt_file.write(separator)
+                txt_file.write(line(*headers))
+                txt_file.write(separator)
+                
+                # Write data rows (short rows are padded with empty values)
+                txt_file.write(line(*(first_row + padding)[:columns]))
+                txt_file.writelines(
+                    line(*row) if len(row) == columns else line(*(row + padding)[:columns])
+                    for row in reader
+                )
+                
+                # Write bottom separator
+                txt_file.write(separator)
         
         print(f"Table has been saved to {txt_filename}")
         return True
@@ -0,0 +1,593 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - Offline GCP Stand-ins
+
+Backends installed with clients.set_backend() serve the Asset, SQL Admin,
+Monitoring and Resource Manager calls the collector makes, so it can be
+benchmarked and regression-tested without GCP:
+
+    FakeBackend      serves a synthetic fleet (generate_fleet) with configurable
+                     latency, error injection and page size
+    RecordingBackend forwards calls to the real APIs and saves every response
+                     to a cassette file
+    ReplayBackend    serves a recorded cassette offline
+
+All three hand the collector the same response shapes. backend_from_spec()
+builds one from a string such as 'fake:20x50,latency=0.05,errors=0.01',
+'record:cassette.json.gz' or 'replay:cassette.json.gz'.
+"""
+from abc import ABC, abstractmethod
+import datetime
+import gzip
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+
+SYNTHETIC_REGIONS = [
+    'us-central1', 'us-east1', 'us-east4', 'us-west1', 'europe-west1', 'europe-west2',
+    'europe-west4', 'asia-east1', 'asia-northeast1', 'asia-southeast1', 'australia-southeast1'
+]
+
+# (tier, weight): small shared-core and standard tiers dominate real fleets
+SYNTHETIC_TIERS = [
+    ('db-f1-micro', 8), ('db-g1-small', 8), ('db-custom-1-3840', 10), ('db-custom-2-7680', 14),
+    ('db-custom-4-15360', 10), ('db-custom-8-30720', 5), ('db-custom-16-61440', 2),
+    ('db-standard-1', 6), ('db-standard-2', 8), ('db-standard-4', 6), ('db-standard-8', 3),
+    ('db-standard-16', 1), ('db-highmem-2', 3), ('db-highmem-4', 3), ('db-highmem-8', 2), ('db-highmem-16', 1)
+]
+
+SYNTHETIC_DB_VERSIONS = [
+    ('POSTGRES_15', 30), ('POSTGRES_14', 20), ('MYSQL_8_0', 30), ('MYSQL_5_7', 10),
+    ('SQLSERVER_2019_STANDARD', 7), ('SQLSERVER_2019_ENTERPRISE', 3)
+]
+
+SYNTHETIC_STATES = [('RUNNABLE', 90), ('STOPPED', 6), ('SUSPENDED', 2), ('MAINTENANCE', 2)]
+
+METRIC_PREFIX = 'cloudsql.googleapis.com/'
+METRIC_NAMES = ['database/cpu/utilization', 'database/memory/utilization',
+                'database/disk/utilization', 'database/network/connections']
+
+class FakeApiError(Exception):
+    """Error raised by the stand-ins; code is the HTTP status, like API client errors."""
+    
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+def _weighted(rng, choices):
+    names, weights = zip(*choices)
+    return rng.choices(names, weights=weights)[0]
+
+def _tier_vcpus(tier):
+    if tier in ('db-f1-micro', 'db-g1-small'):
+        return 1
+    return int(tier.split('-')[2])
+
+def _iso(seconds):
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+def _stable_seed(*parts):
+    return int.from_bytes(hashlib.blake2b(repr(parts).encode(), digest_size=8).digest(), 'little')
+
+class SyntheticFleet:
+    """N projects × M instances of SQL Admin resources plus per-instance utilization profiles."""
+    
+    def __init__(self, project_count, instances_per_project, seed=0, now=None):
+        self.seed = seed
+        rng = random.Random(seed)
+        now = int(now if now is not None else time.time())
+        self.projects = [f"synthetic-project-{i:04d}" for i in range(project_count)]
+        self.instances = {}
+        self.profiles = {}
+        
+        for project_id in self.projects:
+            region = rng.choice(SYNTHETIC_REGIONS)
+            resources = []
+            for j in range(instances_per_project):
+                name = f"sql-{j:05d}"
+                db_version = _weighted(rng, SYNTHETIC_DB_VERSIONS)
+                tier = _weighted(rng, SYNTHETIC_TIERS)
+                if db_version.startswith('SQLSERVER') and tier in ('db-f1-micro', 'db-g1-small'):
+                    tier = 'db-custom-2-7680'
+                state = _weighted(rng, SYNTHETIC_STATES)
+                created = now - rng.randint(30, 1500) * 86400
+                networks = [{'value': f"203.0.113.{rng.randint(1, 254)}/32", 'name': 'office'}] if rng.random() < 0.2 else []
+                if rng.random() < 0.03:
+                    networks.append({'value': '0.0.0.0/0', 'name': 'any'})
+                settings = {
+                    'tier': tier,
+                    'availabilityType': 'REGIONAL' if rng.random() < 0.3 else 'ZONAL',
+                    'activationPolicy': 'NEVER' if state == 'STOPPED' else 'ALWAYS',
+                    'dataDiskSizeGb': str(rng.choice([10, 20, 50, 100, 100, 250, 500, 1000])),
+                    'settingsVersion': str(rng.randint(1, 40)),
+                    'backupConfiguration': {'enabled': rng.random() < 0.85},
+                    'ipConfiguration': {'ipv4Enabled': True, 'authorizedNetworks': networks},
+                    'passwordValidationPolicy': {'enablePasswordPolicy': rng.random() < 0.4},
+                    'userLabels': {'env': rng.choice(['prod', 'staging', 'dev'])}
+                }
+                if rng.random() < 0.7:
+                    settings['maintenanceWindow'] = {'day': rng.randint(1, 7), 'hour': rng.randint(0, 23)}
+                if rng.random() < 0.1:
+                    settings['userLabels']['auth_type'] = 'iam_only'
+                if rng.random() < 0.5:
+                    settings['diskEncryptionConfiguration'] = {'kmsKeyName': f"projects/{project_id}/locations/{region}/keyRings/sql/cryptoKeys/{name}"}
+                ip_addresses = []
+                if rng.random() < 0.6:
+                    ip_addresses.append({'type': 'PRIMARY', 'ipAddress': f"198.51.100.{rng.randint(1, 254)}"})
+                if rng.random() < 0.7:
+                    ip_addresses.append({'type': 'PRIVATE', 'ipAddress': f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"})
+                resource = {
+                    'kind': 'sql#instance',
+                    'name': name,
+                    'project': project_id,
+                    'region': region,
+                    'gceZone': f"{region}-{rng.choice('abc')}",
+                    'databaseVersion': db_version,
+                    'instanceType': 'CLOUD_SQL_INSTANCE',
+                    'state': state,
+                    'createTime': _iso(created),
+                    'etag': hashlib.md5(f"{seed}/{project_id}/{name}/{settings['settingsVersion']}".encode()).hexdigest(),
+                    'ipAddresses': ip_addresses,
+                    'serverCaCert': {'expirationTime': _iso(created + 10 * 365 * 86400)},
+                    'deletionProtection': rng.random() < 0.5,
+                    'settings': settings
+                }
+                resources.append(resource)
+                
+                if state == 'RUNNABLE':
+                    # Mostly idle fleets with a tail of busy instances
+                    cpu = min(0.98, rng.betavariate(1.3, 6))
+                    memory = min(0.98, rng.betavariate(3, 4))
+                    disk = min(0.98, rng.betavariate(2, 5))
+                    connections = rng.lognormvariate(math.log(5 * _tier_vcpus(tier)), 1.0) if rng.random() > 0.1 else 0.0
+                    self.profiles[(project_id, name)] = (cpu, memory, disk, connections)
+            self.instances[project_id] = resources
+        
+        self.update_time = _iso(now)
+    
+    def __len__(self):
+        return sum(len(resources) for resources in self.instances.values())
+    
+    def series(self, project_id, name, metric_name, start_seconds, end_seconds, alignment_seconds):
+        """Aligned (end timestamp, value) points of one metric, newest first, or [] if not running."""
+        profile = self.profiles.get((project_id, name))
+        if profile is None:
+            return []
+        base = profile[METRIC_NAMES.index(metric_name)]
+        if alignment_seconds >= end_seconds - start_seconds:
+            return [(int(end_seconds), float(base))]
+        
+        first = (int(start_seconds) // alignment_seconds + 1) * alignment_seconds
+        timestamps = np.arange(first, int(end_seconds) + 1, alignment_seconds, dtype=np.int64)
+        rng = np.random.default_rng(_stable_seed(self.seed, project_id, name, metric_name, first))
+        phase = (_stable_seed(project_id, name) % 1000) / 1000 * 2 * np.pi
+        daily = 1 + 0.35 * np.sin(2 * np.pi * timestamps / 86400 + phase)
+        values = base * daily * rng.lognormal(0, 0.15, len(timestamps))
+        if metric_name != 'database/network/connections':
+            values = np.clip(values, 0, 1)
+        return [(int(t), float(v)) for t, v in zip(timestamps[::-1], values[::-1])]
+
+def generate_fleet(project_count, instances_per_project, seed=0):
+    """Synthetic fleet of project_count projects with instances_per_project instances each."""
+    return SyntheticFleet(project_count, instances_per_project, seed)
+
+def _seconds(value):
+    """Seconds of a Timestamp-like value (datetime, proto Timestamp or {'seconds': ...})."""
+    if isinstance(value, dict):
+        return value.get('seconds', 0)
+    if hasattr(value, 'timestamp'):
+        return value.timestamp()
+    return getattr(value, 'seconds', 0)
+
+def _time_series_params(request):
+    """JSON-safe parameters of a list_time_series request."""
+    interval = request.get('interval')
+    aggregation = request.get('aggregation') or {}
+    alignment = aggregation.get('alignment_period', {})
+    params = {
+        'name': request.get('name'),
+        'filter': request.get('filter'),
+        'start': int(_seconds(interval['start_time'] if isinstance(interval, dict) else interval.start_time)),
+        'end': int(_seconds(interval['end_time'] if isinstance(interval, dict) else interval.end_time)),
+        'alignment': int(alignment.get('seconds', 60) if isinstance(alignment, dict) else _seconds(alignment))
+    }
+    if request.get('page_token'):
+        params['page_token'] = request['page_token']
+    return params
+
+# Payload -> the objects the API client libraries return
+
+def _asset_result(item):
+    update_time = item.get('update_time')
+    return SimpleNamespace(
+        name=item['name'],
+        display_name=item['display_name'],
+        location=item.get('location', ''),
+        update_time=datetime.datetime.fromisoformat(update_time) if update_time else None
+    )
+
+class _Timestamp:
+    """End time of a point; the collector only calls timestamp() on it."""
+    __slots__ = ('seconds',)
+    
+    def __init__(self, seconds):
+        self.seconds = seconds
+    
+    def timestamp(self):
+        return float(self.seconds)
+
+class _Point:
+    """A Monitoring point: point.value.double_value and point.interval.end_time."""
+    __slots__ = ('double_value', 'end_time')
+    
+    def __init__(self, end, value):
+        self.end_time = _Timestamp(end)
+        self.double_value = value
+    
+    @property
+    def value(self):
+        return self
+    
+    @property
+    def interval(self):
+        return self
+
+def _time_series(item):
+    return SimpleNamespace(
+        resource=SimpleNamespace(labels=dict(item['labels'])),
+        points=[_Point(end, value) for end, value in item['points']]
+    )
+
+class _AssetSearchPager:
+    """Like the client library's pager: holds the requested page and fetches later ones when iterated."""
+    
+    def __init__(self, client, request, response):
+        self._client = client
+        self._request = request
+        if isinstance(response, list):
+            # Cassettes recorded before searches were paged hold every result
+            response = {'results': response}
+        self.results = [_asset_result(item) for item in response['results']]
+        self.next_page_token = response.get('next_page_token', '')
+    
+    @property
+    def pages(self):
+        page = self
+        yield page
+        while page.next_page_token:
+            page = self._client.search_all_resources(dict(self._request, page_token=page.next_page_token))
+            yield page
+    
+    def __iter__(self):
+        for page in self.pages:
+            yield from page.results
+
+class _AssetClient:
+    def __init__(self, backend):
+        self._backend = backend
+    
+    def search_all_resources(self, request):
+        params = {'scope': request['scope'], 'query': request.get('query', ''), 'asset_types': list(request.get('asset_types', []))}
+        if request.get('page_token'):
+            params['page_token'] = request['page_token']
+        return _AssetSearchPager(self, request, self._backend.request('cloudasset', 'search_all_resources', params, request))
+
+class _TimeSeriesPager:
+    """Like the client library's pager: holds the requested page and fetches later ones when iterated."""
+    
+    def __init__(self, client, request, response):
+        self._client = client
+        self._request = request
+        if isinstance(response, list):
+            # Cassettes recorded before time series were paged hold every series
+            response = {'time_series': response}
+        self.time_series = [_time_series(item) for item in response['time_series']]
+        self.next_page_token = response.get('next_page_token', '')
+    
+    @property
+    def pages(self):
+        page = self
+        yield page
+        while page.next_page_token:
+            page = self._client.list_time_series(dict(self._request, page_token=page.next_page_token))
+            yield page
+    
+    def __iter__(self):
+        for page in self.pages:
+            yield from page.time_series
+
+class _MonitoringClient:
+    def __init__(self, backend):
+        self._backend = backend
+    
+    def list_time_series(self, request):
+        response = self._backend.request('monitoring', 'list_time_series', _time_series_params(request), request)
+        return _TimeSeriesPager(self, request, response)
+
+class _DiscoveryRequest:
+    def __init__(self, backend, api, method, params):
+        self._backend = backend
+        self.api = api
+        self.method = method
+        self.methodId = f"{api}.{method}"
+        self.params = params
+    
+    def execute(self, **kwargs):
+        return self._backend.request(self.api, self.method, self.params)
+
+class _DiscoveryCollection:
+    def __init__(self, backend, api, collection):
+        self._backend = backend
+        self._api = api
+        self._collection = collection
+    
+    def get(self, **params):
+        return _DiscoveryRequest(self._backend, self._api, f"{self._collection}.get", params)
+    
+    def list(self, **params):
+        return _DiscoveryRequest(self._backend, self._api, f"{self._collection}.list", params)
+    
+    def list_next(self, previous_request, previous_response):
+        token = previous_response.get('nextPageToken')
+        if not token:
+            return None
+        return self.list(**dict(previous_request.params, pageToken=token))
+
+class _Batch:
+    def __init__(self, callback):
+        self._callback = callback
+        self._requests = []
+    
+    def add(self, request, request_id=None):
+        self._requests.append((request_id, request))
+    
+    def execute(self, **kwargs):
+        for request_id, request in self._requests:
+            try:
+                response = request.execute()
+            except Exception as e:
+                self._callback(request_id, None, e)
+            else:
+                self._callback(request_id, response, None)
+
+class _DiscoveryService:
+    def __init__(self, backend, api):
+        self._backend = backend
+        self._api = api
+    
+    def instances(self):
+        return _DiscoveryCollection(self._backend, self._api, 'instances')
+    
+    def projects(self):
+        return _DiscoveryCollection(self._backend, self._api, 'projects')
+    
+    def new_batch_http_request(self, callback=None):
+        return _Batch(callback)
+
+class _Backend(ABC):
+    """Shared client plumbing; subclasses implement request()."""
+    
+    def __init__(self, latency=0.0, error_rate=0.0, error_code=429, page_size=500, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.page_size = page_size
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.requests = 0
+        self.injected_errors = 0
+    
+    def asset_client(self, credentials):
+        return _AssetClient(self)
+    
+    def monitoring_client(self, credentials):
+        return _MonitoringClient(self)
+    
+    def discovery_service(self, api, version, credentials):
+        return _DiscoveryService(self, api)
+    
+    def simulate(self):
+        """One round trip: sleep the configured latency (±50%) and maybe fail."""
+        with self._random_lock:
+            self.requests += 1
+            jitter = self._random.uniform(0.5, 1.5)
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+        if self.latency:
+            time.sleep(self.latency * jitter)
+        if fail:
+            raise FakeApiError(self.error_code, 'RESOURCE_EXHAUSTED: injected error' if self.error_code == 429 else 'injected error')
+    
+    @abstractmethod
+    def request(self, api, method, params, raw=None):
+        """Response of api.method for params (raw is the original gRPC request, if any)."""
+
+def _page(items, params, key, page_size):
+    start = int(params.get('pageToken') or 0)
+    response = {key: items[start:start + page_size]}
+    if start + page_size < len(items):
+        response['nextPageToken'] = str(start + page_size)
+    return response
+
+_LABEL_FILTER = re.compile(r'resource\.labels\.(\w+)="([^"]*)"')
+_METRIC_FILTER = re.compile(r'metric\.type="([^"]*)"')
+
+class FakeBackend(_Backend):
+    """Serves a SyntheticFleet."""
+    
+    def __init__(self, fleet, **options):
+        super().__init__(**options)
+        self.fleet = fleet
+    
+    def request(self, api, method, params, raw=None):
+        self.simulate()
+        fleet = self.fleet
+        if (api, method) == ('cloudresourcemanager', 'projects.list'):
+            projects = [{'projectId': project_id, 'name': project_id, 'lifecycleState': 'ACTIVE'} for project_id in fleet.projects]
+            return _page(projects, params, 'projects', self.page_size)
+        if (api, method) == ('sqladmin', 'instances.list'):
+            if params['project'] not in fleet.instances:
+                raise FakeApiError(403, f"project {params['project']} is not accessible")
+            return _page(fleet.instances[params['project']], params, 'items', self.page_size)
+        if (api, method) == ('sqladmin', 'instances.get'):
+            for resource in fleet.instances.get(params['project'], ()):
+                if resource['name'] == params['instance']:
+                    return resource
+            raise FakeApiError(404, f"instance {params['instance']} not found")
+        if (api, method) == ('cloudasset', 'search_all_resources'):
+            scope = params['scope']
+            projects = [scope.split('/', 1)[1]] if scope.startswith('projects/') else fleet.projects
+            results = [
+                {
+                    'name': f"//cloudsql.googleapis.com/projects/{project_id}/instances/{resource['name']}",
+                    'display_name': resource['name'],
+                    'location': resource['region'],
+                    'update_time': fleet.update_time.replace('Z', '+00:00')
+                }
+                for project_id in projects for resource in fleet.instances.get(project_id, ())
+            ]
+            start = int(params.get('page_token') or 0)
+            response = {'results': results[start:start + self.page_size]}
+            if start + self.page_size < len(results):
+                response['next_page_token'] = str(start + self.page_size)
+            return response
+        if (api, method) == ('monitoring', 'list_time_series'):
+            return self._time_series(params)
+        raise FakeApiError(400, f"{api} {method} is not supported by the fake backend")
+    
+    def _time_series(self, params):
+        project_id = params['name'].split('/', 1)[1]
+        metric_name = _METRIC_FILTER.search(params['filter']).group(1).replace(METRIC_PREFIX, '')
+        labels = dict(_LABEL_FILTER.findall(params['filter']))
+        series = []
+        for resource in self.fleet.instances.get(project_id, ()):
+            database_id = f"{project_id}:{resource['name']}"
+            if labels and labels.get('database_id') != database_id:
+                continue
+            points = self.fleet.series(project_id, resource['name'], metric_name, params['start'], params['end'], params['alignment'])
+            if points:
+                series.append({'labels': {'database_id': database_id, 'project_id': project_id, 'region': resource['region']},
+                               'points': points})
+        start = int(params.get('page_token') or 0)
+        response = {'time_series': series[start:start + self.page_size]}
+        if start + self.page_size < len(series):
+            response['next_page_token'] = str(start + self.page_size)
+        return response
+
+def _request_key(api, method, params):
+    # Monitoring intervals move with the clock, so recordings match on the query alone
+    if api == 'monitoring':
+        params = {key: value for key, value in params.items() if key not in ('start', 'end')}
+    return json.dumps([api, method, params], sort_keys=True)
+
+def _open_cassette(path, mode):
+    return gzip.open(path, mode + 't', encoding='utf-8') if path.endswith('.gz') else open(path, mode, encoding='utf-8')
+
+class RecordingBackend(_Backend):
+    """Forwards every call to the real APIs and keeps the responses for save()."""
+    
+    def __init__(self, path, **options):
+        super().__init__(**options)
+        self.path = path
+        self.credentials = None
+        self.cassette = {}
+        self._lock = threading.Lock()
+    
+    def request(self, api, method, params, raw=None):
+        import clients
+        credentials = self.credentials
+        if api == 'cloudasset':
+            # One page per request; its real next_page_token comes back with the next request
+            page = clients._real_asset_client(credentials).search_all_resources(request=raw)
+            response = {
+                'results': [
+                    {
+                        'name': result.name,
+                        'display_name': result.display_name,
+                        'location': result.location,
+                        'update_time': result.update_time.isoformat() if result.update_time else None
+                    }
+                    for result in page.results
+                ],
+                'next_page_token': page.next_page_token
+            }
+        elif api == 'monitoring':
+            # One page per request, like the asset search
+            page = clients._real_monitoring_client(credentials).list_time_series(request=raw)
+            response = {
+                'time_series': [
+                    {
+                        'labels': dict(time_series.resource.labels),
+                        'points': [(int(point.interval.end_time.timestamp()), point.value.double_value) for point in time_series.points]
+                    }
+                    for time_series in page.time_series
+                ],
+                'next_page_token': page.next_page_token
+            }
+        else:
+            collection, verb = method.split('.')
+            service = clients._thread_discovery_service(api, 'v1', credentials)
+            response = getattr(getattr(service, collection)(), verb)(**params).execute()
+        with self._lock:
+            self.cassette[_request_key(api, method, params)] = response
+        return response
+    
+    def asset_client(self, credentials):
+        self.credentials = credentials
+        return super().asset_client(credentials)
+    
+    def monitoring_client(self, credentials):
+        self.credentials = credentials
+        return super().monitoring_client(credentials)
+    
+    def discovery_service(self, api, version, credentials):
+        self.credentials = credentials
+        return super().discovery_service(api, version, credentials)
+    
+    def save(self):
+        """Write the recorded responses (gzip-compressed for a .gz path)."""
+        with self._lock, _open_cassette(self.path, 'w') as f:
+            json.dump(self.cassette, f)
+        print(f"Recorded {len(self.cassette)} API responses to {self.path}")
+
+class ReplayBackend(_Backend):
+    """Serves the responses of a RecordingBackend cassette offline."""
+    
+    def __init__(self, path, **options):
+        super().__init__(**options)
+        with _open_cassette(path, 'r') as f:
+            self.cassette = json.load(f)
+    
+    def request(self, api, method, params, raw=None):
+        self.simulate()
+        response = self.cassette.get(_request_key(api, method, params))
+        if response is None:
+            raise FakeApiError(404, f"{api} {method} {params} was not recorded")
+        return response
+
+def backend_from_spec(spec):
+    """Backend for 'fake:PxM[,latency=S,errors=RATE,page_size=N,seed=N]', 'record:PATH' or 'replay:PATH[,latency=S]'."""
+    kind, _, rest = spec.partition(':')
+    target, *option_parts = rest.split(',')
+    options = {}
+    for part in option_parts:
+        key, _, value = part.partition('=')
+        key = {'errors': 'error_rate'}.get(key.strip(), key.strip())
+        options[key] = int(value) if key in ('page_size', 'seed', 'error_code') else float(value)
+    
+    if kind == 'fake':
+        projects, _, instances = target.lower().partition('x')
+        fleet = generate_fleet(int(projects), int(instances or 1), seed=options.get('seed', 0))
+        return FakeBackend(fleet, **options)
+    if kind == 'record':
+        return RecordingBackend(target, **options)
+    if kind == 'replay':
+        return ReplayBackend(target, **options)
+    raise ValueError(f"Unknown backend: {spec}")
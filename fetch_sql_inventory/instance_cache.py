@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - Incremental Instance Cache
+"""
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Layout of the cached records; entries written with another layout are refetched
+RECORD_FORMAT = 3
+
+class InstanceCache:
+    """On-disk cache of the detail fields of inventory records, keyed by project/instance.
+    
+    Only what asset search and SQL Admin return is kept; utilization changes
+    from run to run and is merged in fresh by the caller. An entry is served
+    while it is younger than ttl_seconds and the asset updateTime is
+    unchanged, which saves the SQL Admin call. Failing that, lookup_details
+    checks the etag/settingsVersion of the freshly fetched details; that
+    saves no API call and only confirms the cached fields still hold. Every
+    instance counts as one hit or one miss. Entries for instances that no
+    longer show up in the asset search are evicted.
+    """
+    
+    def __init__(self, path, ttl_seconds=6 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.expired = 0
+        self._seen = set()
+        
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as cache_file:
+                    self.entries = json.load(cache_file)
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable instance cache %s: %s", path, e)
+                self.entries = {}
+    
+    @staticmethod
+    def key(instance):
+        return f"{instance.get('project_id')}/{instance.get('name')}"
+    
+    def _fresh_entry(self, instance, count_expired=True):
+        """Return the cached entry for instance if it is still within its TTL."""
+        self._seen.add(self.key(instance))
+        entry = self.entries.get(self.key(instance))
+        if entry is None or entry.get('format') != RECORD_FORMAT:
+            return None
+        if time.time() - entry.get('cached_at', 0) > self.ttl_seconds:
+            if count_expired:
+                self.expired += 1
+            return None
+        return entry
+    
+    def lookup(self, instance):
+        """Return the cached detail fields if the asset updateTime is unchanged, else None.
+        
+        Only hits are counted here; on None the caller goes on to lookup_details.
+        """
+        entry = self._fresh_entry(instance)
+        update_time = instance.get('update_time')
+        if entry is not None and update_time and entry.get('update_time') == update_time:
+            self.hits += 1
+            return entry['record']
+        return None
+    
+    def lookup_details(self, instance, detailed_info):
+        """Return the cached detail fields if the SQL Admin etag/settingsVersion are unchanged, else None (a miss)."""
+        entry = self._fresh_entry(instance, count_expired=False)
+        etag = detailed_info.get('etag')
+        settings_version = detailed_info.get('settings', {}).get('settingsVersion')
+        if entry is not None and etag and entry.get('etag') == etag and entry.get('settings_version') == settings_version:
+            self.hits += 1
+            return entry['record']
+        self.misses += 1
+        return None
+    
+    def store(self, instance, detailed_info, record):
+        """Cache the detail fields of a freshly built record (see sql_details.detail_fields)."""
+        self._seen.add(self.key(instance))
+        self.entries[self.key(instance)] = {
+            'record': record,
+            'format': RECORD_FORMAT,
+            'etag': detailed_info.get('etag'),
+            'settings_version': detailed_info.get('settings', {}).get('settingsVersion'),
+            'update_time': instance.get('update_time'),
+            'cached_at': time.time()
+        }
+    
+    def evict_missing(self):
+        """Drop entries for instances that were not looked up during this run (i.e. no longer exist)."""
+        for key in [key for key in self.entries if key not in self._seen]:
+            del self.entries[key]
+            self.evicted += 1
+    
+    def save(self):
+        """Write the cache to disk atomically."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as cache_file:
+            json.dump(self.entries, cache_file)
+        os.replace(tmp_path, self.path)
+    
+    def print_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0
+        print(f"Instance cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+              f"{self.expired} expired, {self.evicted} evicted")
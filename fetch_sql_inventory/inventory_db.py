@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - Local Inventory Database
+
+Every collection run is kept as a snapshot in SQLite, indexed on the columns
+inventory questions filter by, so queries over months of runs stay fast:
+
+    python inventory_db.py query --where 'location=europe-west*' --where 'database_version=POSTGRES*'
+        --where public_ip=Yes --where backup_enabled=false
+    python inventory_db.py runs
+"""
+import argparse
+import re
+import sqlite3
+import sys
+import threading
+import time
+from output import convert_value
+
+# Columns indexed (together with run_id) for filtering
+INDEXED_COLUMNS = (
+    'project_id', 'location', 'database_version', 'state',
+    'public_ip', 'private_ip', 'backup_enabled', 'password_policy_enabled',
+    'password_auth_enabled', 'deletion_protection', 'encrypted'
+)
+
+# SQLite column type for each output column kind
+_SQLITE_TYPES = {
+    'string': 'TEXT',
+    'int64': 'INTEGER',
+    'float64': 'REAL',
+    'bool': 'INTEGER',
+    'timestamp': 'TEXT'
+}
+
+_FILTER = re.compile(r'^(\w+)\s*(!=|>=|<=|=|>|<)\s*(.*)$')
+
+def _sqlite_value(value, kind):
+    value = convert_value(value, kind)
+    if kind == 'bool' and value is not None:
+        return int(value)
+    if kind == 'timestamp' and value is not None:
+        return value.isoformat()
+    return value
+
+class InventoryDatabase:
+    """SQLite database of inventory snapshots, one per collection run.
+    
+    Records are upserted into snapshots keyed by (run_id, project_id, name);
+    the runs table records when each run started and finished and how many
+    instances it saw.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " run_id INTEGER PRIMARY KEY AUTOINCREMENT, started_at INTEGER NOT NULL,"
+                " finished_at INTEGER, instance_count INTEGER)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                " run_id INTEGER NOT NULL, project_id TEXT NOT NULL, name TEXT NOT NULL,"
+                " PRIMARY KEY (run_id, project_id, name)) WITHOUT ROWID"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS column_types (column_name TEXT PRIMARY KEY, kind TEXT NOT NULL)"
+            )
+    
+    def column_types(self):
+        """{column: kind} of the snapshot columns, in table order."""
+        with self._lock:
+            kinds = dict(self._conn.execute("SELECT column_name, kind FROM column_types").fetchall())
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(snapshots)").fetchall()]
+        return {column: kinds.get(column, 'string') for column in columns if column != 'run_id'}
+    
+    def _ensure_columns(self, fieldnames, column_types):
+        """Add snapshot columns (and their indexes) that earlier runs didn't have."""
+        existing = self.column_types()
+        with self._lock, self._conn:
+            for field in fieldnames:
+                if not re.match(r'^\w+$', field):
+                    raise ValueError(f"Invalid inventory column name: {field}")
+                kind = column_types.get(field, 'string')
+                if field not in existing:
+                    self._conn.execute(f"ALTER TABLE snapshots ADD COLUMN {field} {_SQLITE_TYPES[kind]}")
+                self._conn.execute("INSERT OR REPLACE INTO column_types (column_name, kind) VALUES (?, ?)", (field, kind))
+                if field in INDEXED_COLUMNS:
+                    self._conn.execute(f"CREATE INDEX IF NOT EXISTS snapshots_{field} ON snapshots ({field}, run_id)")
+    
+    def begin_run(self, fieldnames, column_types=None):
+        """Start a run and return its run_id."""
+        self._ensure_columns(fieldnames, column_types or {})
+        with self._lock, self._conn:
+            cursor = self._conn.execute("INSERT INTO runs (started_at) VALUES (?)", (int(time.time()),))
+        return cursor.lastrowid
+    
+    def add_records(self, run_id, records, fieldnames, column_types=None):
+        """Upsert records into the run's snapshot."""
+        column_types = column_types or {}
+        fields = [field for field in fieldnames if field not in ('project_id', 'name')]
+        columns = ['run_id', 'project_id', 'name'] + fields
+        updates = ', '.join(f"{field} = excluded.{field}" for field in fields) or 'name = excluded.name'
+        sql = (
+            f"INSERT INTO snapshots ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            f" ON CONFLICT (run_id, project_id, name) DO UPDATE SET {updates}"
+        )
+        rows = [
+            [run_id, record.get('project_id') or '', record.get('name') or '']
+            + [_sqlite_value(record.get(field), column_types.get(field, 'string')) for field in fields]
+            for record in records
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+    
+    def finish_run(self, run_id):
+        """Record the end of a run and how many instances it stored."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE runs SET finished_at = ?,"
+                " instance_count = (SELECT COUNT(*) FROM snapshots WHERE run_id = ?) WHERE run_id = ?",
+                (int(time.time()), run_id, run_id)
+            )
+    
+    def runs(self):
+        """(run_id, started_at, finished_at, instance_count) of every run, newest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT run_id, started_at, finished_at, instance_count FROM runs ORDER BY run_id DESC"
+            ).fetchall()
+    
+    def latest_run(self):
+        """run_id of the newest finished run, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(run_id) FROM runs WHERE finished_at IS NOT NULL").fetchone()
+        return row[0]
+    
+    def query(self, filters=(), run_id='latest', columns=None, limit=None):
+        """Select snapshot rows matching every filter.
+        
+        filters are 'column<op>value' strings with op one of = != > < >= <=; a
+        value containing * or ? is matched as a glob (= and != only). Boolean
+        columns accept true/false/yes/no. run_id is a run number, 'latest' or
+        'all'. Returns (column names, rows).
+        """
+        kinds = self.column_types()
+        kinds['run_id'] = 'int64'
+        
+        where = []
+        params = []
+        if run_id == 'latest':
+            run_id = self.latest_run()
+            if run_id is None:
+                return [], []
+        if run_id != 'all':
+            where.append("run_id = ?")
+            params.append(int(run_id))
+        
+        for text in filters:
+            match = _FILTER.match(text.strip())
+            if not match or match.group(1) not in kinds:
+                raise ValueError(f"Invalid filter: {text}")
+            column, op, value = match.groups()
+            if ('*' in value or '?' in value) and op in ('=', '!='):
+                where.append(f"{column} {'NOT GLOB' if op == '!=' else 'GLOB'} ?")
+                params.append(value)
+            elif value == '' or value.lower() in ('null', 'none'):
+                where.append(f"{column} IS {'NOT ' if op == '!=' else ''}NULL")
+            else:
+                where.append(f"{column} {op} ?")
+                params.append(_sqlite_value(value, kinds[column]))
+        
+        selected = list(columns) if columns else ['run_id'] + list(self.column_types())
+        for column in selected:
+            if column not in kinds:
+                raise ValueError(f"Unknown column: {column}")
+        
+        sql = f"SELECT {', '.join(selected)} FROM snapshots"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY run_id, project_id, name"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return selected, rows
+    
+    def iter_run(self, run_id, batch_size=1000):
+        """Stream one run's snapshot as {column: value} records."""
+        columns = list(self.column_types())
+        cursor = self._conn.cursor()
+        with self._lock:
+            cursor.execute(f"SELECT {', '.join(columns)} FROM snapshots WHERE run_id = ? ORDER BY project_id, name", (int(run_id),))
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class InventoryDatabaseSink:
+    """Output sink recording the streamed records as one run of an InventoryDatabase."""
+    
+    def __init__(self, path, fieldnames, column_types=None, batch_size=1000):
+        self.path = path
+        self.count = 0
+        self.fieldnames = fieldnames
+        self.column_types = column_types or {}
+        self.batch_size = batch_size
+        self.database = InventoryDatabase(path)
+        self.run_id = self.database.begin_run(fieldnames, self.column_types)
+        self._pending = []
+    
+    def write(self, record):
+        self._pending.append(record)
+        self.count += 1
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+    
+    def _flush(self):
+        if self._pending:
+            self.database.add_records(self.run_id, self._pending, self.fieldnames, self.column_types)
+            self._pending = []
+    
+    def close(self):
+        self._flush()
+        self.database.finish_run(self.run_id)
+        self.database.close()
+
+def _format_time(seconds):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(seconds)) if seconds else '-'
+
+def main(argv=None):
+    """Command line: query snapshots or list runs."""
+    parser = argparse.ArgumentParser(description="Query the Cloud SQL inventory database.")
+    parser.add_argument('--db', default='cloud_sql_inventory.db', help="inventory database path")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    
+    query_parser = subcommands.add_parser('query', help="list instances matching filters")
+    query_parser.add_argument('--where', action='append', default=[], metavar='COLUMN=VALUE',
+                              help="filter such as location=europe-west* or backup_enabled=false (repeatable)")
+    query_parser.add_argument('--run', default='latest', help="run id, 'latest' (default) or 'all'")
+    query_parser.add_argument('--columns', default='run_id,project_id,name,location,database_version,state',
+                              help="comma-separated columns to show ('*' for all)")
+    query_parser.add_argument('--limit', type=int, help="maximum number of rows")
+    query_parser.add_argument('--count', action='store_true', help="only print the number of matches")
+    
+    subcommands.add_parser('runs', help="list collection runs")
+    
+    args = parser.parse_args(argv)
+    database = InventoryDatabase(args.db)
+    try:
+        if args.command == 'runs':
+            for run_id, started_at, finished_at, instance_count in database.runs():
+                print(f"{run_id}\t{_format_time(started_at)}\t{_format_time(finished_at)}\t{instance_count or 0} instances")
+            return 0
+        
+        columns = None if args.columns == '*' else [column.strip() for column in args.columns.split(',') if column.strip()]
+        start = time.perf_counter()
+        try:
+            columns, rows = database.query(args.where, args.run, columns, None if args.count else args.limit)
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return 1
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        if not args.count:
+            print('\t'.join(columns))
+            for row in rows:
+                print('\t'.join('' if value is None else str(value) for value in row))
+        print(f"{len(rows)} matching instances ({elapsed_ms:.1f} ms)")
+        return 0
+    finally:
+        database.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,55 +1,327 @@
 #!/usr/bin/env python3
 """
 Cloud SQL Inventory - Main Entry Point
+
+    python main.py [collect] [--credentials KEY.json] [--backend fake:20x50] ...
+    python main.py collect --shard-index 0 --shard-count 4 / --processes 8
+    python main.py merge cloud_sql_inventory.shard-*-of-4.csv
+    python main.py optimize cloud_sql_inventory.csv [--percentile p95]
+    python main.py table cloud_sql_inventory.csv
+    python main.py diff old.csv new.csv
+    python main.py db runs
+
+Only the standard library is imported at startup; each subcommand imports
+the modules it needs, so the offline ones don't load the Google clients.
+Settings default to the SQL_INVENTORY_* environment variables below.
 """
+import argparse
+import logging
 import os
-from credentials import get_credentials, list_accessible_projects
-from asset_search import search_sql_instances
-from sql_details import process_sql_instances
-from output import save_to_csv
-from sql_optimizer import optimize_sql_inventory  # Import optimizer function
+import sys
+
+# Number of instances collected concurrently (1 = sequential)
+MAX_WORKERS = int(os.environ.get('SQL_INVENTORY_WORKERS', '16'))
+
+# Optional organizations/{id} or folders/{id} scope searched in a single stream;
+# when unset (or not searchable) every accessible project is searched instead
+SEARCH_SCOPE = os.environ.get('SQL_INVENTORY_SCOPE', '')
+
+# On-disk cache of instance records reused across runs (empty path disables it)
+CACHE_PATH = os.environ.get('SQL_INVENTORY_CACHE', '.sql_inventory_cache.json')
+CACHE_TTL_SECONDS = int(os.environ.get('SQL_INVENTORY_CACHE_TTL', str(6 * 3600)))
 
-def main():
-    # Path to your service account key file
-    service_account_file = "/home/ankit/Downloads/developing-gcp-5c21951f5ad6.json"
+# Local SQLite store of utilization points fetched incrementally (empty path disables it)
+METRICS_STORE_PATH = os.environ.get('SQL_INVENTORY_METRICS_STORE', 'cloud_sql_metrics.db')
+# Window (days) the utilization averages handed to the optimizer are computed over
+METRICS_WINDOW_DAYS = int(os.environ.get('SQL_INVENTORY_METRICS_WINDOW_DAYS', '7'))
+# Collect 5-minute points and add p50/p95/p99/max columns to the inventory
+COLLECT_PERCENTILES = os.environ.get('SQL_INVENTORY_PERCENTILES', '1') == '1'
+# Utilization statistic the optimizer rules run on (e.g. p95); empty uses the mean
+OPTIMIZER_PERCENTILE = os.environ.get('SQL_INVENTORY_OPTIMIZER_PERCENTILE', '')
+# SQLite inventory database keeping a snapshot of every run (empty path disables it)
+INVENTORY_DB_PATH = os.environ.get('SQL_INVENTORY_DB', 'cloud_sql_inventory.db')
+# Extra inventory outputs besides the CSV, comma-separated; the extension picks the
+# format (.parquet, .arrow, .jsonl, .jsonl.gz, .jsonl.zst)
+OUTPUT_PATHS = [path for path in os.environ.get('SQL_INVENTORY_OUTPUTS', '').split(',') if path.strip()]
+# Service account key file; empty uses Application Default Credentials
+CREDENTIALS_PATH = os.environ.get('SQL_INVENTORY_CREDENTIALS', '')
+# Inventory CSV written by collect
+CSV_PATH = os.environ.get('SQL_INVENTORY_CSV', 'cloud_sql_inventory.csv')
+# Shard of the project list collected by this process (see sharding), and the number of shards
+SHARD_INDEX = int(os.environ.get('SQL_INVENTORY_SHARD_INDEX', '0'))
+SHARD_COUNT = int(os.environ.get('SQL_INVENTORY_SHARD_COUNT', '1'))
+# Collect with this many local shard processes, then merge them (0 or 1 collects in-process)
+PROCESSES = int(os.environ.get('SQL_INVENTORY_PROCESSES', '0'))
+# Offline stand-in for the GCP APIs (see fake_gcp.backend_from_spec), e.g. 'fake:20x50',
+# 'record:cassette.json.gz' or 'replay:cassette.json.gz'; empty uses the real APIs
+BACKEND = os.environ.get('SQL_INVENTORY_BACKEND', '')
+# Level of per-call log messages (DEBUG shows every query and instance)
+LOG_LEVEL = os.environ.get('SQL_INVENTORY_LOG_LEVEL', 'WARNING')
+# Chrome trace of phase spans, RPC latencies and counters (empty disables telemetry)
+TRACE_PATH = os.environ.get('SQL_INVENTORY_TRACE', '')
+
+def _collect(records, into):
+    """Pass records through unchanged, keeping each one in the into list."""
+    for record in records:
+        into.append(record)
+        yield record
+
+def collect(args):
+    """Collect the inventory into the CSV (and sinks), then run the optimizer on it.
     
-    # Get credentials from service account file
-    credentials = get_credentials(service_account_file)
+    With --shard-count N only the shard's projects are collected, into
+    shard-tagged files, and the optimizer is left to the merge step. With
+    --processes N the shards run over a local process pool and are merged here.
+    """
+    if args.shard_count < 1 or not 0 <= args.shard_index < args.shard_count:
+        print(f"Error: shard index {args.shard_index} is outside 0..{args.shard_count - 1}")
+        return 1
+    if args.processes > 1 and args.shard_count == 1:
+        return _collect_local_shards(args)
+    sharded = args.shard_count > 1
     
-    print("Determining scope for asset search...")
-    projects = list_accessible_projects(credentials)
+    from credentials import get_credentials, list_accessible_projects
+    from asset_search import search_scope_sql_instances, search_projects_sql_instances
+    from sql_details import iter_sql_instance_details, INVENTORY_FIELDS, INVENTORY_COLUMN_TYPES
+    from output import save_to_csv, open_sink, tee_to_sinks
+    from instance_cache import InstanceCache
+    from metrics_store import MetricsStore
+    from api_scheduler import get_api_scheduler
+    from clients import set_backend
+    import telemetry
     
-    if not projects:
-        print("No accessible projects found.")
-        return
+    if sharded:
+        from api_scheduler import ApiScheduler, set_api_scheduler
+        from sharding import shard_path, shard_projects, shard_instances, shard_rate_limits
+        # Each shard keeps its own files, and its share of the API quotas
+        tag = lambda path: shard_path(path, args.shard_index, args.shard_count)
+        args.csv, args.cache, args.metrics_store, args.trace = map(tag, (args.csv, args.cache, args.metrics_store, args.trace))
+        args.output = [tag(path.strip()) for path in args.output]
+        args.db = ''
+        args.no_optimize = True
+        set_api_scheduler(ApiScheduler(shard_rate_limits(args.shard_count)))
+        print(f"Collecting shard {args.shard_index} of {args.shard_count}")
     
-    print(f"Found {len(projects)} accessible projects.")
-    all_sql_instances = []
-
-    for project_id in projects:
-        print(f"Scanning project: {project_id}")
-        project_scope = f"projects/{project_id}"
-        sql_instances = search_sql_instances(credentials, project_scope)
+    tracer = telemetry.enable() if args.trace else None
+    
+    backend = None
+    recording = False
+    if args.backend:
+        from fake_gcp import backend_from_spec, RecordingBackend
+        backend = backend_from_spec(args.backend)
+        recording = isinstance(backend, RecordingBackend)
+        set_backend(backend)
+        print(f"Using offline API backend: {args.backend}")
+    
+    # Key file or Application Default Credentials (fake and replayed APIs need none)
+    credentials = get_credentials(args.credentials) if backend is None or recording else None
+    
+    sql_instances = None
+    if args.scope:
+        sql_instances = search_scope_sql_instances(credentials, args.scope)
+        if sql_instances is not None and sharded:
+            sql_instances = shard_instances(sql_instances, args.shard_index, args.shard_count)
+    
+    if sql_instances is None:
+        print("Determining scope for asset search...")
+        with telemetry.span('project_listing'):
+            projects = list_accessible_projects(credentials)
+        
+        if not projects:
+            print("No accessible projects found.")
+            return 1
         
-        if sql_instances:
-            print(f"  Found {len(sql_instances)} Cloud SQL instances in project {project_id}.")
-            all_sql_instances.extend(sql_instances)
-        else:
-            print(f"  No Cloud SQL instances found in project {project_id}.")
-
-    if all_sql_instances:
-        print(f"Processing details for {len(all_sql_instances)} SQL instances...")
-        sql_details = process_sql_instances(all_sql_instances, credentials)
-        csv_path = 'cloud_sql_inventory.csv'
-        save_to_csv(sql_details, csv_path)
-        print(f"Cloud SQL inventory has been saved to '{csv_path}'")
-
-        # Now call the optimizer
-        print("Running SQL optimizer...")
-        optimize_sql_inventory(csv_path)
-        print("SQL optimization report generated.")
+        print(f"Found {len(projects)} accessible projects.")
+        if sharded:
+            projects = shard_projects(projects, args.shard_index, args.shard_count)
+            print(f"{len(projects)} projects are in shard {args.shard_index}.")
+        sql_instances = search_projects_sql_instances(credentials, projects, max_workers=args.workers)
+    
+    # Instances stream from the search through details/metrics into the CSV;
+    # the typed records are also kept for the optimizer
+    print("Processing details for Cloud SQL instances as they are found...")
+    cache = InstanceCache(args.cache, ttl_seconds=args.cache_ttl) if args.cache else None
+    metrics_store = MetricsStore(args.metrics_store, fine_retention_days=args.metrics_window_days) if args.metrics_store else None
+    sql_details = iter_sql_instance_details(
+        sql_instances,
+        credentials,
+        max_workers=args.workers,
+        cache=cache,
+        metrics_store=metrics_store,
+        metrics_window_days=args.metrics_window_days,
+        percentiles=args.percentiles
+    )
+    csv_path = args.csv
+    inventory = []
+    sinks = [open_sink(path.strip(), INVENTORY_FIELDS, INVENTORY_COLUMN_TYPES) for path in args.output]
+    if args.db:
+        sinks.append(open_sink(args.db, INVENTORY_FIELDS, INVENTORY_COLUMN_TYPES))
+    with telemetry.span('collect'):
+        count = save_to_csv(_collect(tee_to_sinks(sql_details, sinks), inventory), csv_path, fieldnames=INVENTORY_FIELDS)
+    if metrics_store is not None:
+        metrics_store.prune()
+        metrics_store.close()
+    get_api_scheduler().print_summary()
+    if recording:
+        backend.save()
+    
+    if count:
+        print(f"Cloud SQL inventory of {count} instances has been saved to '{csv_path}'")
+        if not args.no_optimize:
+            _optimize_inventory(inventory, csv_path, args.optimizer_percentile)
+    elif sharded:
+        print(f"No Cloud SQL instances found in shard {args.shard_index}.")
     else:
         print("No Cloud SQL instances found in any accessible projects.")
+    
+    if tracer is not None:
+        tracer.print_summary()
+        tracer.export(args.trace)
+    return 0
+
+def _optimize_inventory(inventory, csv_path, percentile):
+    from sql_optimizer import optimize_sql_inventory
+    import telemetry
+    print("Running SQL optimizer...")
+    with telemetry.span('optimizer'):
+        optimize_sql_inventory(inventory, percentile=percentile or None, base_name=os.path.splitext(csv_path)[0])
+    print("SQL optimization report generated.")
+
+def _merge_partials(partials, args):
+    """Merge partial inventories into args.csv (and the database/extra outputs), then optimize."""
+    from sharding import merge_partials
+    from sql_details import INVENTORY_FIELDS, INVENTORY_COLUMN_TYPES
+    from output import save_to_csv, open_sink, tee_to_sinks
+    
+    if not partials:
+        print("No partial inventories to merge.")
+        return 1
+    stats = {}
+    inventory = []
+    sinks = [open_sink(path.strip(), INVENTORY_FIELDS, INVENTORY_COLUMN_TYPES) for path in args.output]
+    if args.db:
+        sinks.append(open_sink(args.db, INVENTORY_FIELDS, INVENTORY_COLUMN_TYPES))
+    records = merge_partials(partials, INVENTORY_COLUMN_TYPES, stats)
+    count = save_to_csv(_collect(tee_to_sinks(records, sinks), inventory), args.csv, fieldnames=INVENTORY_FIELDS)
+    print(f"Merged {stats['read']} records from {len(partials)} partial inventories into {count} instances "
+          f"({stats['duplicates']} duplicates dropped)")
+    if count and not args.no_optimize:
+        _optimize_inventory(inventory, args.csv, args.optimizer_percentile)
+    return 0
+
+def _collect_local_shards(args):
+    """Collect args.processes shards over a local process pool and merge them."""
+    from sharding import run_local_shards
+    options = {key: value for key, value in vars(args).items() if key != 'handler'}
+    options['processes'] = 0
+    try:
+        partials = run_local_shards(collect, options, args.processes, args.csv, processes=args.processes)
+    except RuntimeError as e:
+        print(f"Error: {str(e)}")
+        return 1
+    return _merge_partials(partials, args)
+
+def merge(args):
+    """Merge partial inventories written by collect shards."""
+    return _merge_partials(args.partials, args)
+
+def optimize(args):
+    """Run the optimizer on an existing inventory CSV."""
+    from sql_optimizer import optimize_sql_inventory
+    if not os.path.exists(args.csv):
+        print(f"Error: File {args.csv} not found.")
+        return 1
+    return 0 if optimize_sql_inventory(args.csv, percentile=args.percentile or None, engine=args.engine) else 1
+
+def table(args):
+    """Render an inventory CSV as a text table."""
+    from csvToTable import convert_csv_to_table
+    return 0 if convert_csv_to_table(args.csv) else 1
+
+# Subcommands handed to another module's own command line, with their arguments
+DELEGATED_COMMANDS = {
+    'diff': ('snapshot_diff', "compare two inventory snapshots (see snapshot_diff.py --help)"),
+    'db': ('inventory_db', "query the inventory database (see inventory_db.py --help)"),
+    'bench': ('benchmarks', "run the benchmark suite (see benchmarks.py --help)")
+}
+
+def build_parser():
+    """Parser of the collect/merge/optimize/table subcommands (diff, db and bench are only listed)."""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--log-level', default=LOG_LEVEL, help="level of per-call log messages (default WARNING)")
+    parser = argparse.ArgumentParser(description="Cloud SQL inventory and optimization.")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    
+    collect_parser = commands.add_parser('collect', parents=[common],
+                                         help="collect the inventory and run the optimizer (default)")
+    collect_parser.add_argument('--credentials', default=CREDENTIALS_PATH,
+                                help="service account key file (default: Application Default Credentials)")
+    collect_parser.add_argument('--scope', default=SEARCH_SCOPE, help="organizations/ID or folders/ID to search")
+    collect_parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="instances collected concurrently")
+    collect_parser.add_argument('--csv', default=CSV_PATH, help="inventory CSV to write")
+    collect_parser.add_argument('--output', action='append', default=list(OUTPUT_PATHS),
+                                help="extra inventory output (.parquet, .arrow, .jsonl[.gz|.zst]); repeatable")
+    collect_parser.add_argument('--db', default=INVENTORY_DB_PATH, help="inventory database ('' disables it)")
+    collect_parser.add_argument('--cache', default=CACHE_PATH, help="instance cache file ('' disables it)")
+    collect_parser.add_argument('--cache-ttl', type=int, default=CACHE_TTL_SECONDS, help="instance cache TTL in seconds")
+    collect_parser.add_argument('--metrics-store', default=METRICS_STORE_PATH, help="metrics store ('' disables it)")
+    collect_parser.add_argument('--metrics-window-days', type=int, default=METRICS_WINDOW_DAYS,
+                                help="days the utilization averages cover")
+    collect_parser.add_argument('--percentiles', action=argparse.BooleanOptionalAction, default=COLLECT_PERCENTILES,
+                                help="collect 5-minute points and p50/p95/p99/max columns")
+    collect_parser.add_argument('--optimizer-percentile', default=OPTIMIZER_PERCENTILE,
+                                help="utilization statistic the optimizer uses (e.g. p95)")
+    collect_parser.add_argument('--no-optimize', action='store_true', help="only collect the inventory")
+    collect_parser.add_argument('--backend', default=BACKEND, help="offline API backend (fake:PxM, record:PATH, replay:PATH)")
+    collect_parser.add_argument('--trace', default=TRACE_PATH, help="write a Chrome trace of the run to this file")
+    collect_parser.add_argument('--shard-index', type=int, default=SHARD_INDEX, help="shard collected by this process")
+    collect_parser.add_argument('--shard-count', type=int, default=SHARD_COUNT,
+                                help="number of shards the projects are split into")
+    collect_parser.add_argument('--processes', type=int, default=PROCESSES,
+                                help="collect this many shards over local processes, then merge them")
+    collect_parser.set_defaults(handler=collect)
+    
+    merge_parser = commands.add_parser('merge', parents=[common],
+                                       help="merge partial inventories of collect shards and run the optimizer")
+    merge_parser.add_argument('partials', nargs='+', help="partial inventories (.csv, .jsonl[.gz|.zst], .parquet)")
+    merge_parser.add_argument('--csv', default=CSV_PATH, help="merged inventory CSV to write")
+    merge_parser.add_argument('--output', action='append', default=list(OUTPUT_PATHS),
+                              help="extra merged inventory output; repeatable")
+    merge_parser.add_argument('--db', default=INVENTORY_DB_PATH, help="inventory database ('' disables it)")
+    merge_parser.add_argument('--optimizer-percentile', default=OPTIMIZER_PERCENTILE,
+                              help="utilization statistic the optimizer uses (e.g. p95)")
+    merge_parser.add_argument('--no-optimize', action='store_true', help="only merge the inventories")
+    merge_parser.set_defaults(handler=merge)
+    
+    optimize_parser = commands.add_parser('optimize', parents=[common], help="run the optimizer on an inventory CSV")
+    optimize_parser.add_argument('csv', nargs='?', default=CSV_PATH, help="inventory CSV")
+    optimize_parser.add_argument('--percentile', default=OPTIMIZER_PERCENTILE, help="utilization statistic (e.g. p95)")
+    optimize_parser.add_argument('--engine', choices=('columnar', 'rows'), default='columnar', help="optimizer engine")
+    optimize_parser.set_defaults(handler=optimize)
+    
+    table_parser = commands.add_parser('table', parents=[common], help="render an inventory CSV as a text table")
+    table_parser.add_argument('csv', nargs='?', default=CSV_PATH, help="inventory CSV")
+    table_parser.set_defaults(handler=table)
+    
+    for name, (_, description) in DELEGATED_COMMANDS.items():
+        commands.add_parser(name, help=description, add_help=False)
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    
+    # diff/db/bench parse their own arguments
+    if argv and argv[0] in DELEGATED_COMMANDS:
+        logging.basicConfig(level=LOG_LEVEL.upper(), format='%(levelname)s %(name)s: %(message)s')
+        module = __import__(DELEGATED_COMMANDS[argv[0]][0])
+        return module.main(argv[1:])
+    
+    # Without a subcommand the arguments are collect's, as before subcommands existed
+    if not argv or argv[0] not in ('collect', 'merge', 'optimize', 'table', '-h', '--help'):
+        argv = ['collect'] + argv
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s %(name)s: %(message)s')
+    return args.handler(args)
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
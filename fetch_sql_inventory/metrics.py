@@ -2,37 +2,73 @@
 """
 Cloud SQL Inventory - Metrics Collection
 """
-from google.cloud import monitoring_v3
+from clients import get_monitoring_client
+from api_scheduler import call_api
+from metrics_store import FINE_ALIGNMENT_SECONDS, HOURLY_ALIGNMENT_SECONDS
+import telemetry
 import datetime
+import logging
 import time
+import numpy as np
 
-def get_instance_metrics(project_id, instance_name, credentials):
-    """Get utilization metrics for a specific Cloud SQL instance."""
-    client = monitoring_v3.MetricServiceClient(credentials=credentials)
-    project_name = f"projects/{project_id}"
+logger = logging.getLogger(__name__)
+
+METRIC_TYPES = [
+    "cloudsql.googleapis.com/database/cpu/utilization",
+    "cloudsql.googleapis.com/database/memory/utilization",
+    "cloudsql.googleapis.com/database/disk/utilization",
+    "cloudsql.googleapis.com/database/network/connections"
+]
+
+# Monitoring keeps Cloud SQL metrics for six weeks; a fresh store backfills this much of hourly points
+BACKFILL_DAYS = 42
+
+def _time_series_page(client, request, page_token=""):
+    """One page of list_time_series: (time series, next page token).
     
+    Every page is its own scheduled (throttled and retried) API call; the
+    pager's first response holds exactly the page that was requested.
+    """
+    if page_token:
+        request = dict(request, page_token=page_token)
+    response = call_api('monitoring', client.list_time_series, request=request, method='list_time_series')
+    return list(response.time_series), response.next_page_token
+
+def _list_time_series(client, request):
+    """Every time series of a list_time_series request, read page by page through the API scheduler."""
+    results, page_token = _time_series_page(client, request)
+    while page_token:
+        page, page_token = _time_series_page(client, request, page_token)
+        results.extend(page)
+    return results
+
+def get_metrics_interval(days=7):
+    """Build the Monitoring time interval covering the last `days` days."""
+    from google.cloud import monitoring_v3
     now = time.time()
     seconds = int(now)
     nanos = int((now - seconds) * 10**9)
     end_time = datetime.datetime.fromtimestamp(now)
-    start_time = end_time - datetime.timedelta(days=7)
+    start_time = end_time - datetime.timedelta(days=days)
     
-    interval = monitoring_v3.TimeInterval(
+    return monitoring_v3.TimeInterval(
         {
             "start_time": {"seconds": int(start_time.timestamp()), "nanos": 0},
             "end_time": {"seconds": seconds, "nanos": nanos},
         }
     )
+
+def get_instance_metrics(project_id, instance_name, credentials):
+    """Get utilization metrics for a specific Cloud SQL instance."""
+    from google.cloud import monitoring_v3
+    client = get_monitoring_client(credentials)
+    project_name = f"projects/{project_id}"
+    
+    interval = get_metrics_interval()
     
     metrics = {}
-    metric_types = [
-        "cloudsql.googleapis.com/database/cpu/utilization",
-        "cloudsql.googleapis.com/database/memory/utilization",
-        "cloudsql.googleapis.com/database/disk/utilization",
-        "cloudsql.googleapis.com/database/network/connections"
-    ]
     
-    print(f"Fetching metrics for instance {instance_name} in project {project_id}")
+    logger.debug("Fetching metrics for instance %s in project %s", instance_name, project_id)
     
     resource_filters = [
         f'resource.labels.database_id="{instance_name}"',
@@ -40,16 +76,17 @@ def get_instance_metrics(project_id, instance_name, credentials):
         f'resource.labels.database_id="{project_id}:{instance_name}"'
     ]
     
-    for metric_type in metric_types:
+    for metric_type in METRIC_TYPES:
         metric_name = metric_type.replace("cloudsql.googleapis.com/", "")
         metric_found = False
         
-        for resource_filter in resource_filters:
+        for filter_index, resource_filter in enumerate(resource_filters):
             query = f'metric.type="{metric_type}" AND {resource_filter}'
-            print(f"  Trying query: {query}")
+            logger.debug("Trying query: %s", query)
             
             try:
-                results = client.list_time_series(
+                results = _list_time_series(
+                    client,
                     request={
                         "name": project_name,
                         "filter": query,
@@ -70,16 +107,184 @@ def get_instance_metrics(project_id, instance_name, credentials):
                         metric_found = True
                         break
                 
-                print(f"  Found {time_series_count} time series for {metric_name}")
+                logger.debug("Found %d time series for %s", time_series_count, metric_name)
                 
                 if metric_found:
+                    if filter_index:
+                        telemetry.count('metrics.fallback_filter_hits')
                     break
-                    
+                telemetry.count('metrics.empty_results')
+            
             except Exception as e:
-                print(f"  Error querying {metric_name} with filter {resource_filter}: {str(e)}")
+                logger.warning("Error querying %s with filter %s: %s", metric_name, resource_filter, e)
         
         if metric_name not in metrics:
-            print(f"  No data points found for {metric_name} after trying all filters")
-            metrics[metric_name] = 0
+            logger.info("No data points found for %s of %s after trying all filters", metric_name, instance_name)
+            telemetry.count('metrics.missing_after_fallbacks')
+            metrics[metric_name] = None
+    
+    return metrics
+
+def _metric_name(metric_type):
+    return metric_type.replace("cloudsql.googleapis.com/", "")
+
+def _database_instance_name(time_series):
+    # database_id is "{project}:{instance}"
+    database_id = time_series.resource.labels.get('database_id', '')
+    return database_id.split(':', 1)[-1]
+
+def fetch_project_metric_points(project_id, credentials, metric_type, start_seconds, end_seconds, alignment_seconds=HOURLY_ALIGNMENT_SECONDS):
+    """Fetch every aligned point of one metric for all instances of a project.
+    
+    Returns a list of (instance name, end timestamp, value) tuples.
+    """
+    from google.cloud import monitoring_v3
+    client = get_monitoring_client(credentials)
+    interval = monitoring_v3.TimeInterval(
+        {
+            "start_time": {"seconds": int(start_seconds), "nanos": 0},
+            "end_time": {"seconds": int(end_seconds), "nanos": 0},
+        }
+    )
+    
+    results = _list_time_series(
+        client,
+        request={
+            "name": f"projects/{project_id}",
+            "filter": f'metric.type="{metric_type}" AND resource.type="cloudsql_database"',
+            "interval": interval,
+            "view": monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
+            "aggregation": {
+                "alignment_period": {"seconds": alignment_seconds},
+                "per_series_aligner": monitoring_v3.Aggregation.Aligner.ALIGN_MEAN,
+            }
+        }
+    )
+    
+    points = []
+    for time_series in results:
+        instance_name = _database_instance_name(time_series)
+        for point in time_series.points:
+            points.append((instance_name, int(point.interval.end_time.timestamp()), point.value.double_value))
+    return points
+
+def update_project_metrics_store(project_id, credentials, store, fine_window_days=None):
+    """Fetch only the points newer than what the store already holds for a project.
+    
+    Hourly points are backfilled BACKFILL_DAYS; with fine_window_days, the
+    5-minute points of that window (for percentiles) are kept up to date too.
+    """
+    now = int(time.time())
+    alignments = [(HOURLY_ALIGNMENT_SECONDS, BACKFILL_DAYS)]
+    if fine_window_days:
+        alignments.append((FINE_ALIGNMENT_SECONDS, fine_window_days))
+    
+    for metric_type in METRIC_TYPES:
+        metric_name = _metric_name(metric_type)
+        for alignment_seconds, backfill_days in alignments:
+            earliest = now - backfill_days * 86400
+            fetched_until = store.fetched_until(project_id, metric_name, alignment_seconds)
+            if fetched_until is None:
+                start_seconds = earliest
+            else:
+                # Re-fetch the last (possibly partial) alignment bucket
+                start_seconds = max(fetched_until - alignment_seconds, earliest)
+            
+            try:
+                points = fetch_project_metric_points(project_id, credentials, metric_type, start_seconds, now, alignment_seconds)
+                store.add_points(project_id, metric_name, points, now, alignment_seconds)
+                logger.info("Stored %d new points for %s in project %s", len(points), metric_name, project_id)
+                if not points:
+                    telemetry.count('metrics.empty_results')
+            except Exception as e:
+                logger.warning("Error querying %s for project %s: %s", metric_name, project_id, e)
+
+def get_project_metric_series(project_id, credentials, store=None, window_days=7):
+    """Get fine-grained (5-minute) points of every metric for all instances in a project.
+    
+    Returns a mapping of (instance name, metric name) -> float32 array of points,
+    read from the MetricsStore (after updating it) when one is given.
+    """
+    logger.info("Fetching metric series for all instances in project %s", project_id)
+    
+    if store is not None:
+        update_project_metrics_store(project_id, credentials, store, fine_window_days=window_days)
+        return store.window_series(project_id, window_days)
+    
+    now = int(time.time())
+    series = {}
+    for metric_type in METRIC_TYPES:
+        metric_name = _metric_name(metric_type)
+        try:
+            points = fetch_project_metric_points(
+                project_id, credentials, metric_type, now - window_days * 86400, now, FINE_ALIGNMENT_SECONDS
+            )
+        except Exception as e:
+            logger.warning("Error querying %s for project %s: %s", metric_name, project_id, e)
+            continue
+        
+        instance_points = {}
+        for instance_name, _, value in points:
+            instance_points.setdefault(instance_name, []).append(value)
+        for instance_name, values in instance_points.items():
+            series[(instance_name, metric_name)] = np.array(values, dtype=np.float32)
+        logger.info("Found %d points for %s in project %s", len(points), metric_name, project_id)
+        if not points:
+            telemetry.count('metrics.empty_results')
+    
+    return series
+
+def get_project_metrics(project_id, credentials, store=None, window_days=7):
+    """Get utilization metrics for every Cloud SQL instance in a project.
+    
+    Issues one list_time_series call per metric type for the whole project and
+    splits the returned series by their database_id label. Returns a mapping of
+    instance name -> {metric name: value}. With a MetricsStore, only the points
+    since the last run are fetched and the window_days mean is computed locally.
+    """
+    from google.cloud import monitoring_v3
+    logger.info("Fetching metrics for all instances in project %s", project_id)
+    
+    if store is not None:
+        update_project_metrics_store(project_id, credentials, store)
+        return store.window_means(project_id, window_days)
+    
+    client = get_monitoring_client(credentials)
+    project_name = f"projects/{project_id}"
+    interval = get_metrics_interval(window_days)
+    
+    project_metrics = {}
+    for metric_type in METRIC_TYPES:
+        metric_name = _metric_name(metric_type)
+        query = f'metric.type="{metric_type}" AND resource.type="cloudsql_database"'
+        
+        try:
+            results = _list_time_series(
+                client,
+                request={
+                    "name": project_name,
+                    "filter": query,
+                    "interval": interval,
+                    "view": monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
+                    "aggregation": {
+                        "alignment_period": {"seconds": window_days * 86400},
+                        "per_series_aligner": monitoring_v3.Aggregation.Aligner.ALIGN_MEAN,
+                    }
+                }
+            )
+            
+            time_series_count = 0
+            for time_series in results:
+                time_series_count += 1
+                instance_metrics = project_metrics.setdefault(_database_instance_name(time_series), {})
+                if time_series.points and metric_name not in instance_metrics:
+                    instance_metrics[metric_name] = time_series.points[0].value.double_value
+            
+            logger.info("Found %d time series for %s in project %s", time_series_count, metric_name, project_id)
+            if not time_series_count:
+                telemetry.count('metrics.empty_results')
+        
+        except Exception as e:
+            logger.warning("Error querying %s for project %s: %s", metric_name, project_id, e)
     
-    return metrics
\ No newline at end of file
+    return project_metrics
\ No newline at end of file
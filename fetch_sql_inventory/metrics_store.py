@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - Local Metrics Store
+"""
+from itertools import groupby
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# Layout of the store; a store with an older layout is emptied and refetched
+SCHEMA_VERSION = 2
+
+# Alignment (seconds) of the hourly points behind window means and the 5-minute points behind percentiles
+HOURLY_ALIGNMENT_SECONDS = 3600
+FINE_ALIGNMENT_SECONDS = 300
+
+# Table holding the points of each alignment
+POINT_TABLES = {HOURLY_ALIGNMENT_SECONDS: 'points', FINE_ALIGNMENT_SECONDS: 'fine_points'}
+
+class MetricsStore:
+    """SQLite store of per-instance utilization points.
+    
+    Hourly points are kept for retention_days and 5-minute points (only
+    needed for percentiles) for fine_retention_days. Points are keyed by
+    integer instance and metric ids, so a point costs a few bytes more than
+    its timestamp and value. How far each project/metric/alignment has been
+    fetched is recorded too, so each run only asks Monitoring for the
+    interval since the last stored point. Windows of any length are then
+    computed locally.
+    """
+    
+    def __init__(self, path, retention_days=90, fine_retention_days=7):
+        self.path = path
+        self.retention_days = retention_days
+        self.fine_retention_days = fine_retention_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._instance_ids = {}
+        self._metric_ids = {}
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._create_schema()
+    
+    def _create_schema(self):
+        """Create the tables, dropping those of an older layout (their points are fetched again)."""
+        with self._conn:
+            outdated = [row[0] for row in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            for table in outdated:
+                self._conn.execute(f"DROP TABLE {table}")
+            self._conn.execute(
+                "CREATE TABLE instances ("
+                " instance_id INTEGER PRIMARY KEY, project_id TEXT NOT NULL, instance TEXT NOT NULL,"
+                " UNIQUE (project_id, instance))"
+            )
+            self._conn.execute("CREATE TABLE metrics (metric_id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+            for table in POINT_TABLES.values():
+                self._conn.execute(
+                    f"CREATE TABLE {table} ("
+                    " instance_id INTEGER NOT NULL, metric_id INTEGER NOT NULL, ts INTEGER NOT NULL, value REAL NOT NULL,"
+                    " PRIMARY KEY (instance_id, metric_id, ts)) WITHOUT ROWID"
+                )
+            self._conn.execute(
+                "CREATE TABLE fetch_state ("
+                " project_id TEXT NOT NULL, metric TEXT NOT NULL, alignment INTEGER NOT NULL, fetched_until INTEGER NOT NULL,"
+                " PRIMARY KEY (project_id, metric, alignment))"
+            )
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        if outdated:
+            # Give the space of the dropped points back to the file system
+            self._conn.execute("VACUUM")
+    
+    def _instance_id(self, project_id, instance):
+        key = (project_id, instance)
+        instance_id = self._instance_ids.get(key)
+        if instance_id is None:
+            self._conn.execute("INSERT OR IGNORE INTO instances (project_id, instance) VALUES (?, ?)", key)
+            instance_id = self._instance_ids[key] = self._conn.execute(
+                "SELECT instance_id FROM instances WHERE project_id = ? AND instance = ?", key
+            ).fetchone()[0]
+        return instance_id
+    
+    def _metric_id(self, metric):
+        metric_id = self._metric_ids.get(metric)
+        if metric_id is None:
+            self._conn.execute("INSERT OR IGNORE INTO metrics (name) VALUES (?)", (metric,))
+            metric_id = self._metric_ids[metric] = self._conn.execute(
+                "SELECT metric_id FROM metrics WHERE name = ?", (metric,)
+            ).fetchone()[0]
+        return metric_id
+    
+    def fetched_until(self, project_id, metric, alignment=HOURLY_ALIGNMENT_SECONDS):
+        """Return the end of the last fetched interval for a project/metric at an alignment, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_until FROM fetch_state WHERE project_id = ? AND metric = ? AND alignment = ?",
+                (project_id, metric, alignment)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def add_points(self, project_id, metric, points, fetched_until, alignment=HOURLY_ALIGNMENT_SECONDS):
+        """Store (instance, ts, value) points of an alignment and record how far this metric has been fetched."""
+        table = POINT_TABLES[alignment]
+        with self._lock, self._conn:
+            metric_id = self._metric_id(metric)
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {table} (instance_id, metric_id, ts, value) VALUES (?, ?, ?, ?)",
+                ((self._instance_id(project_id, instance), metric_id, ts, value) for instance, ts, value in points)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fetch_state (project_id, metric, alignment, fetched_until) VALUES (?, ?, ?, ?)",
+                (project_id, metric, alignment, fetched_until)
+            )
+    
+    def _window_rows(self, table, select, project_id, window_days, now, suffix):
+        since = int((now or time.time()) - window_days * 86400)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT i.instance, m.name, {select} FROM {table} p"
+                " JOIN instances i ON i.instance_id = p.instance_id JOIN metrics m ON m.metric_id = p.metric_id"
+                f" WHERE i.project_id = ? AND p.ts > ? {suffix}",
+                (project_id, since)
+            ).fetchall()
+    
+    def window_means(self, project_id, window_days, now=None):
+        """Return {instance: {metric: mean}} of the hourly points over the last window_days for a project."""
+        rows = self._window_rows('points', 'AVG(p.value)', project_id, window_days, now, "GROUP BY p.instance_id, p.metric_id")
+        
+        project_metrics = {}
+        for instance, metric, mean in rows:
+            project_metrics.setdefault(instance, {})[metric] = mean
+        return project_metrics
+    
+    def window_series(self, project_id, window_days, now=None):
+        """Return {(instance, metric): float32 array of 5-minute points} over the last window_days for a project."""
+        rows = self._window_rows('fine_points', 'p.value', project_id, window_days, now, "ORDER BY p.instance_id, p.metric_id, p.ts")
+        
+        return {
+            key: np.fromiter((row[2] for row in group), dtype=np.float32)
+            for key, group in groupby(rows, key=lambda row: (row[0], row[1]))
+        }
+    
+    def prune(self, now=None):
+        """Delete hourly points older than the retention period and 5-minute points older than the fine one."""
+        now = now or time.time()
+        deleted = 0
+        with self._lock, self._conn:
+            for table, days in (('points', self.retention_days), ('fine_points', self.fine_retention_days)):
+                deleted += self._conn.execute(f"DELETE FROM {table} WHERE ts <= ?", (int(now - days * 86400),)).rowcount
+        return deleted
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
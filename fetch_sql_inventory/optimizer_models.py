@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Optimizer - Recommendation and cost result models
+"""
+from dataclasses import dataclass
+
+# Recommendation kinds that shrink the instance (and so feed the cost estimate)
+REDUCTION_KINDS = frozenset({
+    'low_connections', 'cpu_very_low_reduce', 'cpu_low_reduce', 'memory_low', 'disk_very_low', 'disk_low'
+})
+
+@dataclass(slots=True)
+class Recommendation:
+    """One optimization recommendation for an instance.
+    
+    Targets are kept as numbers; the sentence shown in reports is produced by
+    render() only when the report is written.
+    """
+    kind: str
+    current_vcpus: object = None
+    current_memory_gb: float = None
+    current_disk_gb: int = None
+    utilization: float = None
+    connections: int = None
+    target_vcpus: object = None
+    target_memory_gb: float = None
+    target_disk_gb: int = None
+    note: str = None
+    
+    @property
+    def reduces_resources(self):
+        return self.kind in REDUCTION_KINDS
+    
+    def render(self):
+        """The recommendation as a report sentence."""
+        kind = self.kind
+        if kind == 'low_connections':
+            return f"Low connection count ({self.connections}) relative to vCPUs ({self.current_vcpus}). Consider reducing vCPUs."
+        if kind == 'cpu_very_low_reduce':
+            return f"CPU utilization very low (<5%). Current: {self.current_vcpus} vCPUs. Recommend reducing to {self.target_vcpus} vCPUs."
+        if kind == 'cpu_shared_core':
+            return "CPU utilization very low (<5%). Consider switching to a shared-core instance type."
+        if kind == 'cpu_low_reduce':
+            return f"CPU utilization low (<20%). Current: {self.current_vcpus} vCPUs. Recommend reducing to {self.target_vcpus} vCPUs."
+        if kind == 'cpu_low_monitor':
+            return "CPU utilization low (<20%). Monitor if this usage pattern continues."
+        if kind == 'cpu_high':
+            return f"CPU utilization high (>80%). Consider upgrading to {self.target_vcpus} vCPUs for better performance."
+        if kind == 'memory_low':
+            return f"Memory utilization low (<30%). Current: {self.current_memory_gb:.1f} GB. Recommend reducing to {self.target_memory_gb:.1f} GB."
+        if kind == 'memory_high':
+            return f"Memory utilization high (>85%). Consider increasing memory from {self.current_memory_gb:.1f} GB to {self.target_memory_gb:.1f} GB."
+        if kind == 'disk_very_low':
+            return f"Disk utilization very low ({self.utilization:.1%}) with {self.current_disk_gb} GB. Consider reducing to {self.target_disk_gb} GB."
+        if kind == 'disk_low':
+            return f"Disk utilization low ({self.utilization:.1%}) with {self.current_disk_gb} GB. Consider reducing to {self.target_disk_gb} GB."
+        if kind == 'disk_high':
+            return f"Disk utilization high ({self.utilization:.1%}). Consider increasing disk size from {self.current_disk_gb} GB to {self.target_disk_gb} GB."
+        if kind == 'never_activated':
+            return "Instance never activated but provisioned. Consider deleting if not needed."
+        if kind == 'unused':
+            return "Instance appears unused (no connections, negligible CPU usage). Consider stopping or deleting if not needed."
+        if kind == 'at_minimum':
+            return "Instance is already at minimum specifications. Consider instance consolidation or stopping if not needed."
+        if kind == 'appropriately_sized':
+            return "Instance appears to be appropriately sized based on current utilization."
+        if kind == 'not_running':
+            return f"Instance is in {self.note} state. No optimization possible until it's running."
+        if kind == 'missing_metrics':
+            return f"No monitoring data for {self.note}; the checks that need it were skipped."
+        if kind == 'incomplete':
+            return f"Instance details are incomplete (missing {self.note}). Skipped: no recommendations or cost estimate."
+        if kind == 'error':
+            return f"Error processing metrics: {self.note}"
+        return self.note or kind
+    
+    def __str__(self):
+        return self.render()
+
+@dataclass(slots=True)
+class CostEstimate:
+    """Current and optimized monthly costs (USD) of one instance."""
+    current_cpu: float
+    current_memory: float
+    current_storage: float
+    current_total: float
+    optimized_cpu: float
+    optimized_memory: float
+    optimized_storage: float
+    optimized_total: float
+    savings: float
+    savings_percentage: float
+    no_optimization_possible: bool
+    
+    @property
+    def annual_savings(self):
+        return self.savings * 12
+
+@dataclass(slots=True)
+class ConsolidationPlan:
+    """A set of compatible instances to merge onto one instance of target_tier."""
+    project_id: str
+    region: str
+    database_version: str
+    availability_type: str
+    members: list
+    target_tier: str
+    target_disk_gb: int
+    current_monthly_cost: float
+    consolidated_monthly_cost: float
+    
+    @property
+    def savings(self):
+        return self.current_monthly_cost - self.consolidated_monthly_cost
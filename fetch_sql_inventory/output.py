@@ -3,32 +3,261 @@
 Cloud SQL Inventory - Output Handling
 """
 import csv
-import os
-import sys
-import subprocess
+import gzip
+import io
+import itertools
+import json
+import time
+from datetime import datetime
+from csvToTable import convert_csv_to_table
+import telemetry
 
-def save_to_csv(data, filename='cloud_sql_inventory.csv'):
-    """Save the Cloud SQL inventory data to a CSV file."""
-    if not data:
-        print("No data to save")
-        return
+# Records buffered per Parquet row group / Arrow record batch
+ROW_GROUP_SIZE = 10000
+
+def format_csv_value(value, float_format='.4f'):
+    """Text for one CSV cell: floats with float_format, None as an empty cell."""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return format(value, float_format)
+    return value
+
+def save_to_csv(data, filename='cloud_sql_inventory.csv', fieldnames=None, flush_every=100, float_format='.4f'):
+    """Save the Cloud SQL inventory data to a CSV file.
     
-    fieldnames = list(data[0].keys())
+    data may be any iterable of records, including a generator; rows are written
+    and flushed as they arrive. fieldnames fixes the header up front (otherwise
+    it is taken from the first record). Typed values are formatted here, floats
+    with float_format and None as empty cells. The text table view is then
+    rendered in-process, using the column widths tracked while writing.
+    Returns the number of rows written.
+    """
+    rows = iter(data)
+    if fieldnames is None:
+        first = next(rows, None)
+        if first is None:
+            print("No data to save")
+            return 0
+        fieldnames = list(first.keys())
+        rows = itertools.chain([first], rows)
     
-    with open(filename, 'w', newline='') as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(data)
+    sink = CsvSink(filename, fieldnames, float_format)
+    tracer = telemetry.get_tracer()
+    writing = 0.0
+    try:
+        for row in rows:
+            # Records may come from a generator, so only the writes count as CSV time
+            if tracer is not None:
+                start = time.perf_counter()
+            sink.write(row)
+            if sink.count % flush_every == 0:
+                sink.flush()
+            if tracer is not None:
+                writing += time.perf_counter() - start
+    finally:
+        sink.close()
+        if tracer is not None:
+            tracer.record_phase('csv', writing)
+    count = sink.count
+    
+    if count == 0:
+        print("No data to save")
+        return 0
     
     print(f"Data has been saved to {filename}")
     
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_to_table_script = os.path.join(script_dir, 'csvToTable.py')  # Make sure this matches your actual filename
+    with telemetry.span('table'):
+        rendered = convert_csv_to_table(filename, sink.column_widths)
+    if rendered:
+        print(f"Table view has been generated")
+    else:
+        print(f"Error generating table view for {filename}")
     
+    return count
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('true', 'yes', '1')
+
+def _to_timestamp(value):
+    # RFC 3339 from the Cloud APIs, e.g. 2024-05-01T12:00:00.123Z
+    if isinstance(value, datetime):
+        return value
     try:
-        subprocess.run([sys.executable, csv_to_table_script, filename], check=True)
-        print(f"Table view has been generated")
-    except subprocess.CalledProcessError as e:
-        print(f"Error generating table view: {e}")
-    except FileNotFoundError as e:
-        print(f"Error: {e}. Make sure csvToTable.py exists in the same directory.")
\ No newline at end of file
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+# Column kinds understood by the typed sinks, with the converter applied to each value
+_CONVERTERS = {
+    'string': str,
+    'int64': int,
+    'float64': float,
+    'bool': _to_bool,
+    'timestamp': _to_timestamp
+}
+
+def convert_value(value, kind):
+    """A record value as the column kind ('string', 'int64', 'float64', 'bool', 'timestamp'); None if missing or invalid."""
+    if value is None or value == '' or value != value:
+        return None
+    try:
+        return _CONVERTERS[kind](value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+class CsvSink:
+    """Sink writing records to a CSV file (floats formatted, None as empty cells).
+    
+    column_widths tracks the longest value of each column, for the table view.
+    """
+    
+    def __init__(self, path, fieldnames, float_format='.4f'):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.float_format = float_format
+        self.count = 0
+        self.column_widths = [len(field) for field in fieldnames]
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+        self._writer.writeheader()
+    
+    def write(self, record):
+        row = {key: format_csv_value(value, self.float_format) for key, value in record.items()}
+        self._writer.writerow(row)
+        self.column_widths = [max(width, len(str(row.get(field, '')))) for width, field in zip(self.column_widths, self.fieldnames)]
+        self.count += 1
+    
+    def flush(self):
+        self._file.flush()
+    
+    def close(self):
+        self._file.close()
+
+class JsonLinesSink:
+    """Sink writing one JSON object per line, optionally gzip or zstd compressed.
+    
+    Values keep their JSON types (numbers stay numbers). compression is None,
+    'gzip' or 'zstd' (the latter needs the zstandard package).
+    """
+    
+    def __init__(self, path, compression=None, level=None):
+        self.path = path
+        self.count = 0
+        if compression == 'gzip':
+            self._file = gzip.open(path, 'wt', encoding='utf-8', compresslevel=level or 6)
+        elif compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("zstd-compressed JSON Lines output requires the 'zstandard' package")
+            self._raw = open(path, 'wb')
+            self._file = io.TextIOWrapper(zstandard.ZstdCompressor(level=level or 3).stream_writer(self._raw), encoding='utf-8')
+        elif compression is None:
+            self._file = open(path, 'w', encoding='utf-8')
+        else:
+            raise ValueError(f"Unsupported JSON Lines compression: {compression}")
+    
+    def write(self, record):
+        self._file.write(json.dumps(record, default=str, separators=(',', ':')))
+        self._file.write('\n')
+        self.count += 1
+    
+    def close(self):
+        # Closing the text wrapper also ends the zstd frame and closes the file
+        self._file.close()
+
+class ArrowSink:
+    """Sink writing typed columns to Parquet or an Arrow IPC file, one row group per ROW_GROUP_SIZE records.
+    
+    column_types maps field names to 'string', 'int64', 'float64', 'bool' or
+    'timestamp' (UTC); fields not listed are strings. Needs pyarrow.
+    """
+    
+    def __init__(self, path, fieldnames, column_types=None, file_format='parquet', row_group_size=ROW_GROUP_SIZE,
+                 compression='zstd'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet/Arrow output requires the 'pyarrow' package")
+        
+        self.path = path
+        self.count = 0
+        self.row_group_size = row_group_size
+        self._pa = pa
+        self._kinds = [(field, (column_types or {}).get(field, 'string')) for field in fieldnames]
+        arrow_types = {
+            'string': pa.string(),
+            'int64': pa.int64(),
+            'float64': pa.float64(),
+            'bool': pa.bool_(),
+            'timestamp': pa.timestamp('us', tz='UTC')
+        }
+        self.schema = pa.schema([(field, arrow_types[kind]) for field, kind in self._kinds])
+        if file_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, self.schema, compression=compression)
+        elif file_format == 'arrow':
+            self._writer = pa.ipc.new_file(path, self.schema)
+        else:
+            raise ValueError(f"Unsupported Arrow file format: {file_format}")
+        self._columns = [[] for _ in self._kinds]
+    
+    def write(self, record):
+        for column, (field, kind) in zip(self._columns, self._kinds):
+            column.append(convert_value(record.get(field), kind))
+        self.count += 1
+        if len(self._columns[0]) >= self.row_group_size:
+            self._flush()
+    
+    def _flush(self):
+        if not self._columns or not self._columns[0]:
+            return
+        batch = self._pa.record_batch(
+            [self._pa.array(column, type=field.type) for column, field in zip(self._columns, self.schema)],
+            schema=self.schema
+        )
+        self._writer.write_batch(batch)
+        self._columns = [[] for _ in self._kinds]
+    
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+def open_sink(path, fieldnames, column_types=None):
+    """Open the output sink matching the file extension.
+    
+    .csv, .parquet, .arrow/.feather, .jsonl, .jsonl.gz, .jsonl.zst and
+    .db/.sqlite (a run of the SQLite inventory database) are supported.
+    """
+    lower = path.lower()
+    if lower.endswith(('.db', '.sqlite')):
+        from inventory_db import InventoryDatabaseSink
+        return InventoryDatabaseSink(path, fieldnames, column_types)
+    if lower.endswith('.csv'):
+        return CsvSink(path, fieldnames)
+    if lower.endswith('.parquet'):
+        return ArrowSink(path, fieldnames, column_types, file_format='parquet')
+    if lower.endswith(('.arrow', '.feather')):
+        return ArrowSink(path, fieldnames, column_types, file_format='arrow')
+    if lower.endswith('.jsonl.gz'):
+        return JsonLinesSink(path, compression='gzip')
+    if lower.endswith(('.jsonl.zst', '.jsonl.zstd')):
+        return JsonLinesSink(path, compression='zstd')
+    if lower.endswith('.jsonl'):
+        return JsonLinesSink(path)
+    raise ValueError(f"No output sink for {path}")
+
+def tee_to_sinks(data, sinks):
+    """Yield every record of data after writing it to each sink; the sinks are closed at the end."""
+    try:
+        for record in data:
+            for sink in sinks:
+                sink.write(record)
+            yield record
+    finally:
+        for sink in sinks:
+            sink.close()
+            print(f"Data has been saved to {sink.path}")
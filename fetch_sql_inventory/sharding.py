@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - Sharded Collection
+
+A collection can be split into shards that run as separate processes or on
+separate machines. Projects are assigned to shards by a stable hash of the
+project ID, so every shard agrees on the split without coordination and a
+project stays in the same shard from run to run (keeping per-shard caches
+and metrics stores warm). Each shard writes a partial inventory; merging the
+partials gives one deduplicated inventory for the optimizer.
+    
+    python main.py collect --shard-index 0 --shard-count 4    # on each node
+    python main.py merge cloud_sql_inventory.shard-*-of-4.csv
+    python main.py collect --processes 8                      # all cores of one machine
+"""
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Compression suffixes kept after the shard tag (inventory.shard-0-of-4.jsonl.gz)
+COMPRESSION_EXTENSIONS = ('.gz', '.zst')
+
+# Column kinds the collector keeps as numbers; the others stay as the API's text
+NUMERIC_KINDS = ('int64', 'float64')
+
+def project_shard(project_id, shard_count):
+    """Shard (0 .. shard_count-1) that project_id belongs to; the same on every machine and run."""
+    digest = hashlib.blake2b(project_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shard_count
+
+def in_shard(project_id, shard_index, shard_count):
+    return shard_count <= 1 or project_shard(project_id, shard_count) == shard_index
+
+def shard_projects(project_ids, shard_index, shard_count):
+    """The projects of one shard, in their original order."""
+    return [project_id for project_id in project_ids if in_shard(project_id, shard_index, shard_count)]
+
+def shard_instances(instances, shard_index, shard_count):
+    """Stream the instances whose project belongs to the shard (for organization/folder searches)."""
+    for instance in instances:
+        if in_shard(instance['project_id'], shard_index, shard_count):
+            yield instance
+
+def shard_path(path, shard_index, shard_count):
+    """path with a shard tag before its extension, e.g. inventory.csv -> inventory.shard-0-of-4.csv."""
+    if not path:
+        return path
+    root, extension = os.path.splitext(path)
+    if extension in COMPRESSION_EXTENSIONS:
+        root, inner = os.path.splitext(root)
+        extension = inner + extension
+    return f"{root}.shard-{shard_index}-of-{shard_count}{extension}"
+
+def shard_rate_limits(shard_count):
+    """Per-shard share of the API quotas, which every shard draws from together."""
+    from api_scheduler import API_RATE_LIMITS
+    return {api: (rate / shard_count, max(1, burst // shard_count)) for api, (rate, burst) in API_RATE_LIMITS.items()}
+
+def merge_partials(paths, column_types=None, stats=None):
+    """Stream the records of partial inventories, each instance once.
+    
+    Instances are identified by project_id and name; the first copy wins.
+    Numeric columns (by column_types) read back from text formats are
+    converted, so the merged records are typed like freshly collected ones.
+    stats, if given, receives 'read' and 'duplicates' counts.
+    """
+    from output import convert_value
+    from snapshot_diff import iter_snapshot, KEY_COLUMNS
+    
+    numeric = {column: kind for column, kind in (column_types or {}).items() if kind in NUMERIC_KINDS}
+    seen = set()
+    read = duplicates = 0
+    for path in paths:
+        for record in iter_snapshot(path):
+            read += 1
+            key = tuple(record.get(column) for column in KEY_COLUMNS)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            yield {column: convert_value(value, numeric[column]) if column in numeric else value
+                   for column, value in record.items()}
+    if stats is not None:
+        stats.update(read=read, duplicates=duplicates)
+
+def _run_shard(collect, options, log_path):
+    """Process-pool worker: one collect shard with its output and logging in log_path; returns its exit code."""
+    import argparse
+    import logging
+    root = logging.getLogger()
+    # The inherited handlers still write to the parent's terminal
+    inherited = root.handlers[:]
+    with open(log_path, 'w') as log:
+        handler = logging.StreamHandler(log)
+        handler.setFormatter(inherited[0].formatter if inherited else logging.Formatter('%(levelname)s %(name)s: %(message)s'))
+        root.handlers = [handler]
+        sys.stdout = sys.stderr = log
+        try:
+            return collect(argparse.Namespace(**options))
+        finally:
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+            root.handlers = inherited
+
+def run_local_shards(collect, options, shard_count, csv_path, processes=None):
+    """Run shard_count collect shards over a pool of processes (default: one per core); returns the partial inventory paths.
+    
+    collect is the collect command and options its parsed arguments, which
+    every shard gets with its own --shard-index. Each shard's output goes to
+    a log file next to its partial CSV. Raises RuntimeError if any shard fails.
+    """
+    processes = min(shard_count, processes or os.cpu_count() or 1)
+    partials = [shard_path(csv_path, index, shard_count) for index in range(shard_count)]
+    logs = [os.path.splitext(partial)[0] + '.log' for partial in partials]
+    
+    print(f"Collecting {shard_count} shards with {processes} processes...")
+    failed = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(_run_shard, collect, dict(options, shard_index=index, shard_count=shard_count), logs[index])
+            for index in range(shard_count)
+        ]
+        for index, future in enumerate(futures):
+            try:
+                code = future.result()
+            except Exception as e:
+                print(f"Shard {index} failed: {str(e)} (see {logs[index]})")
+                failed.append(index)
+                continue
+            if code:
+                print(f"Shard {index} failed (see {logs[index]})")
+                failed.append(index)
+            else:
+                print(f"Shard {index} finished (log: {logs[index]})")
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {shard_count} shards failed")
+    return [partial for partial in partials if os.path.exists(partial)]
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - Snapshot Diff
+
+Compares two inventory snapshots (CSV, JSON Lines or Parquet outputs, or two
+runs of the inventory database) keyed by (project_id, name). The old snapshot
+is indexed by key with a content hash per row; the new one is streamed against
+it, so the diff is O(n) and only rows whose hash differs are compared field by
+field. Values are hashed in one text form per column type, so a Parquet
+timestamp or bool matches its CSV, JSON Lines or database text. Utilization
+columns change every run and are ignored unless asked for.
+
+    python snapshot_diff.py old.csv new.csv
+    python snapshot_diff.py --db cloud_sql_inventory.db            # latest two runs
+    python snapshot_diff.py --db cloud_sql_inventory.db --runs 12 15 --output changes.jsonl
+"""
+import argparse
+import csv
+import gzip
+import hashlib
+import io
+import json
+import sys
+from dataclasses import dataclass, field
+from datetime import timezone
+from output import convert_value, format_csv_value
+from sql_details import INVENTORY_COLUMN_TYPES, UTILIZATION_COLUMNS, UTILIZATION_STATS
+
+# Metric columns, which differ between any two runs
+VOLATILE_COLUMNS = frozenset(
+    list(UTILIZATION_COLUMNS.values())
+    + [f"{column}_{stat}" for column in UTILIZATION_COLUMNS.values() for stat in UTILIZATION_STATS]
+)
+
+# Changes to these columns mark an instance as resized
+RESIZE_COLUMNS = ('tier', 'disk_size_gb')
+
+KEY_COLUMNS = ('project_id', 'name')
+
+@dataclass(slots=True)
+class SnapshotChange:
+    """One instance that was added, removed or modified between two snapshots."""
+    change: str
+    project_id: str
+    name: str
+    fields: dict = field(default_factory=dict)
+    
+    @property
+    def resized(self):
+        return any(column in self.fields for column in RESIZE_COLUMNS)
+    
+    def to_dict(self):
+        change = {'change': self.change, 'project_id': self.project_id, 'name': self.name}
+        if self.fields:
+            change['fields'] = {column: {'old': old, 'new': new} for column, (old, new) in self.fields.items()}
+            change['resized'] = self.resized
+        return change
+
+def _canonical(value, kind=None):
+    """Text form of a value of the given column kind, the same for CSV cells and typed records.
+    
+    Timestamps become UTC ISO 8601 with microseconds, bools 'True'/'False',
+    floats .4f and missing values empty. Values that don't parse as their
+    kind, and columns without a kind, are compared as their CSV text.
+    """
+    typed = convert_value(value, kind) if kind else None
+    if typed is None:
+        if value is None or value == '' or value != value:
+            return ''
+        return str(format_csv_value(value))
+    if kind == 'timestamp':
+        if typed.tzinfo is None:
+            typed = typed.replace(tzinfo=timezone.utc)
+        return typed.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    if kind == 'float64':
+        return format(typed, '.4f')
+    return str(typed)
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith(('.zst', '.zstd')):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Reading zstd-compressed JSON Lines requires the 'zstandard' package")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True), encoding='utf-8')
+    return open(path, 'r', newline='', encoding='utf-8')
+
+def iter_snapshot(path):
+    """Stream the records of an inventory output (.csv, .jsonl[.gz|.zst] or .parquet)."""
+    lower = path.lower()
+    if lower.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Reading Parquet snapshots requires the 'pyarrow' package")
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+    elif '.jsonl' in lower:
+        with _open_text(path) as jsonl_file:
+            for line in jsonl_file:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with _open_text(path) as csv_file:
+            yield from csv.DictReader(csv_file)
+
+def _row_digest(values):
+    return hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=16).digest()
+
+def diff_snapshots(old_records, new_records, ignore=VOLATILE_COLUMNS):
+    """Yield a SnapshotChange for every instance added, removed or modified from old to new.
+    
+    old_records is indexed by (project_id, name) with one content hash per row;
+    new_records is streamed. Columns in ignore are left out of the comparison,
+    as are columns only one side has.
+    """
+    old_index = {}
+    old_columns = None
+    for record in old_records:
+        if old_columns is None:
+            old_columns = [column for column in record if column not in ignore and column not in KEY_COLUMNS]
+            old_kinds = [INVENTORY_COLUMN_TYPES.get(column) for column in old_columns]
+        values = tuple(_canonical(record.get(column), kind) for column, kind in zip(old_columns, old_kinds))
+        old_index[(_canonical(record.get('project_id')), _canonical(record.get('name')))] = (_row_digest(values), values)
+    
+    columns = None
+    positions = None
+    for record in new_records:
+        if columns is None:
+            new_columns = set(record)
+            columns = [column for column in (old_columns or []) if column in new_columns]
+            positions = [old_columns.index(column) for column in columns]
+            kinds = [old_kinds[position] for position in positions]
+        key = (_canonical(record.get('project_id')), _canonical(record.get('name')))
+        values = tuple(_canonical(record.get(column), kind) for column, kind in zip(columns, kinds))
+        
+        old = old_index.pop(key, None)
+        if old is None:
+            yield SnapshotChange('added', *key)
+            continue
+        
+        old_digest, old_values = old
+        if len(columns) != len(old_values):
+            old_values = tuple(old_values[position] for position in positions)
+            old_digest = _row_digest(old_values)
+        if old_digest == _row_digest(values):
+            continue
+        
+        changed = {
+            column: (old_value, new_value)
+            for column, old_value, new_value in zip(columns, old_values, values)
+            if old_value != new_value
+        }
+        if changed:
+            yield SnapshotChange('modified', *key, fields=changed)
+    
+    for key in old_index:
+        yield SnapshotChange('removed', *key)
+
+def _database_runs(path, runs):
+    from inventory_db import InventoryDatabase
+    database = InventoryDatabase(path)
+    if not runs:
+        finished = [run[0] for run in database.runs() if run[2] is not None]
+        if len(finished) < 2:
+            database.close()
+            raise ValueError(f"{path} needs at least two finished runs to diff")
+        runs = [finished[1], finished[0]]
+    return database, runs
+
+def main(argv=None):
+    """Command line: print the change set between two snapshots as JSON Lines plus a summary."""
+    parser = argparse.ArgumentParser(description="Diff two Cloud SQL inventory snapshots.")
+    parser.add_argument('old', nargs='?', help="older inventory output (.csv, .jsonl[.gz|.zst], .parquet)")
+    parser.add_argument('new', nargs='?', help="newer inventory output")
+    parser.add_argument('--db', help="diff runs of this inventory database instead of files")
+    parser.add_argument('--runs', nargs=2, type=int, metavar=('OLD', 'NEW'), help="run ids to diff (default: latest two)")
+    parser.add_argument('--include-metrics', action='store_true', help="also compare utilization columns")
+    parser.add_argument('--output', help="write the change set here instead of stdout")
+    args = parser.parse_args(argv)
+    
+    database = None
+    try:
+        if args.db:
+            database, (old_run, new_run) = _database_runs(args.db, args.runs)
+            old_records, new_records = database.iter_run(old_run), database.iter_run(new_run)
+            labels = (f"run {old_run}", f"run {new_run}")
+        elif args.old and args.new:
+            old_records, new_records = iter_snapshot(args.old), iter_snapshot(args.new)
+            labels = (args.old, args.new)
+        else:
+            parser.error("give two snapshot files or --db")
+        
+        ignore = frozenset() if args.include_metrics else VOLATILE_COLUMNS
+        counts = {'added': 0, 'removed': 0, 'modified': 0, 'resized': 0}
+        out = open(args.output, 'w') if args.output else sys.stdout
+        try:
+            for change in diff_snapshots(old_records, new_records, ignore):
+                counts[change.change] += 1
+                counts['resized'] += change.resized
+                out.write(json.dumps(change.to_dict()) + '\n')
+        finally:
+            if args.output:
+                out.close()
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error diffing snapshots: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        if database is not None:
+            database.close()
+    
+    print(f"{labels[0]} -> {labels[1]}: {counts['added']} added, {counts['removed']} removed, "
+          f"{counts['modified']} modified ({counts['resized']} resized)", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,88 +2,477 @@
 """
 Cloud SQL Inventory - SQL Instance Details
 """
-from googleapiclient.discovery import build
-from metrics import get_instance_metrics
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import time
+from clients import get_sqladmin_service
+from api_scheduler import call_api, is_retryable
+import telemetry
+from metrics import get_instance_metrics, get_project_metrics, get_project_metric_series
+from utilization_stats import compute_fleet_utilization
+
+logger = logging.getLogger(__name__)
+
+# Inventory columns holding per-instance utilization statistics, by metric
+UTILIZATION_COLUMNS = {
+    'database/cpu/utilization': 'cpu_util',
+    'database/memory/utilization': 'memory_util',
+    'database/disk/utilization': 'disk_util',
+    'database/network/connections': 'connections'
+}
+UTILIZATION_STATS = ('p50', 'p95', 'p99', 'max')
+
+# Inventory columns filled from Monitoring; the instance cache never keeps them
+METRIC_COLUMNS = frozenset(
+    list(UTILIZATION_COLUMNS.values())
+    + [f"{column}_{stat}" for column in UTILIZATION_COLUMNS.values() for stat in UTILIZATION_STATS]
+)
 
 def get_cloud_sql_details(credentials, project_id, instance_name):
     """Get detailed information about a Cloud SQL instance using SQL Admin API."""
-    service = build('sqladmin', 'v1', credentials=credentials)
+    service = get_sqladmin_service(credentials)
     
     try:
-        response = service.instances().get(project=project_id, instance=instance_name).execute()
+        response = call_api('sqladmin', service.instances().get(project=project_id, instance=instance_name).execute)
         return response
     except Exception as e:
-        print(f"Error getting details for SQL instance {instance_name} in project {project_id}: {str(e)}")
+        logger.warning("Error getting details for SQL instance %s in project %s: %s", instance_name, project_id, e)
         return {}
 
-def process_sql_instances(sql_instances, credentials):
-    """Process SQL instances and extract relevant details."""
-    sql_details = []
+def list_cloud_sql_instances(credentials, project_id):
+    """List every Cloud SQL instance in a project with paginated instances().list.
     
-    for instance in sql_instances:
-        project_id = instance.get('project_id')
-        instance_name = instance.get('name')
-        print(f"Processing instance: {instance_name} in project {project_id}")
+    Returns a mapping of instance name -> details, or None if the project can't be listed.
+    """
+    service = get_sqladmin_service(credentials)
+    
+    try:
+        details = {}
+        request = service.instances().list(project=project_id)
         
-        # Get detailed information about the instance
-        detailed_info = get_cloud_sql_details(credentials, project_id, instance_name)
+        while request is not None:
+            response = call_api('sqladmin', request.execute)
+            for item in response.get('items', []):
+                details[item.get('name')] = item
+            request = service.instances().list_next(previous_request=request, previous_response=response)
         
-        # Get metrics
+        return details
+    except Exception as e:
+        logger.warning("Error listing SQL instances in project %s: %s", project_id, e)
+        return None
+
+def batch_get_cloud_sql_details(credentials, project_id, instance_names, batch_size=50):
+    """Get details for several instances of one project using HTTP batch requests."""
+    service = get_sqladmin_service(credentials)
+    details = {}
+    retry = []
+    
+    def callback(request_id, response, exception):
+        if exception is not None and is_retryable(exception):
+            retry.append(request_id)
+        elif exception is not None:
+            logger.warning("Error getting details for SQL instance %s in project %s: %s", request_id, project_id, exception)
+        else:
+            details[request_id] = response
+    
+    for i in range(0, len(instance_names), batch_size):
+        names = instance_names[i:i + batch_size]
+        batch = service.new_batch_http_request(callback=callback)
+        for instance_name in names:
+            batch.add(service.instances().get(project=project_id, instance=instance_name), request_id=instance_name)
         try:
-            metrics = get_instance_metrics(project_id, instance_name, credentials)
+            call_api('sqladmin', batch.execute, cost=len(names), method='batch')
         except Exception as e:
-            print(f"Error getting metrics for {instance_name}: {str(e)}")
-            metrics = {}
+            logger.warning("Error executing batch request for project %s: %s", project_id, e)
+    
+    # Throttled or failed entries of a batch are fetched again one by one, with backoff
+    if retry:
+        telemetry.count('sqladmin.batch_entry_retries', len(retry))
+    for instance_name in retry:
+        response = get_cloud_sql_details(credentials, project_id, instance_name)
+        if response:
+            details[instance_name] = response
+    
+    return details
+
+def get_project_sql_details(credentials, project_id, instance_names):
+    """Get details for the given instances of a project in roughly one round trip.
+    
+    Uses instances().list and joins by name; instances the listing doesn't cover
+    (or every instance, if listing isn't permitted) are fetched with batched gets.
+    """
+    details = list_cloud_sql_instances(credentials, project_id) or {}
+    
+    missing = [name for name in dict.fromkeys(instance_names) if name not in details]
+    if missing:
+        details.update(batch_get_cloud_sql_details(credentials, project_id, missing))
+    
+    return details
+
+def _disk_size_gb(value):
+    """dataDiskSizeGb (an int64 string in the API) as an int, or None when absent."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _metric_value(metrics, metric_name, convert):
+    """A collected metric as convert(value), or None when it has no data (never a made-up 0)."""
+    value = metrics.get(metric_name)
+    return convert(value) if value is not None and value == value else None
+
+def metric_fields(metrics):
+    """The utilization columns of a record, from collected metrics (None where there is no data)."""
+    fields = {
+        'cpu_util': _metric_value(metrics, 'database/cpu/utilization', float),
+        'memory_util': _metric_value(metrics, 'database/memory/utilization', float),
+        'disk_util': _metric_value(metrics, 'database/disk/utilization', float),
+        'connections': _metric_value(metrics, 'database/network/connections', int)
+    }
+    
+    # Percentile columns are None when only averages were collected
+    for metric_name, column in UTILIZATION_COLUMNS.items():
+        for stat in UTILIZATION_STATS:
+            value = metrics.get(f"{metric_name}:{stat}")
+            fields[f"{column}_{stat}"] = float(value) if value is not None else None
+    return fields
+
+def build_instance_info(instance, detailed_info, metrics):
+    """Build an inventory record from asset data, SQL Admin details and metrics.
+    
+    Numeric columns keep their types (disk_size_gb and connections are ints,
+    utilization values floats, missing values None); output sinks format them.
+    A metric without data is None, so the optimizer can tell it from an idle 0.
+    """
+    project_id = instance.get('project_id')
+    instance_name = instance.get('name')
+    
+    settings = detailed_info.get('settings', {})
+    ip_config = settings.get('ipConfiguration', {})
+    
+    # Extract maintenance window information
+    maintenance_window = settings.get('maintenanceWindow', {})
+    maintenance_day = maintenance_window.get('day', 'Not specified')
+    maintenance_hour = maintenance_window.get('hour', 'Not specified')
+    maintenance_info = f"{maintenance_day} @ {maintenance_hour}:00" if maintenance_day != 'Not specified' else 'Not specified'
+    
+    # Extract authorized networks
+    authorized_networks = ip_config.get('authorizedNetworks', [])
+    auth_networks_str = ', '.join([network.get('value', '') for network in authorized_networks]) if authorized_networks else 'None'
+    
+    # Extract password policy information
+    password_validation_policy = settings.get('passwordValidationPolicy', {})
+    password_policy_enabled = 'Yes' if password_validation_policy.get('enablePasswordPolicy', False) else 'No'
+    
+    # Determine if password authentication is enabled
+    auth_settings = settings.get('userLabels', {}).get('auth_type', '').lower()
+    password_auth_enabled = 'No' if auth_settings == 'iam_only' else 'Yes'
+    
+    utilization = metric_fields(metrics)
+    
+    instance_info = {
+        'name': instance_name,
+        'project_id': project_id,
+        'location': detailed_info.get('region', instance.get('location', '')),
+        'database_version': detailed_info.get('databaseVersion', ''),
+        'instance_type': detailed_info.get('instanceType', ''),
+        'tier': settings.get('tier', ''),
+        'availability_type': settings.get('availabilityType', ''),
+        'activation_policy': settings.get('activationPolicy', ''),
+        'backup_enabled': str(settings.get('backupConfiguration', {}).get('enabled', False)),
+        'disk_size_gb': _disk_size_gb(settings.get('dataDiskSizeGb')),
+        'state': detailed_info.get('state', ''),
+        'create_time': detailed_info.get('createTime', ''),
+        'public_ip': 'Yes' if any(ip.get('type') == 'PRIMARY' for ip in detailed_info.get('ipAddresses', [])) else 'No',
+        'private_ip': 'Yes' if any(ip.get('type') == 'PRIVATE' for ip in detailed_info.get('ipAddresses', [])) else 'No',
+        'authorized_networks': auth_networks_str,
+        'cert_expiry': detailed_info.get('serverCaCert', {}).get('expirationTime', '') if detailed_info.get('serverCaCert') else '',
+        'maintenance_window': maintenance_info,
+        'password_policy_enabled': password_policy_enabled,
+        'password_auth_enabled': password_auth_enabled,
+        'deletion_protection': 'Yes' if detailed_info.get('deletionProtection', False) else 'No',
+        'cpu_util': utilization.pop('cpu_util'),
+        'memory_util': utilization.pop('memory_util'),
+        'disk_util': utilization.pop('disk_util'),
+        'connections': utilization.pop('connections'),
+        'encrypted': 'Yes' if settings.get('diskEncryptionConfiguration', {}) else 'No'
+    }
+    instance_info.update(utilization)
+    
+    return instance_info
+
+# CSV header of the inventory, known before any instance is processed
+INVENTORY_FIELDS = list(build_instance_info({}, {}, {}))
+
+def merge_metrics(details, metrics):
+    """Inventory record from cached detail fields and freshly collected metrics."""
+    record = dict(details, **metric_fields(metrics))
+    return {field: record.get(field) for field in INVENTORY_FIELDS}
+
+def detail_fields(record):
+    """The fields of a record that come from asset search and SQL Admin (what the instance cache keeps)."""
+    return {field: value for field, value in record.items() if field not in METRIC_COLUMNS}
+
+# Column types for typed output sinks (Parquet/Arrow); other columns are strings
+INVENTORY_COLUMN_TYPES = {
+    'backup_enabled': 'bool',
+    'disk_size_gb': 'int64',
+    'create_time': 'timestamp',
+    'cert_expiry': 'timestamp',
+    'cpu_util': 'float64',
+    'memory_util': 'float64',
+    'disk_util': 'float64',
+    'connections': 'int64'
+}
+INVENTORY_COLUMN_TYPES.update({
+    f"{column}_{stat}": 'float64' for column in UTILIZATION_COLUMNS.values() for stat in UTILIZATION_STATS
+})
+
+def process_sql_instance(instance, credentials, project_metrics=None, project_details=None):
+    """Fetch details and metrics for a single SQL instance and build its inventory record.
+    
+    When project_metrics (from get_project_metrics) or project_details (from
+    get_project_sql_details) are given, values are looked up there instead of
+    being queried per instance.
+    """
+    project_id = instance.get('project_id')
+    instance_name = instance.get('name')
+    logger.debug("Processing instance: %s in project %s", instance_name, project_id)
+    
+    # Get detailed information about the instance
+    if project_details is not None:
+        detailed_info = project_details.get(instance_name, {})
+    else:
+        detailed_info = get_cloud_sql_details(credentials, project_id, instance_name)
+    
+    return build_instance_info(instance, detailed_info, _instance_metrics(instance, credentials, project_metrics))
+
+def _instance_metrics(instance, credentials, project_metrics=None):
+    """Metrics of one instance: looked up in project_metrics when given, else queried."""
+    instance_name = instance.get('name')
+    if project_metrics is not None:
+        return project_metrics.get(instance_name, {})
+    try:
+        return get_instance_metrics(instance.get('project_id'), instance_name, credentials)
+    except Exception as e:
+        logger.warning("Error getting metrics for %s: %s", instance_name, e)
+        return {}
+
+def _process_sql_instance_isolated(instance, credentials, project_metrics=None, project_details=None):
+    """Process one instance, falling back to an empty record so one failure can't stop the run."""
+    try:
+        return process_sql_instance(instance, credentials, project_metrics, project_details)
+    except Exception as e:
+        logger.error("Error processing instance %s in project %s: %s", instance.get('name'), instance.get('project_id'), e)
+        telemetry.count('details.failed_instances')
+        return build_instance_info(instance, {}, {})
+
+def _map_ordered(func, items, executor):
+    """Apply func to every item, on the executor if there is one, keeping input order."""
+    if executor is not None:
+        return list(executor.map(func, items))
+    return [func(item) for item in items]
+
+class _ProjectLRU:
+    """Small LRU of per-project lookups so projects spanning several chunks are fetched once."""
+    
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+    
+    def __contains__(self, project_id):
+        return project_id in self._items
+    
+    def get(self, project_id):
+        value = self._items.get(project_id)
+        if project_id in self._items:
+            self._items.move_to_end(project_id)
+        return value
+    
+    def put(self, project_id, value):
+        self._items[project_id] = value
+        self._items.move_to_end(project_id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+def iter_sql_instance_details(sql_instances, credentials, max_workers=1, batch_metrics=True, batch_details=True, cache=None,
+                              metrics_store=None, metrics_window_days=7, percentiles=False, chunk_size=500):
+    """Stream inventory records for an iterable of asset records, in input order.
+    
+    Instances are consumed chunk_size at a time, so memory stays flat however
+    large the fleet is. With max_workers > 1 each chunk is collected
+    concurrently on one thread pool kept for the whole run, so the per-thread
+    API clients (see clients.get_discovery_service) and their connections
+    are reused from chunk to chunk. With batch_metrics and batch_details,
+    metrics and SQL Admin details are fetched once per project rather than per
+    instance (projects spanning several chunks are reused from a small LRU).
+    With an InstanceCache, the SQL Admin details of unchanged instances are
+    served from the cache and only new or modified ones are fetched; metrics
+    are always collected fresh for every instance. With a MetricsStore, batched metrics
+    are fetched incrementally and averaged locally over metrics_window_days.
+    With percentiles, 5-minute points are pulled and p50/p95/p99/max are
+    computed for every instance of a chunk in one vectorized pass.
+    """
+    details_lru = _ProjectLRU()
+    metrics_lru = _ProjectLRU()
+    
+    def fetch_details(project_instances):
+        missing = {}
+        for project_id, instance_names in project_instances.items():
+            cached = details_lru.get(project_id)
+            if cached is None:
+                missing[project_id] = instance_names
+            elif any(name not in cached for name in instance_names):
+                cached.update(batch_get_cloud_sql_details(credentials, project_id, [name for name in instance_names if name not in cached]))
         
-        settings = detailed_info.get('settings', {})
-        ip_config = settings.get('ipConfiguration', {})
+        project_ids = list(missing)
+        project_details = _map_ordered(
+            lambda project_id: get_project_sql_details(credentials, project_id, missing[project_id]),
+            project_ids,
+            executor
+        )
+        for project_id, details in zip(project_ids, project_details):
+            details_lru.put(project_id, details)
+        return {project_id: details_lru.get(project_id) for project_id in project_instances}
+    
+    def fetch_metrics(project_instances):
+        project_ids = [project_id for project_id in project_instances if project_id not in metrics_lru]
+        
+        if percentiles:
+            project_series = _map_ordered(
+                lambda project_id: get_project_metric_series(project_id, credentials, metrics_store, metrics_window_days),
+                project_ids,
+                executor
+            )
+            fleet_series = {
+                (project_id, instance_name, metric_name): values
+                for project_id, series in zip(project_ids, project_series)
+                for (instance_name, metric_name), values in series.items()
+            }
+            project_metrics = {project_id: {} for project_id in project_ids}
+            for (project_id, instance_name), metrics in compute_fleet_utilization(fleet_series).items():
+                project_metrics[project_id][instance_name] = metrics
+        else:
+            project_metrics = dict(zip(project_ids, _map_ordered(
+                lambda project_id: get_project_metrics(project_id, credentials, metrics_store, metrics_window_days),
+                project_ids,
+                executor
+            )))
+        
+        for project_id, metrics in project_metrics.items():
+            metrics_lru.put(project_id, metrics)
+        return {project_id: metrics_lru.get(project_id) for project_id in project_instances}
+    
+    def process_chunk(chunk):
+        # Detail fields of the instances the cache can serve
+        cached = [None] * len(chunk)
+        if cache is not None:
+            for i, instance in enumerate(chunk):
+                cached[i] = cache.lookup(instance)
         
-        # Extract maintenance window information
-        maintenance_window = settings.get('maintenanceWindow', {})
-        maintenance_day = maintenance_window.get('day', 'Not specified')
-        maintenance_hour = maintenance_window.get('hour', 'Not specified')
-        maintenance_info = f"{maintenance_day} @ {maintenance_hour}:00" if maintenance_day != 'Not specified' else 'Not specified'
+        chunk_projects = {}
+        project_instances = {}
+        for i, instance in enumerate(chunk):
+            chunk_projects.setdefault(instance.get('project_id'), []).append(instance.get('name'))
+            if cached[i] is None:
+                project_instances.setdefault(instance.get('project_id'), []).append(instance.get('name'))
         
-        # Extract authorized networks
-        authorized_networks = ip_config.get('authorizedNetworks', [])
-        auth_networks_str = ', '.join([network.get('value', '') for network in authorized_networks]) if authorized_networks else 'None'
+        details_by_project = {}
+        if batch_details:
+            with telemetry.span('details', projects=len(project_instances)):
+                details_by_project = fetch_details(project_instances)
+        else:
+            # One get per uncached instance, ahead of building, so the cache sees its etag too
+            uncached = [i for i, fields in enumerate(cached) if fields is None]
+            with telemetry.span('details', instances=len(uncached)):
+                fetched = _map_ordered(
+                    lambda i: get_cloud_sql_details(credentials, chunk[i].get('project_id'), chunk[i].get('name')),
+                    uncached,
+                    executor
+                )
+            for i, details in zip(uncached, fetched):
+                details_by_project.setdefault(chunk[i].get('project_id'), {})[chunk[i].get('name')] = details
         
-        # Extract password policy information
-        password_validation_policy = settings.get('passwordValidationPolicy', {})
-        password_policy_enabled = 'Yes' if password_validation_policy.get('enablePasswordPolicy', False) else 'No'
+        # A correctness check, not a saving: the details were fetched already, but an
+        # unchanged etag/settingsVersion means the cached fields still hold even though
+        # the asset updateTime moved, so only the record building is skipped
+        if cache is not None:
+            for i, instance in enumerate(chunk):
+                if cached[i] is None:
+                    project_details = details_by_project.get(instance.get('project_id')) or {}
+                    cached[i] = cache.lookup_details(instance, project_details.get(instance.get('name'), {}))
         
-        # Determine if password authentication is enabled
-        auth_settings = settings.get('userLabels', {}).get('auth_type', '').lower()
-        password_auth_enabled = 'No' if auth_settings == 'iam_only' else 'Yes'
+        # Metrics are never cached: every instance of the chunk gets fresh ones
+        metrics_by_project = {}
+        if batch_metrics:
+            with telemetry.span('metrics', projects=len(chunk_projects)):
+                metrics_by_project = fetch_metrics(chunk_projects)
         
-        instance_info = {
-            'name': instance_name,
-            'project_id': project_id,
-            'location': detailed_info.get('region', instance.get('location', '')),
-            'database_version': detailed_info.get('databaseVersion', ''),
-            'instance_type': detailed_info.get('instanceType', ''),
-            'tier': settings.get('tier', ''),
-            'availability_type': settings.get('availabilityType', ''),
-            'activation_policy': settings.get('activationPolicy', ''),
-            'backup_enabled': str(settings.get('backupConfiguration', {}).get('enabled', False)),
-            'disk_size_gb': str(settings.get('dataDiskSizeGb', '')),
-            'state': detailed_info.get('state', ''),
-            'create_time': detailed_info.get('createTime', ''),
-            'public_ip': 'Yes' if any(ip.get('type') == 'PRIMARY' for ip in detailed_info.get('ipAddresses', [])) else 'No',
-            'private_ip': 'Yes' if any(ip.get('type') == 'PRIVATE' for ip in detailed_info.get('ipAddresses', [])) else 'No',
-            'authorized_networks': auth_networks_str,
-            'cert_expiry': detailed_info.get('serverCaCert', {}).get('expirationTime', '') if detailed_info.get('serverCaCert') else '',
-            'maintenance_window': maintenance_info,
-            'password_policy_enabled': password_policy_enabled,
-            'password_auth_enabled': password_auth_enabled,
-            'deletion_protection': 'Yes' if detailed_info.get('deletionProtection', False) else 'No',
-            'cpu_util': f"{metrics.get('database/cpu/utilization', 0):.4f}",
-            'memory_util': f"{metrics.get('database/memory/utilization', 0):.4f}",
-            'disk_util': f"{metrics.get('database/disk/utilization', 0):.4f}",
-            'connections': str(int(metrics.get('database/network/connections', 0))),
-            'encrypted': 'Yes' if settings.get('diskEncryptionConfiguration', {}) else 'No'
-        }
+        sql_details = [None] * len(chunk)
+        hits = [i for i, details in enumerate(cached) if details is not None]
+        for i, record in zip(hits, _map_ordered(
+            lambda i: merge_metrics(cached[i], _instance_metrics(chunk[i], credentials, metrics_by_project.get(chunk[i].get('project_id')))),
+            hits,
+            executor
+        )):
+            sql_details[i] = record
         
-        sql_details.append(instance_info)
+        pending = [i for i, details in enumerate(cached) if details is None]
+        with telemetry.span('build_records', instances=len(pending)):
+            fetched = _map_ordered(
+                lambda i: _process_sql_instance_isolated(
+                    chunk[i],
+                    credentials,
+                    metrics_by_project.get(chunk[i].get('project_id')),
+                    details_by_project.get(chunk[i].get('project_id'))
+                ),
+                pending,
+                executor
+            )
+        
+        for i, record in zip(pending, fetched):
+            sql_details[i] = record
+            # Records whose details failed to load aren't cached, so the next run retries them
+            if cache is not None and record.get('tier'):
+                instance = chunk[i]
+                project_details = details_by_project.get(instance.get('project_id')) or {}
+                cache.store(instance, project_details.get(instance.get('name'), {}), detail_fields(record))
+        
+        return sql_details
+    
+    start = time.monotonic()
+    processed = 0
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+    try:
+        chunk = []
+        for instance in sql_instances:
+            chunk.append(instance)
+            if len(chunk) >= chunk_size:
+                yield from process_chunk(chunk)
+                processed += len(chunk)
+                chunk = []
+        if chunk:
+            yield from process_chunk(chunk)
+            processed += len(chunk)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    if cache is not None:
+        cache.evict_missing()
+        cache.save()
+        cache.print_stats()
+    
+    elapsed = time.monotonic() - start
+    rate = processed / elapsed if elapsed > 0 else 0
+    print(f"Processed {processed} instances in {elapsed:.1f}s ({rate:.2f} instances/s, {max_workers} workers)")
+
+def process_sql_instances(sql_instances, credentials, **options):
+    """Process SQL instances and extract relevant details.
     
-    return sql_details
\ No newline at end of file
+    Collects iter_sql_instance_details (see there for the options) into a list
+    in the same order as sql_instances.
+    """
+    return list(iter_sql_instance_details(sql_instances, credentials, **options))
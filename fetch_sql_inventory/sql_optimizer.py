@@ -7,9 +7,9 @@ import csv
 import sys
 import os
 import json
-import re
 from datetime import datetime
-import pandas as pd
+from functools import lru_cache
+from optimizer_models import Recommendation, CostEstimate
 
 # GCP Cloud SQL Pricing Model (USD)
 # Source: https://cloud.google.com/sql/pricing (simplified for implementation)
@@ -57,6 +57,18 @@ MIN_VCPU = 1  # Minimum vCPU for standard instances
 MIN_MEMORY_GB = 3.75  # Minimum memory in GB
 MIN_DISK_SIZE_GB = 10  # Minimum disk size in GB
 
+# Rightsizing headroom: a candidate tier must keep measured usage at or below these utilizations
+TARGET_CPU_UTILIZATION = 0.7
+TARGET_MEMORY_UTILIZATION = 0.8
+RIGHTSIZING_ALTERNATIVES = 3  # Ranked alternatives reported after the cheapest fitting tier
+
+# Inventory fields an instance can't be sized or priced without (e.g. when its details failed to load)
+REQUIRED_FIELDS = ('tier', 'disk_size_gb')
+
+# Metric columns the utilization rules read; a rule is skipped when its metric has no data
+METRIC_FIELDS = ('cpu_util', 'memory_util', 'disk_util', 'connections')
+
+@lru_cache(maxsize=None)
 def get_db_version_modifier(db_version):
     """Get pricing modifier based on database version."""
     for key in DB_VERSION_MODIFIER:
@@ -85,8 +97,9 @@ def load_sql_inventory(csv_filename):
         print(f"Error reading CSV file: {str(e)}")
         return []
 
+@lru_cache(maxsize=None)
 def extract_machine_specs(tier):
-    """Extract vCPUs and memory from machine tier."""
+    """Extract vCPUs and memory from machine tier (memoized: fleets reuse a handful of tiers)."""
     try:
         # Check for shared-core instances first
         if 'small' in tier.lower() or 'micro' in tier.lower() or 'f1-micro' in tier.lower():
@@ -95,7 +108,7 @@ def extract_machine_specs(tier):
                 return 0.5, 1920  # 0.5 vCPU, 1.875 GB
             else:  # micro
                 return 0.25, 614  # 0.25 vCPU, 0.6 GB
-                
+        
         if 'custom' in tier.lower():
             # Example format: db-custom-2-7680 (2 vCPUs, 7680 MB memory)
             parts = tier.split('-')
@@ -127,116 +140,178 @@ def extract_machine_specs(tier):
         # Default to minimal instance if can't parse
         return MIN_VCPU, MIN_MEMORY_GB * 1024
 
+@lru_cache(maxsize=None)
+def is_shared_core_tier(tier):
+    """Check if the tier is a shared-core machine type."""
+    return 'small' in tier.lower() or 'micro' in tier.lower() or 'f1-micro' in tier.lower()
+
+@lru_cache(maxsize=None)
 def is_at_minimum_spec(tier):
     """Check if the instance is already at minimum specifications."""
     vcpus, memory_mb = extract_machine_specs(tier)
     
-    # Check if shared-core instance
-    is_shared_core = 'small' in tier.lower() or 'micro' in tier.lower() or 'f1-micro' in tier.lower()
-    
     # If it's a shared-core or at minimum specs
-    if is_shared_core or (vcpus <= MIN_VCPU and memory_mb/1024 <= MIN_MEMORY_GB):
+    if is_shared_core_tier(tier) or (vcpus <= MIN_VCPU and memory_mb/1024 <= MIN_MEMORY_GB):
         return True
     
     return False
 
-def get_instance_recommendations(instance):
-    """Generate recommendations for a single SQL instance."""
+def is_missing(value):
+    """Whether a record value is absent: None, '' (from csv) or NaN (from pandas)."""
+    return value is None or value == '' or value != value
+
+def missing_fields(instance, fields=REQUIRED_FIELDS):
+    """The fields of REQUIRED_FIELDS (by default) that a record lacks."""
+    return [field for field in fields if is_missing(instance.get(field))]
+
+def get_utilization(instance, column, percentile=None):
+    """Read a utilization column, using its percentile variant (e.g. cpu_util_p95) when requested and present.
+    
+    Returns None when the metric has no data.
+    """
+    value = instance.get(f"{column}_{percentile}") if percentile else None
+    if is_missing(value):
+        value = instance.get(column)
+        if is_missing(value):
+            return None
+    value = float(value)
+    return value if value == value else None
+
+def get_connections(instance, percentile=None):
+    """The connections column (or its percentile variant) as an int, or None when it has no data."""
+    value = get_utilization(instance, 'connections', percentile)
+    return int(value) if value is not None else None
+
+def _format_share(value):
+    return f"{value:.1%}" if not is_missing(value) else "n/a"
+
+def get_instance_recommendations(instance, percentile=None):
+    """Generate recommendations (Recommendation objects) for a single SQL instance.
+    
+    With a percentile such as 'p95', the utilization rules run on that statistic
+    instead of the window mean. Instances missing a REQUIRED_FIELDS value get a
+    single 'incomplete' recommendation. Rules whose metric has no data are
+    skipped and a 'missing_metrics' recommendation names those metrics.
+    """
+    missing = missing_fields(instance)
+    if missing:
+        return [Recommendation('incomplete', note=', '.join(missing))]
+    
     recommendations = []
     
     # Extract and convert metrics
     try:
-        cpu_util = float(instance.get('cpu_util', '0'))
-        memory_util = float(instance.get('memory_util', '0'))
-        disk_util = float(instance.get('disk_util', '0'))
+        cpu_util = get_utilization(instance, 'cpu_util', percentile)
+        memory_util = get_utilization(instance, 'memory_util', percentile)
+        disk_util = get_utilization(instance, 'disk_util', percentile)
         disk_size_gb = int(instance.get('disk_size_gb', '0'))
         tier = instance.get('tier', '')
         instance_state = instance.get('state', '')
         activation_policy = instance.get('activation_policy', '')
-        connections = int(instance.get('connections', '0'))
+        connections = get_connections(instance, percentile)
         vcpus, memory_mb = extract_machine_specs(tier)
         memory_gb = memory_mb / 1024
-    except ValueError as e:
-        return [f"Error processing metrics: {str(e)}"]
+    except (ValueError, OverflowError) as e:
+        return [Recommendation('error', note=str(e))]
     
     # Skip instances that are not running
     if instance_state != 'RUNNABLE':
-        recommendations.append(f"Instance is in {instance_state} state. No optimization possible until it's running.")
+        recommendations.append(Recommendation('not_running', note=f"{instance_state}"))
         return recommendations
     
     # Check if instance is already at minimum specs
     at_minimum_specs = is_at_minimum_spec(tier)
     
     # Check connections vs vCPUs (rule of thumb: ~100 connections per vCPU is reasonable)
-    if vcpus > 1 and connections < (vcpus * 20) and not at_minimum_specs:
-        recommendations.append(f"Low connection count ({connections}) relative to vCPUs ({vcpus}). Consider reducing vCPUs.")
+    if connections is not None and vcpus > 1 and connections < (vcpus * 20) and not at_minimum_specs:
+        recommendations.append(Recommendation('low_connections', current_vcpus=vcpus, connections=connections))
     
     # Check CPU utilization with more detailed recommendations
-    is_shared_core = 'small' in tier.lower() or 'micro' in tier.lower() or 'f1-micro' in tier.lower()
+    is_shared_core = is_shared_core_tier(tier)
     
-    if cpu_util < 0.05:
+    if cpu_util is None:
+        pass
+    elif cpu_util < 0.05:
         if vcpus > 1 and not at_minimum_specs:
-            recommendations.append(f"CPU utilization very low (<5%). Current: {vcpus} vCPUs. Recommend reducing to {max(1, vcpus // 2)} vCPUs.")
+            # Halve the vCPUs, snapped down to a catalog tier (tier_catalog imports this module)
+            from tier_catalog import get_tier_catalog
+            target_vcpus = get_tier_catalog().reduced_vcpus(tier)
+            recommendations.append(Recommendation('cpu_very_low_reduce', current_vcpus=vcpus, utilization=cpu_util, target_vcpus=target_vcpus))
         elif not is_shared_core and not at_minimum_specs:
-            recommendations.append("CPU utilization very low (<5%). Consider switching to a shared-core instance type.")
+            recommendations.append(Recommendation('cpu_shared_core', current_vcpus=vcpus, utilization=cpu_util))
     elif cpu_util < 0.2:
         if vcpus > 2 and not at_minimum_specs:
-            recommendations.append(f"CPU utilization low (<20%). Current: {vcpus} vCPUs. Recommend reducing to {max(1, int(vcpus * 0.6))} vCPUs.")
+            recommendations.append(Recommendation('cpu_low_reduce', current_vcpus=vcpus, utilization=cpu_util, target_vcpus=max(1, int(vcpus * 0.6))))
         elif not at_minimum_specs:
-            recommendations.append("CPU utilization low (<20%). Monitor if this usage pattern continues.")
+            recommendations.append(Recommendation('cpu_low_monitor', current_vcpus=vcpus, utilization=cpu_util))
     elif cpu_util > 0.8:
-        recommendations.append(f"CPU utilization high (>80%). Consider upgrading to {vcpus + 2} vCPUs for better performance.")
+        recommendations.append(Recommendation('cpu_high', current_vcpus=vcpus, utilization=cpu_util, target_vcpus=vcpus + 2))
     
     # Check memory utilization with specific recommendations
-    if memory_util < 0.3 and memory_gb > MIN_MEMORY_GB:
+    if memory_util is None:
+        pass
+    elif memory_util < 0.3 and memory_gb > MIN_MEMORY_GB:
         new_memory_mb = max(MIN_MEMORY_GB * 1024, int(memory_mb * 0.7))  # Reduce by 30% but minimum 3.75GB
         new_memory_gb = new_memory_mb / 1024
         
-        # Only suggest if there's an actual reduction
+        # Only suggest if there's an actual reduction (the target is rounded to 0.1 GB)
         if new_memory_gb < memory_gb:
-            recommendations.append(f"Memory utilization low (<30%). Current: {memory_gb:.1f} GB. Recommend reducing to {new_memory_gb:.1f} GB.")
+            recommendations.append(Recommendation('memory_low', current_memory_gb=memory_gb, utilization=memory_util, target_memory_gb=round(new_memory_gb, 1)))
     elif memory_util > 0.85:
         new_memory_mb = int(memory_mb * 1.3)  # Increase by 30%
         new_memory_gb = new_memory_mb / 1024
-        recommendations.append(f"Memory utilization high (>85%). Consider increasing memory from {memory_gb:.1f} GB to {new_memory_gb:.1f} GB.")
+        recommendations.append(Recommendation('memory_high', current_memory_gb=memory_gb, utilization=memory_util, target_memory_gb=new_memory_gb))
     
     # Check disk utilization with specific recommendations
-    if disk_util < 0.2 and disk_size_gb > MIN_DISK_SIZE_GB:
+    if disk_util is None:
+        pass
+    elif disk_util < 0.2 and disk_size_gb > MIN_DISK_SIZE_GB:
         new_disk_size = max(MIN_DISK_SIZE_GB, int(disk_size_gb * 0.6))  # Reduce by 40% but minimum 10GB
         if new_disk_size < disk_size_gb:  # Only suggest if there's an actual reduction
-            recommendations.append(f"Disk utilization very low ({disk_util:.1%}) with {disk_size_gb} GB. Consider reducing to {new_disk_size} GB.")
+            recommendations.append(Recommendation('disk_very_low', current_disk_gb=disk_size_gb, utilization=disk_util, target_disk_gb=new_disk_size))
     elif disk_util < 0.5 and disk_size_gb > 100:
         new_disk_size = max(MIN_DISK_SIZE_GB, int(disk_size_gb * 0.7))  # Reduce by 30% but minimum 10GB
         if new_disk_size < disk_size_gb:  # Only suggest if there's an actual reduction
-            recommendations.append(f"Disk utilization low ({disk_util:.1%}) with {disk_size_gb} GB. Consider reducing to {new_disk_size} GB.")
+            recommendations.append(Recommendation('disk_low', current_disk_gb=disk_size_gb, utilization=disk_util, target_disk_gb=new_disk_size))
     elif disk_util > 0.85:
         new_disk_size = int(disk_size_gb * 1.3)  # Increase by 30%
-        recommendations.append(f"Disk utilization high ({disk_util:.1%}). Consider increasing disk size from {disk_size_gb} GB to {new_disk_size} GB.")
+        recommendations.append(Recommendation('disk_high', current_disk_gb=disk_size_gb, utilization=disk_util, target_disk_gb=new_disk_size))
     
     # Check activation policy
     if activation_policy == 'NEVER' and cpu_util == 0 and memory_util == 0:
-        recommendations.append("Instance never activated but provisioned. Consider deleting if not needed.")
+        recommendations.append(Recommendation('never_activated'))
     
-    # Check for unused instance
-    if connections == 0 and cpu_util < 0.01 and instance_state == 'RUNNABLE':
-        recommendations.append("Instance appears unused (no connections, negligible CPU usage). Consider stopping or deleting if not needed.")
+    # Check for unused instance (only when both connections and CPU were measured)
+    if connections == 0 and cpu_util is not None and cpu_util < 0.01 and instance_state == 'RUNNABLE':
+        recommendations.append(Recommendation('unused', connections=connections, utilization=cpu_util))
     
     # If at minimum specs and still underutilized, give different advice
-    if at_minimum_specs and cpu_util < 0.2 and memory_util < 0.3:
+    if at_minimum_specs and cpu_util is not None and memory_util is not None and cpu_util < 0.2 and memory_util < 0.3:
         # Remove any recommendations about reducing resources (since we can't)
-        recommendations = [rec for rec in recommendations if not ('reducing' in rec.lower() or 'reduce' in rec.lower())]
+        recommendations = [rec for rec in recommendations if not rec.reduces_resources]
         # Add alternative recommendation if not already there
-        if not any('unused' in rec for rec in recommendations):
-            recommendations.append("Instance is already at minimum specifications. Consider instance consolidation or stopping if not needed.")
+        if not any(rec.kind == 'unused' for rec in recommendations):
+            recommendations.append(Recommendation('at_minimum'))
+    
+    # Metrics without data: their rules were skipped, so the instance isn't called appropriately sized
+    missing = [field for field, value in zip(METRIC_FIELDS, (cpu_util, memory_util, disk_util, connections)) if value is None]
+    if missing:
+        recommendations.append(Recommendation('missing_metrics', note=', '.join(missing)))
     
     # If no specific recommendations, add a general one
     if not recommendations:
-        recommendations.append("Instance appears to be appropriately sized based on current utilization.")
+        recommendations.append(Recommendation('appropriately_sized'))
     
     return recommendations
 
-def generate_cost_saving_estimate(instance, recommendations):
-    """Generate estimated cost savings based on recommendations."""
+def estimate_costs(instance, recommendations):
+    """Estimate current and optimized monthly costs (a CostEstimate) from Recommendation targets.
+    
+    Returns None for instances that can't be priced (missing a REQUIRED_FIELDS value).
+    """
+    if missing_fields(instance):
+        return None
+    
     # Extract instance details
     tier = instance.get('tier', '')
     region = instance.get('location', 'us-central1') # Default to us-central1 if missing
@@ -273,27 +348,19 @@ def generate_cost_saving_estimate(instance, recommendations):
     new_memory_gb = memory_gb
     new_disk_size = disk_size_gb
     
-    # Extract optimization suggestions from recommendations
-    no_optimization_possible = False
-    if at_minimum_specs and any("already at minimum specifications" in rec for rec in recommendations):
-        no_optimization_possible = True
+    # Apply the targets of the recommendations that shrink the instance
+    no_optimization_possible = at_minimum_specs and any(rec.kind == 'at_minimum' for rec in recommendations)
     
     if not no_optimization_possible:
         for rec in recommendations:
-            # CPU recommendations
-            cpu_match = re.search(r"reducing to (\d+) vCPUs", rec)
-            if cpu_match:
-                new_vcpus = int(cpu_match.group(1))
-            
-            # Memory recommendations
-            memory_match = re.search(r"reducing to (\d+\.\d+) GB", rec)
-            if memory_match:
-                new_memory_gb = float(memory_match.group(1))
-            
-            # Disk recommendations
-            disk_match = re.search(r"reducing to (\d+) GB", rec)
-            if disk_match:
-                new_disk_size = int(disk_match.group(1))
+            if not rec.reduces_resources:
+                continue
+            if rec.target_vcpus is not None:
+                new_vcpus = rec.target_vcpus
+            if rec.target_memory_gb is not None:
+                new_memory_gb = rec.target_memory_gb
+            if rec.target_disk_gb is not None:
+                new_disk_size = rec.target_disk_gb
     
     # Calculate optimized monthly costs
     optimized_cpu_cost = new_vcpus * pricing["cpu"] * 730 * db_modifier * ha_modifier
@@ -324,120 +391,292 @@ def generate_cost_saving_estimate(instance, recommendations):
         optimized_memory_cost = memory_cost_per_month
         optimized_storage_cost = storage_cost_per_month
     
-    # Generate detailed cost breakdown
-    cost_details = {
+    return CostEstimate(
+        current_cpu=cpu_cost_per_month,
+        current_memory=memory_cost_per_month,
+        current_storage=storage_cost_per_month,
+        current_total=estimated_current_cost,
+        optimized_cpu=optimized_cpu_cost,
+        optimized_memory=optimized_memory_cost,
+        optimized_storage=optimized_storage_cost,
+        optimized_total=estimated_optimized_cost,
+        savings=savings,
+        savings_percentage=savings_percentage,
+        no_optimization_possible=no_optimization_possible
+    )
+
+def format_cost_details(costs):
+    """Format a CostEstimate into the report's cost breakdown."""
+    return {
         "current": {
-            "cpu": f"${cpu_cost_per_month:.2f}",
-            "memory": f"${memory_cost_per_month:.2f}",
-            "storage": f"${storage_cost_per_month:.2f}",
-            "total": f"${estimated_current_cost:.2f}"
+            "cpu": f"${costs.current_cpu:.2f}",
+            "memory": f"${costs.current_memory:.2f}",
+            "storage": f"${costs.current_storage:.2f}",
+            "total": f"${costs.current_total:.2f}"
         },
         "optimized": {
-            "cpu": f"${optimized_cpu_cost:.2f}",
-            "memory": f"${optimized_memory_cost:.2f}",
-            "storage": f"${optimized_storage_cost:.2f}",
-            "total": f"${estimated_optimized_cost:.2f}"
+            "cpu": f"${costs.optimized_cpu:.2f}",
+            "memory": f"${costs.optimized_memory:.2f}",
+            "storage": f"${costs.optimized_storage:.2f}",
+            "total": f"${costs.optimized_total:.2f}"
         },
         "savings": {
-            "monthly": f"${savings:.2f}",
-            "percentage": f"{savings_percentage:.1f}%",
-            "annual": f"${savings * 12:.2f}"
+            "monthly": f"${costs.savings:.2f}",
+            "percentage": f"{costs.savings_percentage:.1f}%",
+            "annual": f"${costs.annual_savings:.2f}"
         },
-        "no_optimization_possible": no_optimization_possible
+        "no_optimization_possible": costs.no_optimization_possible
     }
-    
-    return cost_details
 
-def generate_optimization_report(instances):
-    """Generate a full optimization report for all instances."""
-    total_current_cost = 0
-    total_optimized_cost = 0
-    
+def generate_cost_saving_estimate(instance, recommendations):
+    """Generate estimated cost savings based on recommendations (None if the instance can't be priced)."""
+    costs = estimate_costs(instance, recommendations)
+    return format_cost_details(costs) if costs is not None else None
+
+def _numeric_column(df, column, default=0.0):
+    """A DataFrame column as float64, NaN where missing or unparsable."""
+    import numpy as np
+    import pandas as pd
+    if column not in df.columns:
+        return np.full(len(df), default, dtype=np.float64)
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+
+def _text_column(df, column, default):
+    import numpy as np
+    if column not in df.columns:
+        return np.full(len(df), default, dtype=object)
+    return df[column].to_numpy(dtype=object)
+
+def utilization_array(df, column, percentile=None):
+    """get_utilization over a DataFrame: the percentile column where present, the mean otherwise (NaN without data or if unparsable)."""
+    import numpy as np
+    values = _numeric_column(df, column, np.nan)
+    if percentile:
+        pct_values = _numeric_column(df, f'{column}_{percentile}', np.nan)
+        values = np.where(np.isnan(pct_values), values, pct_values)
+    return values
+
+def rightsize_instances(instances, percentile=None, cpu_target=TARGET_CPU_UTILIZATION,
+                        memory_target=TARGET_MEMORY_UTILIZATION, alternatives=RIGHTSIZING_ALTERNATIVES):
+    """Pick the cheapest catalog tier that fits each instance's measured load.
+    
+    instances is a list of inventory records or a DataFrame. The fleet is
+    evaluated as one instances x candidate-tiers matrix: a tier fits when the
+    used vCPUs and memory stay under cpu_target / memory_target on it, and
+    its monthly compute + memory cost is priced for the instance's region,
+    database version and availability type. Returns a DataFrame (one row per
+    instance) with the current and recommended tier and cost, the monthly
+    savings and the next cheapest fitting tiers. Instances that aren't
+    RUNNABLE, have no tier or whose metrics can't be parsed get no
+    recommendation.
+    """
+    import numpy as np
+    import pandas as pd
+    from tier_catalog import get_tier_catalog
+    
+    df = instances if isinstance(instances, pd.DataFrame) else pd.DataFrame(list(instances))
+    n = len(df)
+    catalog = get_tier_catalog()
+    candidates = catalog.tiers()
+    
+    # Current shape and load of every instance
+    tiers = _text_column(df, 'tier', '')
+    specs = [catalog.spec(tier if isinstance(tier, str) else '') for tier in tiers]
+    vcpus = np.array([spec.vcpus for spec in specs], dtype=np.float64)
+    memory_gb = np.array([spec.memory_gb for spec in specs], dtype=np.float64)
+    cpu_util = utilization_array(df, 'cpu_util', percentile)
+    memory_util = utilization_array(df, 'memory_util', percentile)
+    
+    needed_vcpus = vcpus * cpu_util / cpu_target
+    needed_memory_gb = memory_gb * memory_util / memory_target
+    
+    # Catalog prices, looked up once per distinct region, database version and availability type
+    regions = _text_column(df, 'location', 'us-central1')
+    db_versions = _text_column(df, 'database_version', '')
+    availability_types = _text_column(df, 'availability_type', 'ZONAL')
+    pricing_keys = [
+        (region if isinstance(region, str) else '', version if isinstance(version, str) else '',
+         'REGIONAL' if availability_type == 'REGIONAL' else 'ZONAL')
+        for region, version, availability_type in zip(regions, db_versions, availability_types)
+    ]
+    key_codes, unique_keys = pd.factorize(pd.Series(pricing_keys, dtype=object))
+    current_cost = np.array([sum(catalog.monthly_cost(spec.name, *key)) for spec, key in zip(specs, pricing_keys)],
+                            dtype=np.float64)
+    
+    # instances x candidates fit and cost matrices
+    candidate_vcpus = np.array([spec.vcpus for spec in candidates], dtype=np.float64)
+    candidate_memory_gb = np.array([spec.memory_gb for spec in candidates], dtype=np.float64)
+    candidate_shared = np.array([spec.shared_core for spec in candidates], dtype=bool)
+    sqlserver = np.array([isinstance(version, str) and version.startswith('SQLSERVER') for version in db_versions], dtype=bool)
+    
+    fits = (candidate_vcpus[None, :] >= needed_vcpus[:, None]) & (candidate_memory_gb[None, :] >= needed_memory_gb[:, None])
+    # SQL Server can't run on shared-core tiers
+    fits &= ~(sqlserver[:, None] & candidate_shared[None, :])
+    candidate_cost = np.array([[sum(catalog.monthly_cost(spec.name, *key)) for spec in candidates] for key in unique_keys],
+                              dtype=np.float64).reshape(len(unique_keys), len(candidates))
+    cost = np.where(fits, candidate_cost[key_codes], np.inf)
+    
+    # Cheapest fitting tier first; a stable sort keeps the larger tier on cost ties
+    order = np.argsort(cost, axis=1, kind='stable')
+    ranked_cost = np.take_along_axis(cost, order, axis=1)
+    
+    has_tier = np.array([isinstance(tier, str) and tier != '' for tier in tiers], dtype=bool)
+    evaluable = (_text_column(df, 'state', '') == 'RUNNABLE') & has_tier & np.isfinite(needed_vcpus) & np.isfinite(needed_memory_gb)
+    has_fit = evaluable & np.isfinite(ranked_cost[:, 0])
+    # Only recommend a tier that is cheaper than the current shape
+    cheaper = has_fit & (ranked_cost[:, 0] < current_cost)
+    
+    candidate_names = np.array([spec.name for spec in candidates], dtype=object)
+    best_cost = np.where(cheaper, ranked_cost[:, 0], current_cost)
+    recommended_tier = np.where(cheaper, candidate_names[order[:, 0]], tiers)
+    
+    # The next fitting tiers after the recommended one (all of them when the current tier stays)
+    alternative_tiers = np.empty(n, dtype=object)
+    alternative_costs = np.empty(n, dtype=object)
+    for i in range(n):
+        start = 1 if cheaper[i] else 0
+        ranked = slice(start, start + alternatives)
+        keep = np.isfinite(ranked_cost[i, ranked]) & has_fit[i]
+        alternative_tiers[i] = candidate_names[order[i, ranked]][keep].tolist()
+        alternative_costs[i] = ranked_cost[i, ranked][keep].tolist()
+    
+    return pd.DataFrame({
+        'project_id': _text_column(df, 'project_id', ''),
+        'name': _text_column(df, 'name', ''),
+        'tier': tiers,
+        'needed_vcpus': needed_vcpus,
+        'needed_memory_gb': needed_memory_gb,
+        'current_monthly_cost': np.where(evaluable, current_cost, np.nan),
+        'recommended_tier': np.where(evaluable, recommended_tier, None),
+        'recommended_monthly_cost': np.where(evaluable, best_cost, np.nan),
+        'monthly_savings': np.where(evaluable, current_cost - best_cost, np.nan),
+        'fits_catalog': has_fit,
+        'alternative_tiers': alternative_tiers,
+        'alternative_costs': alternative_costs
+    }, index=df.index)
+
+def write_rightsizing_csv(rightsizing, filename):
+    """Write rightsize_instances output, with alternatives as 'tier ($cost)' lists."""
+    output = rightsizing.copy()
+    output['alternatives'] = [
+        '; '.join(f"{tier} (${cost:.2f})" for tier, cost in zip(tiers, costs))
+        for tiers, costs in zip(output.pop('alternative_tiers'), output.pop('alternative_costs'))
+    ]
+    output.to_csv(filename, index=False, float_format='%.2f')
+
+def report_header(instance_count, percentile=None):
+    """Opening lines of the optimization report."""
     report = []
     report.append("=== Cloud SQL Instance Optimization Report ===")
     report.append(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    report.append(f"Total instances analyzed: {len(instances)}")
+    report.append(f"Total instances analyzed: {instance_count}")
+    if percentile:
+        report.append(f"Recommendations based on {percentile} utilization")
     report.append("")
+    return report
+
+def instance_report_lines(instance, vcpus, memory_gb, cpu_util, memory_util, disk_util, connections,
+                          recommendations, cost_details, percentile=None):
+    """Report lines for one instance whose recommendations and costs are already computed."""
+    name = instance.get('name', 'Unknown')
+    project_id = instance.get('project_id', 'Unknown')
+    tier = instance.get('tier', 'Unknown')
+    region = instance.get('location', 'Unknown')
+    db_version = instance.get('database_version', 'Unknown')
+    availability_type = instance.get('availability_type', 'ZONAL')
+    disk_size_gb = instance.get('disk_size_gb', '0')
+    # DataFrames store an integer column with missing values as floats
+    if isinstance(disk_size_gb, float) and disk_size_gb.is_integer():
+        disk_size_gb = int(disk_size_gb)
     
-    for instance in instances:
-        name = instance.get('name', 'Unknown')
-        project_id = instance.get('project_id', 'Unknown')
-        tier = instance.get('tier', 'Unknown')
-        region = instance.get('location', 'Unknown')
-        db_version = instance.get('database_version', 'Unknown')
-        availability_type = instance.get('availability_type', 'ZONAL')
-        
-        try:
-            cpu_util = float(instance.get('cpu_util', '0'))
-            memory_util = float(instance.get('memory_util', '0'))
-            disk_util = float(instance.get('disk_util', '0'))
-            connections = int(instance.get('connections', '0'))
-        except ValueError as e:
-            report.append(f"Instance: {name} (Project: {project_id})")
-            report.append(f"  Error processing metrics: {str(e)}")
-            report.append("")
-            continue
-        
-        # Extract machine specs
-        vcpus, memory_mb = extract_machine_specs(tier)
-        memory_gb = memory_mb / 1024
-        
-        report.append(f"Instance: {name} (Project: {project_id})")
-        report.append(f"  Region: {region}")
-        report.append(f"  Database Version: {db_version}")
-        report.append(f"  High Availability: {'Yes' if availability_type == 'REGIONAL' else 'No'}")
-        report.append(f"  Current configuration: {tier} ({vcpus} vCPUs, {memory_gb:.2f} GB memory), {instance.get('disk_size_gb', '0')} GB storage")
-        report.append(f"  Usage Statistics:")
-        report.append(f"    - CPU: {cpu_util:.1%} avg. utilization")
-        report.append(f"    - Memory: {memory_util:.1%} avg. utilization")
-        report.append(f"    - Storage: {disk_util:.1%} utilization")
-        report.append(f"    - Connections: {connections} active connections")
-        
-        recommendations = get_instance_recommendations(instance)
-        
-        report.append("  Recommendations:")
-        for rec in recommendations:
-            report.append(f"    - {rec}")
-        
-        cost_details = generate_cost_saving_estimate(instance, recommendations)
-        
-        report.append("  Cost Analysis (Based on GCP pricing for region {0}):".format(region))
-        report.append("    Current Monthly Costs:")
-        report.append(f"      - Compute (CPU): {cost_details['current']['cpu']}")
-        report.append(f"      - Memory: {cost_details['current']['memory']}")
-        report.append(f"      - Storage: {cost_details['current']['storage']}")
-        report.append(f"      - Total: {cost_details['current']['total']}")
-        
-        if cost_details.get('no_optimization_possible', False) or float(cost_details['savings']['monthly'].replace('$', '')) <= 0:
-            report.append("    Optimized Monthly Costs: No cost optimization possible for this instance")
-            report.append("    Potential Savings: $0.00 (0.0%)")
-        else:
-            report.append("    Optimized Monthly Costs:")
-            report.append(f"      - Compute (CPU): {cost_details['optimized']['cpu']}")
-            report.append(f"      - Memory: {cost_details['optimized']['memory']}")
-            report.append(f"      - Storage: {cost_details['optimized']['storage']}")
-            report.append(f"      - Total: {cost_details['optimized']['total']}")
-            report.append("    Potential Savings:")
-            report.append(f"      - Monthly: {cost_details['savings']['monthly']}")
-            report.append(f"      - Annual: {cost_details['savings']['annual']}")
-            report.append(f"      - Percentage Reduction: {cost_details['savings']['percentage']}")
-        
-        report.append("")
-        
-        try:
-            current_cost = float(cost_details['current']['total'].replace('$', ''))
-            optimized_cost = float(cost_details['optimized']['total'].replace('$', ''))
-            total_current_cost += current_cost
-            total_optimized_cost += optimized_cost
-        except (ValueError, KeyError):
-            pass
+    report = []
+    report.append(f"Instance: {name} (Project: {project_id})")
+    report.append(f"  Region: {region}")
+    report.append(f"  Database Version: {db_version}")
+    report.append(f"  High Availability: {'Yes' if availability_type == 'REGIONAL' else 'No'}")
+    report.append(f"  Current configuration: {tier} ({vcpus} vCPUs, {memory_gb:.2f} GB memory), {disk_size_gb} GB storage")
+    report.append(f"  Usage Statistics:")
+    report.append(f"    - CPU: {_format_share(cpu_util)} avg. utilization")
+    report.append(f"    - Memory: {_format_share(memory_util)} avg. utilization")
+    report.append(f"    - Storage: {_format_share(disk_util)} utilization")
+    report.append(f"    - Connections: {connections if not is_missing(connections) else 'n/a'} active connections")
+    if percentile:
+        report.append(f"    - {percentile}: CPU {_format_share(get_utilization(instance, 'cpu_util', percentile))}, "
+                      f"Memory {_format_share(get_utilization(instance, 'memory_util', percentile))}, "
+                      f"Storage {_format_share(get_utilization(instance, 'disk_util', percentile))}")
+    
+    report.append("  Recommendations:")
+    for rec in recommendations:
+        report.append(f"    - {rec}")
+    
+    report.append("  Cost Analysis (Based on GCP pricing for region {0}):".format(region))
+    report.append("    Current Monthly Costs:")
+    report.append(f"      - Compute (CPU): {cost_details['current']['cpu']}")
+    report.append(f"      - Memory: {cost_details['current']['memory']}")
+    report.append(f"      - Storage: {cost_details['current']['storage']}")
+    report.append(f"      - Total: {cost_details['current']['total']}")
+    
+    if cost_details.get('no_optimization_possible', False) or float(cost_details['savings']['monthly'].replace('$', '')) <= 0:
+        report.append("    Optimized Monthly Costs: No cost optimization possible for this instance")
+        report.append("    Potential Savings: $0.00 (0.0%)")
+    else:
+        report.append("    Optimized Monthly Costs:")
+        report.append(f"      - Compute (CPU): {cost_details['optimized']['cpu']}")
+        report.append(f"      - Memory: {cost_details['optimized']['memory']}")
+        report.append(f"      - Storage: {cost_details['optimized']['storage']}")
+        report.append(f"      - Total: {cost_details['optimized']['total']}")
+        report.append("    Potential Savings:")
+        report.append(f"      - Monthly: {cost_details['savings']['monthly']}")
+        report.append(f"      - Annual: {cost_details['savings']['annual']}")
+        report.append(f"      - Percentage Reduction: {cost_details['savings']['percentage']}")
+    
+    report.append("")
+    return report
+
+def instance_report(instance, percentile=None):
+    """Analyze one instance row by row and return (report lines, current cost, optimized cost).
+    
+    The costs are None when the instance's metrics can't be parsed or it
+    lacks a tier or disk size; such instances are skipped. Metrics without
+    data are shown as n/a.
+    """
+    name = instance.get('name', 'Unknown')
+    project_id = instance.get('project_id', 'Unknown')
+    tier = instance.get('tier', 'Unknown')
+    
+    missing = missing_fields(instance)
+    if missing:
+        return [f"Instance: {name} (Project: {project_id})", f"  Skipped: missing {', '.join(missing)}", ""], None, None
+    
+    try:
+        cpu_util = get_utilization(instance, 'cpu_util')
+        memory_util = get_utilization(instance, 'memory_util')
+        disk_util = get_utilization(instance, 'disk_util')
+        connections = get_connections(instance)
+    except (ValueError, OverflowError) as e:
+        return [f"Instance: {name} (Project: {project_id})", f"  Error processing metrics: {str(e)}", ""], None, None
+    
+    # Extract machine specs
+    vcpus, memory_mb = extract_machine_specs(tier)
+    memory_gb = memory_mb / 1024
     
-    # Add summary
+    recommendations = get_instance_recommendations(instance, percentile)
+    costs = estimate_costs(instance, recommendations)
+    
+    report = instance_report_lines(instance, vcpus, memory_gb, cpu_util, memory_util, disk_util, connections,
+                                   recommendations, format_cost_details(costs), percentile)
+    return report, costs.current_total, costs.optimized_total
+
+def report_summary(total_current_cost, total_optimized_cost, skipped=0):
+    """Closing summary lines of the optimization report; skipped counts instances without a cost estimate."""
     total_savings = total_current_cost - total_optimized_cost
     savings_percentage = (total_savings / total_current_cost * 100) if total_current_cost > 0 else 0
     annual_savings = total_savings * 12
     
+    report = []
     report.append("=== Summary ===")
+    if skipped:
+        report.append(f"Instances skipped (incomplete data, not in the totals): {skipped}")
     report.append(f"Total current estimated monthly cost: ${total_current_cost:.2f}")
     report.append(f"Total optimized estimated monthly cost: ${total_optimized_cost:.2f}")
     report.append(f"Total potential monthly savings: ${total_savings:.2f} ({savings_percentage:.1f}%)")
@@ -446,36 +685,93 @@ def generate_optimization_report(instances):
     report.append("Note: Cost estimates are based on GCP Cloud SQL pricing.")
     report.append("      Actual costs may vary based on commitment discounts, network usage, and other factors.")
     report.append("      Instances already at minimum specifications will show no potential savings.")
+    return report
+
+def generate_optimization_report(instances, percentile=None):
+    """Generate a full optimization report for all instances."""
+    total_current_cost = 0
+    total_optimized_cost = 0
+    skipped = 0
+    
+    report = report_header(len(instances), percentile)
+    
+    for instance in instances:
+        lines, current_cost, optimized_cost = instance_report(instance, percentile)
+        report.extend(lines)
+        if current_cost is not None:
+            total_current_cost += current_cost
+            total_optimized_cost += optimized_cost
+        else:
+            skipped += 1
     
+    report.extend(report_summary(total_current_cost, total_optimized_cost, skipped))
     return report
 
-def optimize_sql_inventory(csv_file_path):
-    """Main function to optimize SQL inventory from a CSV file."""
+def optimize_sql_inventory(inventory, percentile=None, engine='columnar', base_name=None):
+    """Main function to optimize a SQL inventory.
+    
+    inventory is a CSV file path, a DataFrame, or a list of inventory records
+    (such as the collection stage's, whose numeric values are still numeric).
+    Output files are named after base_name, which defaults to the CSV path
+    without its extension, or 'cloud_sql_inventory' for in-memory input.
+    percentile (e.g. 'p95') selects the utilization statistic the rules run on.
+    engine 'columnar' evaluates the whole inventory with vectorized DataFrame
+    operations (see columnar_optimizer); 'rows' uses the row-by-row functions.
+    Both produce the same report.
+    """
+    import pandas as pd
+    
+    from_file = isinstance(inventory, (str, os.PathLike))
+    source = inventory if from_file else 'the in-memory inventory'
+    if base_name is None:
+        base_name = os.path.splitext(inventory)[0] if from_file else 'cloud_sql_inventory'
+    
     try:
-        # Load data (either using pandas or CSV file)
-        try:
-            # Try pandas first (as in your original function)
-            df = pd.read_csv(csv_file_path)
-            print(f"Loaded {len(df)} entries from inventory for optimization using pandas.")
-            # Convert DataFrame to list of dictionaries for our processing functions
-            instances = df.to_dict('records')
-        except (ImportError, FileNotFoundError):
-            # Fall back to regular CSV reading if pandas fails
-            instances = load_sql_inventory(csv_file_path)
-            print(f"Loaded {len(instances)} entries from inventory for optimization using CSV.")
+        df = None
+        if isinstance(inventory, pd.DataFrame):
+            df = inventory
+            instances = df.to_dict('records') if engine != 'columnar' else None
+            print(f"Received {len(df)} entries from inventory for optimization.")
+        elif not from_file:
+            # Records are used as they are; only the columnar engine needs a DataFrame
+            instances = list(inventory)
+            df = pd.DataFrame.from_records(instances) if engine == 'columnar' else None
+            print(f"Received {len(instances)} entries from inventory for optimization.")
+        else:
+            # Load data (either using pandas or CSV file)
+            try:
+                # Try pandas first (as in your original function)
+                df = pd.read_csv(inventory)
+                print(f"Loaded {len(df)} entries from inventory for optimization using pandas.")
+                # Convert DataFrame to list of dictionaries for our processing functions
+                instances = df.to_dict('records') if engine != 'columnar' else None
+            except (ImportError, FileNotFoundError):
+                # Fall back to regular CSV reading if pandas fails
+                df = None
+                instances = load_sql_inventory(inventory)
+                print(f"Loaded {len(instances)} entries from inventory for optimization using CSV.")
         
-        if not instances:
-            print(f"No Cloud SQL instances found in {csv_file_path}")
+        if (df is not None and df.empty) or (df is None and not instances):
+            print(f"No Cloud SQL instances found in {source}")
             return False
         
         # Generate the optimization report
-        report = generate_optimization_report(instances)
+        if df is not None and engine == 'columnar':
+            from columnar_optimizer import generate_optimization_report_frame
+            report = generate_optimization_report_frame(df, percentile)
+        else:
+            report = generate_optimization_report(instances, percentile)
+        
+        # Which underutilized instances to merge, and onto what
+        from consolidation_planner import plan_consolidation, consolidation_report_lines, write_consolidation_csv
+        consolidation = plan_consolidation(df if df is not None else instances, percentile)
+        report.append("")
+        report.extend(consolidation_report_lines(consolidation))
         
         # Generate output filenames with timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         # Generate standard report filename
-        base_name = os.path.splitext(csv_file_path)[0]
         report_filename = f"{base_name}_optimization_report.txt"
         
         # Generate timestamped recommendation filename
@@ -491,9 +787,20 @@ def optimize_sql_inventory(csv_file_path):
             for line in report:
                 recommendation_file.write(f"{line}\n")
         
+        # Cheapest fitting catalog tier per instance, with its ranked alternatives
+        rightsizing_filename = f"{base_name}_rightsizing.csv"
+        rightsizing = rightsize_instances(df if df is not None else instances, percentile)
+        write_rightsizing_csv(rightsizing, rightsizing_filename)
+        consolidation_filename = f"{base_name}_consolidation.csv"
+        write_consolidation_csv(consolidation, consolidation_filename)
+        
         print(f"Optimization report has been saved to:")
         print(f"  - {report_filename} (standard output)")
         print(f"  - {recommendation_filename} (timestamped recommendation)")
+        print(f"  - {rightsizing_filename} (rightsizing candidates, "
+              f"${rightsizing['monthly_savings'].sum():.2f} potential monthly compute savings)")
+        print(f"  - {consolidation_filename} ({len(consolidation)} consolidations, "
+              f"${sum(plan.savings for plan in consolidation):.2f} potential monthly savings)")
         
         return True
     
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - Run Telemetry
+
+Spans for each phase of a run, latency histograms per API method and named
+counters, exported as a Chrome trace (chrome://tracing, Perfetto) with a
+summary table. Telemetry is off until enable() is called; until then span()
+returns a shared no-op context manager and get_tracer() returns None, so
+instrumented code pays one global lookup.
+"""
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+
+# RPC latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+# Trace events kept for export; later spans and RPCs are only aggregated
+MAX_TRACE_EVENTS = 200000
+
+_NULL_SPAN = contextlib.nullcontext()
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start')
+    
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.add_event(self.name, self.category, self.start, time.perf_counter(), self.args)
+        return False
+
+class _Histogram:
+    """Latency distribution of one API method."""
+    __slots__ = ('count', 'errors', 'total', 'max', 'buckets')
+    
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    
+    def add(self, milliseconds, error):
+        self.count += 1
+        self.errors += error
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, milliseconds)] += 1
+    
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (max for the overflow bucket)."""
+        target = q * self.count
+        seen = 0
+        for i, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= target and bucket:
+                return min(LATENCY_BUCKETS_MS[i], self.max) if i < len(LATENCY_BUCKETS_MS) else self.max
+        return self.max
+    
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'max_ms': self.max,
+            'buckets_ms': dict(zip([str(bound) for bound in LATENCY_BUCKETS_MS] + ['inf'], self.buckets))
+        }
+
+class Tracer:
+    """Collects spans, RPC latencies and counters for one run."""
+    
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._events = []
+        self._dropped = 0
+        self._threads = {}
+        self.phases = {}
+        self.rpcs = {}
+        self.counters = {}
+    
+    def _thread_id(self):
+        ident = threading.get_ident()
+        tid = self._threads.get(ident)
+        if tid is None:
+            tid = self._threads[ident] = len(self._threads) + 1
+        return tid
+    
+    def add_event(self, name, category, start, end, args=None):
+        with self._lock:
+            if category == 'phase':
+                phase = self.phases.setdefault(name, [0, 0.0])
+                phase[0] += 1
+                phase[1] += end - start
+            if len(self._events) < MAX_TRACE_EVENTS:
+                event = {
+                    'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(), 'tid': self._thread_id(),
+                    'ts': (start - self._origin) * 1e6, 'dur': (end - start) * 1e6
+                }
+                if args:
+                    event['args'] = args
+                self._events.append(event)
+            else:
+                self._dropped += 1
+    
+    def record_phase(self, name, seconds):
+        """Add time spent in a phase that isn't one contiguous span (e.g. interleaved writes)."""
+        with self._lock:
+            phase = self.phases.setdefault(name, [0, 0.0])
+            phase[0] += 1
+            phase[1] += seconds
+    
+    def span(self, name, category='phase', **args):
+        return _Span(self, name, category, args)
+    
+    def record_rpc(self, api, method, start, end, error=False):
+        """Add one API call to its method's latency histogram (and the trace)."""
+        with self._lock:
+            histogram = self.rpcs.get((api, method))
+            if histogram is None:
+                histogram = self.rpcs[(api, method)] = _Histogram()
+            histogram.add((end - start) * 1000, error)
+        self.add_event(f"{api}.{method}", 'rpc', start, end, {'error': True} if error else None)
+    
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def export(self, path):
+        """Write a Chrome trace JSON file; aggregates go in otherData."""
+        with self._lock:
+            document = {
+                'traceEvents': list(self._events),
+                'displayTimeUnit': 'ms',
+                'otherData': {
+                    'phases': {name: {'count': count, 'seconds': seconds} for name, (count, seconds) in self.phases.items()},
+                    'rpcs': {f"{api}.{method}": histogram.to_dict() for (api, method), histogram in self.rpcs.items()},
+                    'counters': dict(self.counters),
+                    'dropped_events': self._dropped
+                }
+            }
+        with open(path, 'w') as f:
+            json.dump(document, f)
+        print(f"Trace has been saved to {path}")
+    
+    def summary_lines(self):
+        """Phase, RPC and counter tables for the end of a run."""
+        lines = ["=== Run Telemetry ==="]
+        if self.phases:
+            lines.append(f"{'phase':<32} {'count':>7} {'seconds':>10}")
+            for name, (count, seconds) in sorted(self.phases.items(), key=lambda item: -item[1][1]):
+                lines.append(f"{name:<32} {count:>7} {seconds:>10.3f}")
+            lines.append("")
+        if self.rpcs:
+            lines.append(f"{'rpc':<40} {'calls':>7} {'errors':>7} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>9}")
+            for (api, method), histogram in sorted(self.rpcs.items()):
+                stats = histogram.to_dict()
+                lines.append(f"{api + '.' + method:<40} {stats['count']:>7} {stats['errors']:>7} {stats['mean_ms']:>9.1f} "
+                             f"{stats['p50_ms']:>8.0f} {stats['p95_ms']:>8.0f} {stats['p99_ms']:>8.0f} {stats['max_ms']:>9.1f}")
+            lines.append("")
+        if self.counters:
+            lines.append(f"{'counter':<40} {'value':>10}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<40} {value:>10}")
+            lines.append("")
+        return lines
+    
+    def print_summary(self):
+        print('\n'.join(self.summary_lines()))
+
+_tracer = None
+
+def enable():
+    """Start collecting telemetry for this process and return the Tracer."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+def disable():
+    global _tracer
+    _tracer = None
+
+def get_tracer():
+    """The active Tracer, or None when telemetry is off."""
+    return _tracer
+
+def span(name, category='phase', **args):
+    """Context manager timing a phase; a shared no-op when telemetry is off."""
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, category, **args)
+
+def count(name, value=1):
+    """Add to a named counter (no-op when telemetry is off)."""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.count(name, value)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Optimizer - Machine-tier catalog
+
+The predefined Cloud SQL tiers are loaded once from machine_tiers.json. Lookups
+by tier name are dict hits; custom tiers (db-custom-N-M) are parsed on first
+use and memoized. Monthly compute and memory costs are precomputed for every
+catalog tier, priced region, known database version and availability type;
+rightsizing and consolidation price their candidate tiers from this table.
+Each tier also knows the catalog tiers it could be resized down to, which
+the rule-based CPU reduction targets snap to.
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass
+from sql_optimizer import (
+    GCP_PRICING, DB_VERSION_MODIFIER, HA_MODIFIER,
+    extract_machine_specs, is_shared_core_tier, is_at_minimum_spec, get_region_pricing, get_db_version_modifier
+)
+
+TIER_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'machine_tiers.json')
+
+AVAILABILITY_TYPES = ('ZONAL', 'REGIONAL')
+
+@dataclass(slots=True, frozen=True)
+class TierSpec:
+    """vCPUs and memory of one machine tier."""
+    name: str
+    vcpus: float
+    memory_mb: float
+    shared_core: bool
+    at_minimum: bool
+    
+    @property
+    def memory_gb(self):
+        return self.memory_mb / 1024
+
+class TierCatalog:
+    """Machine tiers indexed by name, with monthly costs and smaller-tier lists."""
+    
+    def __init__(self, tiers):
+        # tiers: {name: {"vcpus": ..., "memory_mb": ..., "shared_core": ...}}
+        self._specs = {}
+        for name, spec in tiers.items():
+            self._specs[name] = TierSpec(
+                name, spec['vcpus'], spec['memory_mb'],
+                spec.get('shared_core', False), is_at_minimum_spec(name)
+            )
+        self._lock = threading.Lock()
+        
+        # Catalog tiers ordered largest first, so the nearest smaller tier comes first
+        self._by_size = sorted(self._specs.values(), key=lambda spec: (spec.vcpus, spec.memory_mb), reverse=True)
+        self._smaller = {name: self._smaller_than(spec) for name, spec in self._specs.items()}
+        
+        self._costs = {}
+        regions = [region for region in GCP_PRICING if region != 'default']
+        db_versions = [version for version in DB_VERSION_MODIFIER if version != 'default']
+        for name in self._specs:
+            for region in regions:
+                for db_version in db_versions:
+                    for availability_type in AVAILABILITY_TYPES:
+                        self.monthly_cost(name, region, db_version, availability_type)
+    
+    @classmethod
+    def load(cls, path=TIER_CATALOG_PATH):
+        """Build a catalog from a machine_tiers.json-style file."""
+        with open(path) as f:
+            return cls(json.load(f)['tiers'])
+    
+    def __contains__(self, tier):
+        return tier in self._specs
+    
+    def __len__(self):
+        return len(self._specs)
+    
+    def tiers(self):
+        """All catalog tiers, largest first."""
+        return list(self._by_size)
+    
+    def spec(self, tier):
+        """TierSpec for a tier name; tiers outside the catalog are parsed once and memoized."""
+        spec = self._specs.get(tier)
+        if spec is None:
+            vcpus, memory_mb = extract_machine_specs(tier)
+            spec = TierSpec(tier, vcpus, memory_mb, is_shared_core_tier(tier), is_at_minimum_spec(tier))
+            with self._lock:
+                self._specs.setdefault(tier, spec)
+        return spec
+    
+    def _smaller_than(self, spec):
+        return tuple(
+            candidate for candidate in self._by_size
+            if candidate.vcpus <= spec.vcpus and candidate.memory_mb <= spec.memory_mb
+            and (candidate.vcpus, candidate.memory_mb) != (spec.vcpus, spec.memory_mb)
+        )
+    
+    def smaller_tiers(self, tier):
+        """Catalog tiers with no more vCPUs and memory than the tier, nearest first."""
+        smaller = self._smaller.get(tier)
+        if smaller is None:
+            smaller = self._smaller_than(self.spec(tier))
+            with self._lock:
+                self._smaller.setdefault(tier, smaller)
+        return smaller
+    
+    def reduced_vcpus(self, tier):
+        """vCPUs of the nearest smaller dedicated-core tier with at most half the tier's vCPUs (at least 1)."""
+        half = self.spec(tier).vcpus // 2
+        for candidate in self.smaller_tiers(tier):
+            if 1 <= candidate.vcpus <= half:
+                return candidate.vcpus
+        return max(1, half)
+    
+    def monthly_cost(self, tier, region, db_version, availability_type='ZONAL'):
+        """(compute, memory) cost per month of a tier, as estimate_costs computes it."""
+        key = (tier, region, db_version, availability_type)
+        cost = self._costs.get(key)
+        if cost is None:
+            spec = self.spec(tier)
+            pricing = get_region_pricing(region)
+            db_modifier = get_db_version_modifier(db_version)
+            ha_modifier = HA_MODIFIER if availability_type == 'REGIONAL' else 1.0
+            cost = (
+                spec.vcpus * pricing["cpu"] * 730 * db_modifier * ha_modifier,
+                spec.memory_gb * pricing["memory"] * 730 * db_modifier * ha_modifier
+            )
+            with self._lock:
+                self._costs.setdefault(key, cost)
+        return cost
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_tier_catalog():
+    """The process-wide catalog, loaded from TIER_CATALOG_PATH on first use."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = TierCatalog.load()
+    return _catalog
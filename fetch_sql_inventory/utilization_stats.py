@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Cloud SQL Inventory - Utilization Statistics
+"""
+import numpy as np
+
+# Percentiles computed for every metric of every instance
+PERCENTILES = (50, 95, 99)
+
+def series_stats(matrix, counts, percentiles=PERCENTILES):
+    """Compute mean, percentiles and max of every row of a padded series matrix.
+    
+    matrix is (n_series, max_points) with each row's counts[i] points first and
+    NaN padding after them. Returns a mapping of stat name ('mean', 'p50', ...,
+    'max') -> float64 array of length n_series, with NaN for empty rows.
+    Percentiles interpolate linearly, like np.percentile.
+    """
+    n_series = matrix.shape[0]
+    has_data = counts > 0
+    
+    stats = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats['mean'] = np.nansum(matrix, axis=1, dtype=np.float64) / counts
+    
+    if matrix.shape[1] == 0:
+        for q in percentiles:
+            stats[f"p{q}"] = np.full(n_series, np.nan)
+        stats['max'] = np.full(n_series, np.nan)
+        return stats
+    
+    # NaN padding sorts to the end of each row
+    sorted_matrix = np.sort(matrix, axis=1)
+    spans = np.maximum(counts - 1, 0)
+    
+    for q in percentiles:
+        position = spans * (q / 100)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        fraction = position - lower
+        lower_values = np.take_along_axis(sorted_matrix, lower[:, None], axis=1)[:, 0].astype(np.float64)
+        upper_values = np.take_along_axis(sorted_matrix, upper[:, None], axis=1)[:, 0].astype(np.float64)
+        stats[f"p{q}"] = lower_values * (1 - fraction) + upper_values * fraction
+    
+    stats['max'] = np.take_along_axis(sorted_matrix, spans[:, None], axis=1)[:, 0].astype(np.float64)
+    
+    for column in stats.values():
+        column[~has_data] = np.nan
+    return stats
+
+def compute_fleet_utilization(series, percentiles=PERCENTILES):
+    """Summarize the utilization series of a whole fleet at once.
+    
+    series maps (project_id, instance, metric) -> array of points. Returns a
+    mapping of (project_id, instance) -> metrics dict holding the mean under the
+    metric name and every other stat under "{metric}:{stat}".
+    """
+    keys = list(series)
+    if not keys:
+        return {}
+    
+    lengths = np.fromiter((len(series[key]) for key in keys), dtype=np.int64, count=len(keys))
+    
+    # One float32 row per series, NaN-padded to the longest series
+    matrix = np.full((len(keys), int(lengths.max())), np.nan, dtype=np.float32)
+    for i, key in enumerate(keys):
+        matrix[i, :lengths[i]] = series[key]
+    stats = series_stats(matrix, lengths, percentiles)
+    
+    fleet = {}
+    for i, (project_id, instance, metric) in enumerate(keys):
+        if lengths[i] == 0:
+            continue
+        instance_metrics = fleet.setdefault((project_id, instance), {})
+        for name, column in stats.items():
+            instance_metrics[metric if name == 'mean' else f"{metric}:{name}"] = float(column[i])
+    return fleet
@@ -0,0 +1,57 @@
+"""
+Shared fixtures. The tool's modules live side by side in fetch_sql_inventory/
+and import each other by name, so that directory is put on sys.path. Fleets
+are synthetic (fake_gcp) and served offline through clients.set_backend.
+"""
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fetch_sql_inventory'))
+
+import api_scheduler
+import telemetry
+from api_scheduler import API_RATE_LIMITS, ApiScheduler, get_api_scheduler, set_api_scheduler
+from asset_search import search_projects_sql_instances
+from clients import set_backend
+from fake_gcp import FakeBackend, generate_fleet
+from sql_details import process_sql_instances
+
+@pytest.fixture(autouse=True)
+def isolated_globals(monkeypatch):
+    """Every test gets an unthrottled scheduler without backoff sleeps, the real APIs and no telemetry."""
+    previous = get_api_scheduler()
+    set_api_scheduler(ApiScheduler({api: (1e9, 1e9) for api in API_RATE_LIMITS}))
+    monkeypatch.setattr(api_scheduler, 'backoff_delay', lambda attempt: 0.0)
+    yield
+    set_backend(None)
+    set_api_scheduler(previous)
+    telemetry.disable()
+
+@pytest.fixture
+def fake_fleet():
+    """Install a FakeBackend over a synthetic fleet: fake_fleet(projects, per_project, **backend options)."""
+    def install(projects=2, per_project=5, seed=0, **options):
+        fleet = generate_fleet(projects, per_project, seed=seed)
+        backend = FakeBackend(fleet, seed=seed, **options)
+        set_backend(backend)
+        return fleet, backend
+    return install
+
+@pytest.fixture
+def collect():
+    """Collect inventory records of the installed fleet: collect(fleet, **process_sql_instances options)."""
+    def run(fleet, max_workers=4, **options):
+        with contextlib.redirect_stdout(io.StringIO()):
+            instances = list(search_projects_sql_instances(None, fleet.projects, max_workers=max_workers))
+            return process_sql_instances(instances, None, max_workers=max_workers, **options)
+    return run
+
+@pytest.fixture
+def fleet_records(fake_fleet, collect):
+    """Inventory records (with percentiles) of a 3 x 10 synthetic fleet."""
+    fleet, _ = fake_fleet(3, 10)
+    return collect(fleet, percentiles=True)
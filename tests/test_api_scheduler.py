@@ -0,0 +1,81 @@
+import socket
+import time
+
+import pytest
+
+from api_scheduler import (
+    ApiLimiter, ApiScheduler, TokenBucket, backoff_delay, call_api, get_api_scheduler, is_retryable, is_throttle
+)
+from fake_gcp import FakeApiError
+
+def _flaky(errors, result='ok'):
+    """A call failing with each of errors in turn, then returning result."""
+    remaining = list(errors)
+    def call():
+        if remaining:
+            raise remaining.pop(0)
+        return result
+    return call
+
+def test_error_classification():
+    assert is_throttle(FakeApiError(429, 'too many requests'))
+    assert is_throttle(FakeApiError(403, 'RESOURCE_EXHAUSTED: quota'))
+    assert is_retryable(FakeApiError(503, 'unavailable'))
+    assert is_retryable(socket.timeout())
+    assert not is_retryable(FakeApiError(403, 'permission denied'))
+    assert not is_retryable(FakeApiError(404, 'not found'))
+
+def test_backoff_is_jittered_and_capped():
+    for attempt in range(1, 12):
+        delays = [backoff_delay(attempt, base=1.0, cap=60.0) for _ in range(50)]
+        assert all(0 <= delay <= min(60.0, 2 ** attempt) for delay in delays)
+
+def test_transient_errors_are_retried():
+    call = _flaky([FakeApiError(503, 'unavailable'), FakeApiError(429, 'RESOURCE_EXHAUSTED')])
+    assert call_api('sqladmin', call) == 'ok'
+    
+    limiter = get_api_scheduler().limiter('sqladmin')
+    assert (limiter.calls, limiter.retries, limiter.throttles, limiter.failures) == (3, 2, 1, 0)
+
+def test_permanent_errors_are_not_retried():
+    with pytest.raises(FakeApiError):
+        call_api('sqladmin', _flaky([FakeApiError(403, 'permission denied')]))
+    
+    limiter = get_api_scheduler().limiter('sqladmin')
+    assert (limiter.calls, limiter.retries, limiter.failures) == (1, 0, 1)
+
+def test_retries_are_bounded():
+    scheduler = get_api_scheduler()
+    errors = [FakeApiError(500, 'internal')] * (scheduler.max_retries + 1)
+    with pytest.raises(FakeApiError):
+        scheduler.call('monitoring', _flaky(errors))
+    
+    limiter = scheduler.limiter('monitoring')
+    assert limiter.retries == scheduler.max_retries
+    assert limiter.calls == scheduler.max_retries + 1 and limiter.failures == 1
+
+def test_throttling_halves_concurrency_and_slows_the_bucket():
+    limiter = ApiLimiter('sqladmin', rate=10.0, burst=20, concurrency=8)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.concurrency == 4 and limiter.throttles == 1
+    assert limiter.bucket.rate < 10.0
+    
+    # Successes win the concurrency back additively
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release()
+    assert 4 < limiter.concurrency < 8
+
+def test_token_bucket_paces_after_the_burst():
+    bucket = TokenBucket(rate=200.0, burst=5)
+    start = time.monotonic()
+    waited = sum(bucket.acquire() for _ in range(15))
+    assert waited > 0
+    assert time.monotonic() - start >= 10 / 200.0 * 0.9
+
+def test_rate_limits_are_per_api():
+    scheduler = ApiScheduler({'sqladmin': (1.0, 1)})
+    assert scheduler.limiter('sqladmin').bucket.rate == 1.0
+    assert scheduler.limiter('unknown').bucket.rate == 10.0
+    assert scheduler.limiter('sqladmin') is scheduler.limiter('sqladmin')
@@ -0,0 +1,50 @@
+import pytest
+
+from api_scheduler import get_api_scheduler
+from asset_search import iter_sql_instances, search_projects_sql_instances, search_scope_sql_instances
+from clients import set_backend
+from fake_gcp import FakeApiError, FakeBackend, generate_fleet
+
+class _FailingLaterPages(FakeBackend):
+    """Serves the first page of every search, then fails like an unavailable backend."""
+    
+    def request(self, api, method, params, raw=None):
+        if params.get('page_token'):
+            self.simulate()
+            raise FakeApiError(503, 'backend unavailable')
+        return super().request(api, method, params, raw)
+
+def _asset_calls():
+    return get_api_scheduler().limiter('cloudasset').calls
+
+def test_every_page_is_a_scheduled_call(fake_fleet):
+    fleet, backend = fake_fleet(1, 25, page_size=10)
+    instances = list(iter_sql_instances(None, f"projects/{fleet.projects[0]}"))
+    assert [instance['name'] for instance in instances] == [resource['name'] for resource in fleet.instances[fleet.projects[0]]]
+    assert _asset_calls() == backend.requests == 3
+
+def test_scope_search_pages_through_the_scheduler(fake_fleet):
+    fleet, _ = fake_fleet(2, 25, page_size=10)
+    instances = list(search_scope_sql_instances(None, 'organizations/1234'))
+    assert len(instances) == 50
+    assert {instance['project_id'] for instance in instances} == set(fleet.projects)
+    assert _asset_calls() == 5
+
+def test_later_page_failure_raises():
+    fleet = generate_fleet(1, 25)
+    set_backend(_FailingLaterPages(fleet, page_size=10))
+    scheduler = get_api_scheduler()
+    with pytest.raises(FakeApiError):
+        list(search_projects_sql_instances(None, fleet.projects))
+    limiter = scheduler.limiter('cloudasset')
+    assert limiter.failures == 1
+    assert limiter.retries == scheduler.max_retries
+
+def test_inaccessible_project_is_skipped(fake_fleet):
+    fleet, _ = fake_fleet(1, 5, error_rate=1.0, error_code=403)
+    assert list(search_projects_sql_instances(None, fleet.projects)) == []
+
+def test_transient_first_page_failure_raises(fake_fleet):
+    fleet, _ = fake_fleet(1, 5, error_rate=1.0, error_code=503)
+    with pytest.raises(FakeApiError):
+        list(search_projects_sql_instances(None, fleet.projects))
@@ -0,0 +1,58 @@
+import numpy as np
+
+from consolidation_planner import first_fit_decreasing, plan_consolidation, write_consolidation_csv
+
+def _idle(name, project_id='synthetic-project-0000', cpu=0.03, **fields):
+    record = {
+        'project_id': project_id, 'name': name, 'location': 'us-central1', 'database_version': 'POSTGRES_15',
+        'availability_type': 'ZONAL', 'state': 'RUNNABLE', 'tier': 'db-custom-2-7680', 'disk_size_gb': 100,
+        'cpu_util': cpu, 'memory_util': 0.1, 'disk_util': 0.1, 'connections': 5
+    }
+    record.update(fields)
+    return record
+
+def test_first_fit_decreasing_packs_largest_first():
+    demand = np.array([[0.2], [0.6], [0.3], [0.5], [0.4]])
+    assignment, bins = first_fit_decreasing(demand, np.array([1.0]))
+    assert bins == 2
+    assert assignment[1] == assignment[4]  # 0.6 + 0.4
+    assert assignment[3] == assignment[2] == assignment[0]  # 0.5 + 0.3 + 0.2
+
+def test_first_fit_decreasing_respects_every_dimension():
+    rng = np.random.default_rng(3)
+    capacity = np.array([4.0, 16.0, 100.0])
+    demand = rng.random((200, 3)) * capacity / 3
+    assignment, bins = first_fit_decreasing(demand, capacity)
+    
+    assert sorted(set(assignment.tolist())) == list(range(bins))
+    for bin_index in range(bins):
+        assert (demand[assignment == bin_index].sum(axis=0) <= capacity + 1e-9).all()
+    assert bins >= np.ceil((demand.sum(axis=0) / capacity).max())
+
+def test_only_compatible_idle_instances_are_merged(tmp_path):
+    records = [_idle(f"idle-{i}") for i in range(4)] + [
+        _idle('busy', cpu=0.9),
+        _idle('stopped', state='STOPPED'),
+        _idle('elsewhere', project_id='synthetic-project-0001'),
+        _idle('mysql', database_version='MYSQL_8_0')
+    ]
+    plans = plan_consolidation(records)
+    
+    assert plans
+    merged = [name for plan in plans for name in plan.members]
+    assert sorted(merged) == sorted(set(merged))
+    assert set(merged) <= {f"idle-{i}" for i in range(4)}
+    assert all(plan.savings > 0 and len(plan.members) > 1 for plan in plans)
+    assert [plan.savings for plan in plans] == sorted((plan.savings for plan in plans), reverse=True)
+    
+    path = tmp_path / 'consolidation.csv'
+    write_consolidation_csv(plans, str(path))
+    assert len(path.read_text().splitlines()) == len(plans) + 1
+
+def test_consolidation_of_a_synthetic_fleet(fleet_records):
+    runnable = {(record['project_id'], record['name']): record for record in fleet_records if record['state'] == 'RUNNABLE'}
+    for plan in plan_consolidation(fleet_records):
+        members = [runnable[(plan.project_id, name)] for name in plan.members]
+        assert {(record['location'], record['database_version'], record['availability_type']) for record in members} == \
+            {(plan.region, plan.database_version, plan.availability_type)}
+        assert plan.consolidated_monthly_cost < plan.current_monthly_cost
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from api_scheduler import get_api_scheduler
+from clients import set_backend
+from fake_gcp import FakeApiError, FakeBackend, ReplayBackend, _open_cassette, _request_key, backend_from_spec, generate_fleet
+
+class _TapedBackend(FakeBackend):
+    """FakeBackend keeping its responses the way RecordingBackend keeps the real ones."""
+    
+    def __init__(self, fleet, **options):
+        super().__init__(fleet, **options)
+        self.cassette = {}
+    
+    def request(self, api, method, params, raw=None):
+        response = super().request(api, method, params, raw)
+        self.cassette[_request_key(api, method, params)] = response
+        return response
+
+def test_fleets_are_reproducible():
+    first, second = generate_fleet(3, 10, seed=4), generate_fleet(3, 10, seed=4)
+    assert first.instances == second.instances and first.profiles == second.profiles
+    assert generate_fleet(3, 10, seed=5).instances != first.instances
+    assert len(first) == 30
+
+def test_replay_serves_the_recorded_run(collect, tmp_path):
+    fleet = generate_fleet(2, 8, seed=1)
+    taped = _TapedBackend(fleet, page_size=3)
+    set_backend(taped)
+    recorded = collect(fleet, percentiles=True)
+    
+    path = str(tmp_path / 'cassette.json.gz')
+    with _open_cassette(path, 'w') as f:
+        json.dump(taped.cassette, f)
+    replay = ReplayBackend(path, page_size=3)
+    set_backend(replay)
+    assert collect(fleet, percentiles=True) == recorded
+    assert replay.requests == taped.requests
+    
+    with pytest.raises(FakeApiError):
+        replay.request('sqladmin', 'instances.get', {'project': 'unknown', 'instance': 'sql-00000'})
+
+def test_unpaged_time_series_cassettes_replay(collect, tmp_path):
+    fleet = generate_fleet(1, 6, seed=2)
+    taped = _TapedBackend(fleet)
+    set_backend(taped)
+    recorded = collect(fleet)
+    
+    # Older cassettes keep each time series response as one flat list
+    cassette = {
+        key: response['time_series'] if json.loads(key)[0] == 'monitoring' else response
+        for key, response in taped.cassette.items()
+    }
+    path = str(tmp_path / 'cassette.json')
+    with _open_cassette(path, 'w') as f:
+        json.dump(cassette, f)
+    set_backend(ReplayBackend(path))
+    assert collect(fleet) == recorded
+
+def test_backend_specs():
+    backend = backend_from_spec('fake:3x4,latency=0,errors=0.1,page_size=2,seed=7')
+    assert isinstance(backend, FakeBackend)
+    assert len(backend.fleet) == 12 and backend.page_size == 2 and backend.error_rate == 0.1
+    with pytest.raises(ValueError):
+        backend_from_spec('real:3x4')
+
+def test_injected_errors_are_retried(fake_fleet, collect):
+    fleet, backend = fake_fleet(2, 5, error_rate=0.4, error_code=429)
+    records = collect(fleet)
+    assert backend.injected_errors > 0
+    assert sum(limiter.retries for limiter in get_api_scheduler().stats().values()) == backend.injected_errors
+    assert all(record['tier'] for record in records)
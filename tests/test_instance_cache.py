@@ -0,0 +1,87 @@
+import json
+import logging
+
+import sql_details
+from instance_cache import InstanceCache
+from sql_details import METRIC_COLUMNS
+
+def _by_name(records):
+    return {(record['project_id'], record['name']): record for record in records}
+
+def test_cache_keeps_details_and_merges_fresh_metrics(fake_fleet, collect, tmp_path):
+    fleet, _ = fake_fleet(2, 5)
+    path = str(tmp_path / 'cache.json')
+    first = collect(fleet, cache=InstanceCache(path))
+    
+    entries = json.load(open(path))
+    assert len(entries) == sum(1 for record in first if record['tier'])
+    assert all(not METRIC_COLUMNS & set(entry['record']) for entry in entries.values())
+    
+    # The instances are unchanged but their load is not
+    for key, (cpu, memory, disk, connections) in fleet.profiles.items():
+        fleet.profiles[key] = (cpu / 2, memory, disk, connections + 7)
+    cache = InstanceCache(path)
+    second = collect(fleet, cache=cache)
+    
+    assert cache.hits == len(entries) and cache.misses == 0
+    assert [record['name'] for record in second] == [record['name'] for record in first]
+    assert [list(record) for record in second] == [list(record) for record in first]
+    before, after = _by_name(first), _by_name(second)
+    for key, (cpu, memory, disk, connections) in fleet.profiles.items():
+        assert after[key]['cpu_util'] == cpu and after[key]['connections'] == int(connections)
+        assert {field: value for field, value in after[key].items() if field not in METRIC_COLUMNS} == \
+            {field: value for field, value in before[key].items() if field not in METRIC_COLUMNS}
+
+def test_changed_instances_are_refetched(fake_fleet, collect, tmp_path):
+    fleet, _ = fake_fleet(1, 4)
+    path = str(tmp_path / 'cache.json')
+    collect(fleet, cache=InstanceCache(path))
+    
+    project_id = fleet.projects[0]
+    resource = fleet.instances[project_id][0]
+    resource['settings']['tier'] = 'db-custom-8-32768'
+    resource['settings']['settingsVersion'] = str(int(resource['settings']['settingsVersion']) + 1)
+    resource['etag'] = 'changed'
+    fleet.update_time = '2030-01-01T00:00:00Z'
+    removed = fleet.instances[project_id].pop()
+    
+    cache = InstanceCache(path)
+    records = _by_name(collect(fleet, cache=cache))
+    assert records[(project_id, resource['name'])]['tier'] == 'db-custom-8-32768'
+    assert cache.misses == 1 and cache.hits == 2 and cache.evicted == 1
+    assert f"{project_id}/{removed['name']}" not in json.load(open(path))
+
+def test_expired_entries_are_refetched(fake_fleet, collect, tmp_path):
+    fleet, _ = fake_fleet(1, 3)
+    path = str(tmp_path / 'cache.json')
+    collect(fleet, cache=InstanceCache(path))
+    cache = InstanceCache(path, ttl_seconds=-1)
+    collect(fleet, cache=cache)
+    assert cache.hits == 0 and cache.expired == 3
+
+def test_per_instance_details_keep_their_etag(fake_fleet, collect, tmp_path):
+    fleet, _ = fake_fleet(1, 3)
+    path = str(tmp_path / 'cache.json')
+    collect(fleet, cache=InstanceCache(path), batch_details=False)
+    assert all(entry['etag'] for entry in json.load(open(path)).values())
+    
+    # Asset updateTime moved but nothing SQL Admin reports did
+    fleet.update_time = '2030-01-01T00:00:00Z'
+    cache = InstanceCache(path)
+    collect(fleet, cache=cache, batch_details=False)
+    assert cache.hits == 3 and cache.misses == 0
+
+def test_failed_details_count_as_misses(fake_fleet, collect, tmp_path, monkeypatch):
+    fleet, _ = fake_fleet(1, 3)
+    monkeypatch.setattr(sql_details, 'get_cloud_sql_details', lambda credentials, project_id, instance_name: {})
+    cache = InstanceCache(str(tmp_path / 'cache.json'))
+    collect(fleet, cache=cache, batch_details=False)
+    assert cache.misses == 3 and cache.hits == 0
+
+def test_unreadable_cache_is_logged_and_ignored(tmp_path, caplog):
+    path = tmp_path / 'cache.json'
+    path.write_text('{not json')
+    with caplog.at_level(logging.WARNING, logger='instance_cache'):
+        cache = InstanceCache(str(path))
+    assert cache.entries == {}
+    assert f"Ignoring unreadable instance cache {path}" in caplog.text
@@ -0,0 +1,62 @@
+import pytest
+
+from inventory_db import InventoryDatabase, InventoryDatabaseSink, main
+from sql_details import INVENTORY_COLUMN_TYPES, INVENTORY_FIELDS
+
+def _store_run(path, records, batch_size=1000):
+    sink = InventoryDatabaseSink(path, INVENTORY_FIELDS, INVENTORY_COLUMN_TYPES, batch_size=batch_size)
+    for record in records:
+        sink.write(record)
+    sink.close()
+    return sink.run_id
+
+def test_runs_are_kept_as_snapshots(fleet_records, tmp_path):
+    path = str(tmp_path / 'inventory.db')
+    first = _store_run(path, fleet_records, batch_size=7)
+    second = _store_run(path, fleet_records[:5])
+    
+    database = InventoryDatabase(path)
+    try:
+        runs = database.runs()
+        assert [run[0] for run in runs] == [second, first]
+        assert [run[3] for run in runs] == [5, len(fleet_records)]
+        assert database.latest_run() == second
+        assert len(database.query(run_id='all')[1]) == len(fleet_records) + 5
+        assert len(list(database.iter_run(first))) == len(fleet_records)
+    finally:
+        database.close()
+
+def test_query_filters(fleet_records, tmp_path):
+    path = str(tmp_path / 'inventory.db')
+    _store_run(path, fleet_records)
+    database = InventoryDatabase(path)
+    try:
+        def names(*filters):
+            columns, rows = database.query(filters, columns=['project_id', 'name'])
+            return sorted(map(tuple, rows))
+        
+        def expected(predicate):
+            return sorted((record['project_id'], record['name']) for record in fleet_records if predicate(record))
+        
+        assert names('database_version=POSTGRES*') == expected(lambda record: record['database_version'].startswith('POSTGRES'))
+        assert names('database_version!=POSTGRES*', 'state=RUNNABLE') == \
+            expected(lambda record: not record['database_version'].startswith('POSTGRES') and record['state'] == 'RUNNABLE')
+        assert names('backup_enabled=yes') == expected(lambda record: record['backup_enabled'] == 'True')
+        assert names('disk_size_gb>=250') == expected(lambda record: (record['disk_size_gb'] or 0) >= 250)
+        assert names('cpu_util=null') == expected(lambda record: record['cpu_util'] is None)
+        
+        with pytest.raises(ValueError):
+            database.query(['no_such_column=1'])
+        with pytest.raises(ValueError):
+            database.query(['name'])
+    finally:
+        database.close()
+
+def test_command_line(fleet_records, tmp_path, capsys):
+    path = str(tmp_path / 'inventory.db')
+    _store_run(path, fleet_records)
+    assert main(['--db', path, 'runs']) == 0
+    assert main(['--db', path, 'query', '--where', 'state=RUNNABLE', '--columns', 'name,state']) == 0
+    output = capsys.readouterr().out
+    assert str(len(fleet_records)) in output
+    assert 'RUNNABLE' in output and 'STOPPED' not in output
@@ -0,0 +1,54 @@
+import csv
+import json
+
+import main
+
+def _rows(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+def _keys(rows):
+    return sorted((row['project_id'], row['name']) for row in rows)
+
+def _collect(*options):
+    return main.main(['collect', '--backend', 'fake:3x6,page_size=4', '--workers', '4', '--cache', '',
+                      '--metrics-store', '', '--db', 'inventory.db', *options])
+
+def test_collect_then_offline_commands(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    assert _collect('--csv', 'inventory.csv', '--trace', 'trace.json') == 0
+    rows = _rows('inventory.csv')
+    assert len(rows) == 18
+    assert any(row['cpu_util'] for row in rows) and all(row['cpu_util_p95'] for row in rows if row['cpu_util'])
+    assert any(path.name.startswith('inventory') and path.suffix == '.txt' for path in tmp_path.iterdir())
+    assert json.loads((tmp_path / 'trace.json').read_text())['traceEvents']
+    
+    for engine in ('columnar', 'rows'):
+        assert main.main(['optimize', 'inventory.csv', '--engine', engine, '--percentile', 'p95']) == 0
+    assert main.main(['table', 'inventory.csv']) == 0
+    assert main.main(['optimize', 'missing.csv']) == 1
+    
+    assert _collect('--csv', 'second.csv', '--no-optimize') == 0
+    capsys.readouterr()
+    assert main.main(['db', '--db', 'inventory.db', 'runs']) == 0
+    assert len(capsys.readouterr().out.splitlines()) == 2
+    assert main.main(['diff', 'inventory.csv', 'second.csv']) == 0
+    assert "0 added, 0 removed" in capsys.readouterr().err
+
+def test_shards_merge_into_the_full_inventory(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    assert _collect('--csv', 'full.csv', '--no-optimize') == 0
+    for index in range(2):
+        assert _collect('--csv', 'inventory.csv', '--shard-index', str(index), '--shard-count', '2') == 0
+    partials = [f"inventory.shard-{index}-of-2.csv" for index in range(2)]
+    shard_rows = [_rows(path) for path in partials]
+    assert all(shard_rows) and not set(_keys(shard_rows[0])) & set(_keys(shard_rows[1]))
+    
+    assert main.main(['merge', *partials, 'inventory.shard-0-of-2.csv', '--csv', 'merged.csv', '--db', '',
+                      '--no-optimize']) == 0
+    assert _keys(_rows('merged.csv')) == _keys(_rows('full.csv'))
+    assert f"({len(shard_rows[0])} duplicates dropped)" in capsys.readouterr().out
+
+def test_invalid_shard_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert _collect('--shard-index', '2', '--shard-count', '2') == 1
@@ -0,0 +1,22 @@
+import math
+import time
+
+from api_scheduler import get_api_scheduler
+from metrics import METRIC_TYPES, fetch_project_metric_points
+
+def _monitoring_calls():
+    return get_api_scheduler().limiter('monitoring').calls
+
+def _points(fleet):
+    end = int(time.time())
+    return fetch_project_metric_points(fleet.projects[0], None, METRIC_TYPES[0], end - 6 * 3600, end)
+
+def test_every_page_is_a_scheduled_call(fake_fleet):
+    fleet, _ = fake_fleet(1, 25)
+    unpaged = sorted(_points(fleet))
+    series = len({name for name, _, _ in unpaged})
+    assert _monitoring_calls() == 1 and series > 10
+    
+    fleet, backend = fake_fleet(1, 25, page_size=10)
+    assert sorted(_points(fleet)) == unpaged
+    assert _monitoring_calls() - 1 == backend.requests == math.ceil(series / 10)
@@ -0,0 +1,77 @@
+import sqlite3
+import time
+
+from metrics import BACKFILL_DAYS, update_project_metrics_store
+from metrics_store import FINE_ALIGNMENT_SECONDS, HOURLY_ALIGNMENT_SECONDS, SCHEMA_VERSION, MetricsStore
+
+def _spacing(store, table):
+    timestamps = [row[0] for row in store._conn.execute(f"SELECT ts FROM {table} WHERE instance_id = 1 AND metric_id = 1 ORDER BY ts")]
+    return {b - a for a, b in zip(timestamps, timestamps[1:])}, timestamps
+
+def test_store_keeps_hourly_points_and_a_fine_window(fake_fleet, tmp_path):
+    fleet, _ = fake_fleet(1, 3)
+    store = MetricsStore(str(tmp_path / 'metrics.db'))
+    project_id = fleet.projects[0]
+    
+    update_project_metrics_store(project_id, None, store)
+    spacing, timestamps = _spacing(store, 'points')
+    assert spacing == {HOURLY_ALIGNMENT_SECONDS}
+    assert timestamps[-1] - timestamps[0] > (BACKFILL_DAYS - 1) * 86400
+    assert store._conn.execute("SELECT COUNT(*) FROM fine_points").fetchone()[0] == 0
+    running = {name for project, name in fleet.profiles if project == project_id}
+    assert running and set(store.window_means(project_id, 7)) == running
+    
+    update_project_metrics_store(project_id, None, store, fine_window_days=7)
+    spacing, timestamps = _spacing(store, 'fine_points')
+    assert spacing == {FINE_ALIGNMENT_SECONDS}
+    assert timestamps[-1] - timestamps[0] <= 7 * 86400
+    series = store.window_series(project_id, 7)
+    assert {len(points) for points in series.values()} == {7 * 86400 // FINE_ALIGNMENT_SECONDS}
+    
+    # Points are keyed by integer ids, not repeated names
+    columns = {row[1]: row[2] for row in store._conn.execute("PRAGMA table_info(points)")}
+    assert columns == {'instance_id': 'INTEGER', 'metric_id': 'INTEGER', 'ts': 'INTEGER', 'value': 'REAL'}
+
+def test_store_fetches_only_new_points(fake_fleet, tmp_path):
+    fleet, backend = fake_fleet(1, 3)
+    store = MetricsStore(str(tmp_path / 'metrics.db'))
+    update_project_metrics_store(fleet.projects[0], None, store, fine_window_days=7)
+    stored = store._conn.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+    
+    update_project_metrics_store(fleet.projects[0], None, store, fine_window_days=7)
+    # Only the last (possibly partial) bucket of each series is fetched again
+    assert store._conn.execute("SELECT COUNT(*) FROM points").fetchone()[0] <= stored + 3 * 4
+    assert store.fetched_until(fleet.projects[0], 'database/cpu/utilization', FINE_ALIGNMENT_SECONDS) is not None
+
+def test_prune_keeps_fine_points_for_their_window(tmp_path):
+    store = MetricsStore(str(tmp_path / 'metrics.db'), retention_days=30, fine_retention_days=7)
+    now = int(time.time())
+    points = [('db-1', now - days * 86400, 0.5) for days in (1, 10, 40)]
+    store.add_points('p', 'database/cpu/utilization', points, now, HOURLY_ALIGNMENT_SECONDS)
+    store.add_points('p', 'database/cpu/utilization', points, now, FINE_ALIGNMENT_SECONDS)
+    
+    assert store.prune(now) == 1 + 2
+    assert len(store.window_series('p', 60, now)[('db-1', 'database/cpu/utilization')]) == 1
+    assert store.window_means('p', 60, now) == {'db-1': {'database/cpu/utilization': 0.5}}
+
+def test_store_of_an_older_layout_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'metrics.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE points (project_id TEXT, instance TEXT, metric TEXT, ts INTEGER, value REAL)")
+    conn.execute("INSERT INTO points VALUES ('p', 'db-1', 'database/cpu/utilization', 1, 0.5)")
+    conn.commit()
+    conn.close()
+    
+    store = MetricsStore(path)
+    assert store._conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert store.window_means('p', 10 ** 6) == {}
+    store.add_points('p', 'database/cpu/utilization', [('db-1', int(time.time()), 0.25)], int(time.time()))
+    assert store.window_means('p', 7) == {'db-1': {'database/cpu/utilization': 0.25}}
+
+def test_percentiles_come_from_the_store(fake_fleet, collect, tmp_path):
+    fleet, _ = fake_fleet(2, 4)
+    store = MetricsStore(str(tmp_path / 'metrics.db'))
+    records = collect(fleet, percentiles=True, metrics_store=store)
+    running = [record for record in records if record['state'] == 'RUNNABLE']
+    assert running and all(record['cpu_util_p95'] is not None for record in running)
+    assert store._conn.execute("SELECT COUNT(*) FROM fine_points").fetchone()[0] > 0
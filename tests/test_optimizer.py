@@ -0,0 +1,124 @@
+import pandas as pd
+
+from columnar_optimizer import analyze_inventory_frame, generate_optimization_report_frame
+from consolidation_planner import plan_consolidation
+from sql_details import build_instance_info
+from sql_optimizer import (
+    estimate_costs, generate_optimization_report, get_instance_recommendations, optimize_sql_inventory,
+    rightsize_instances
+)
+from tier_catalog import get_tier_catalog
+
+def _failed_instance():
+    """The record collection writes when an instance's details can't be fetched."""
+    return build_instance_info({'name': 'broken', 'project_id': 'synthetic-project-0000'}, {}, {})
+
+def _body(report):
+    """Report lines after the 'Generated on' timestamp."""
+    return report[2:]
+
+def test_failed_instance_is_skipped_not_fatal(fleet_records, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    records = fleet_records[:10] + [_failed_instance()] + fleet_records[10:]
+    
+    for engine in ('columnar', 'rows'):
+        assert optimize_sql_inventory(records, engine=engine, base_name=str(tmp_path / engine))
+    
+    report = generate_optimization_report(records)
+    assert _body(generate_optimization_report_frame(pd.DataFrame.from_records(records))) == _body(report)
+    position = report.index("Instance: broken (Project: synthetic-project-0000)")
+    assert report[position + 1] == "  Skipped: missing tier, disk_size_gb"
+    assert "Instances skipped (incomplete data, not in the totals): 1" in report
+
+def test_failed_instance_has_no_costs_or_advice(fleet_records):
+    failed = _failed_instance()
+    assert [rec.kind for rec in get_instance_recommendations(failed)] == ['incomplete']
+    assert estimate_costs(failed, []) is None
+    
+    records = fleet_records + [failed]
+    analysis = analyze_inventory_frame(pd.DataFrame.from_records(records))
+    assert analysis['current_total_cost'].isna().tolist() == [False] * len(fleet_records) + [True]
+    
+    rightsizing = rightsize_instances(records)
+    assert pd.isna(rightsizing.iloc[-1]['recommended_tier'])
+    assert all('broken' not in plan.members for plan in plan_consolidation(records))
+
+def test_engines_agree(fleet_records):
+    frame = pd.DataFrame.from_records(fleet_records)
+    for percentile in (None, 'p95'):
+        assert (_body(generate_optimization_report_frame(frame, percentile))
+                == _body(generate_optimization_report(fleet_records, percentile)))
+
+def _without(record, *columns):
+    """record with the given metrics (and their percentile variants) lacking data."""
+    record = dict(record)
+    for column in columns:
+        for key in [key for key in record if key == column or key.startswith(f"{column}_")]:
+            record[key] = None
+    return record
+
+def test_missing_metrics_skip_their_rules(fleet_records):
+    idle = dict(fleet_records[0], state='RUNNABLE', cpu_util=0.0, memory_util=0.1, disk_util=0.1, connections=0)
+    assert 'unused' in [rec.kind for rec in get_instance_recommendations(idle)]
+    
+    no_connections = _without(idle, 'connections')
+    kinds = [rec.kind for rec in get_instance_recommendations(no_connections)]
+    assert 'unused' not in kinds and 'low_connections' not in kinds
+    assert get_instance_recommendations(no_connections)[-1].note == 'connections'
+    
+    nothing = _without(idle, 'cpu_util', 'memory_util', 'disk_util', 'connections')
+    for percentile in (None, 'p95'):
+        recommendations = get_instance_recommendations(nothing, percentile)
+        assert [rec.kind for rec in recommendations] == ['missing_metrics']
+        assert recommendations[0].note == 'cpu_util, memory_util, disk_util, connections'
+    costs = estimate_costs(nothing, get_instance_recommendations(nothing))
+    assert costs.savings == 0 and costs.current_total > 0
+
+def test_missing_metrics_agree_across_engines(fleet_records):
+    records = [
+        _without(record, *columns) for record, columns in zip(fleet_records, [
+            ('cpu_util',), ('memory_util', 'disk_util'), ('connections',),
+            ('cpu_util', 'memory_util', 'disk_util', 'connections'), ()
+        ] * 6)
+    ]
+    frame = pd.DataFrame.from_records(records)
+    for percentile in (None, 'p95'):
+        analysis = analyze_inventory_frame(frame, percentile)
+        assert not analysis['row_fallback'].any()
+        assert ([[str(rec) for rec in recs] for recs in analysis['recommendations']]
+                == [[str(rec) for rec in get_instance_recommendations(record, percentile)] for record in records])
+        assert (_body(generate_optimization_report_frame(frame, percentile))
+                == _body(generate_optimization_report(records, percentile)))
+    assert "    - CPU: n/a avg. utilization" in generate_optimization_report(records)
+    
+    unmeasured = [i for i, record in enumerate(records) if record['cpu_util'] is None or record['memory_util'] is None]
+    rightsizing = rightsize_instances(records)
+    assert rightsizing.iloc[unmeasured]['recommended_tier'].isna().all()
+    members = {name for plan in plan_consolidation(records) for name in plan.members}
+    assert not members & {records[i]['name'] for i in unmeasured}
+
+def test_failed_metric_queries_are_not_zero(fake_fleet, collect):
+    fleet, _ = fake_fleet(4, 10, error_rate=0.3, error_code=403)
+    records = collect(fleet)
+    unmeasured = [record for record in records
+                  if record['tier'] and record['state'] == 'RUNNABLE' and record['cpu_util'] is None]
+    assert unmeasured
+    for record in unmeasured:
+        kinds = [rec.kind for rec in get_instance_recommendations(record)]
+        assert 'missing_metrics' in kinds
+        assert not {'unused', 'cpu_very_low_reduce', 'cpu_shared_core', 'appropriately_sized'} & set(kinds)
+
+def test_cpu_reduction_snaps_to_a_smaller_catalog_tier(fleet_records):
+    catalog = get_tier_catalog()
+    assert [spec.name for spec in catalog.smaller_tiers('db-highmem-4')[:3]] == \
+        ['db-standard-4', 'db-highmem-2', 'db-standard-2']
+    assert all(spec.vcpus <= 6 and spec.memory_mb <= 8192 for spec in catalog.smaller_tiers('db-custom-6-8192'))
+    assert catalog.reduced_vcpus('db-standard-96') == 32 and catalog.reduced_vcpus('db-custom-6-8192') == 2
+    
+    idle = [dict(record, state='RUNNABLE', tier=tier, cpu_util=0.01, cpu_util_p95=0.01)
+            for record, tier in zip(fleet_records, ('db-standard-8', 'db-standard-96', 'db-custom-6-8192'))]
+    for record, target in zip(idle, (4, 32, 2)):
+        reduce = [rec for rec in get_instance_recommendations(record) if rec.kind == 'cpu_very_low_reduce']
+        assert reduce[0].target_vcpus == target
+    assert _body(generate_optimization_report_frame(pd.DataFrame.from_records(idle))) == \
+        _body(generate_optimization_report(idle))
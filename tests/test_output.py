@@ -0,0 +1,63 @@
+import contextlib
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from output import CsvSink, JsonLinesSink, convert_value, format_csv_value, open_sink, save_to_csv, tee_to_sinks
+from snapshot_diff import iter_snapshot
+from sql_details import INVENTORY_COLUMN_TYPES, INVENTORY_FIELDS
+
+def test_value_conversion():
+    assert format_csv_value(0.123456) == '0.1235'
+    assert format_csv_value(None) == ''
+    assert format_csv_value(3) == 3
+    assert convert_value('12', 'int64') == 12
+    assert convert_value('', 'float64') is None
+    assert convert_value(float('nan'), 'float64') is None
+    assert convert_value('abc', 'int64') is None
+    assert convert_value('Yes', 'bool') is True and convert_value('False', 'bool') is False
+    assert convert_value('2024-05-01T12:00:00Z', 'timestamp') == datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+def test_csv_output_streams_a_generator(fleet_records, tmp_path):
+    path = str(tmp_path / 'inventory.csv')
+    with contextlib.redirect_stdout(io.StringIO()):
+        count = save_to_csv((record for record in fleet_records), path, fieldnames=INVENTORY_FIELDS)
+    assert count == len(fleet_records)
+    
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == INVENTORY_FIELDS
+    assert [row['name'] for row in rows] == [record['name'] for record in fleet_records]
+    for row, record in zip(rows, fleet_records):
+        assert row['cpu_util'] == ('' if record['cpu_util'] is None else format(record['cpu_util'], '.4f'))
+
+def test_json_lines_keep_types(fleet_records, tmp_path):
+    for name in ('inventory.jsonl', 'inventory.jsonl.gz'):
+        path = str(tmp_path / name)
+        sink = open_sink(path, INVENTORY_FIELDS, INVENTORY_COLUMN_TYPES)
+        assert isinstance(sink, JsonLinesSink)
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert list(tee_to_sinks(fleet_records, [sink])) == fleet_records
+        assert list(iter_snapshot(path)) == fleet_records
+    
+    with gzip.open(str(tmp_path / 'inventory.jsonl.gz'), 'rt') as f:
+        assert json.loads(f.readline()) == fleet_records[0]
+
+def test_sinks_by_extension(tmp_path):
+    assert isinstance(open_sink(str(tmp_path / 'inventory.CSV'), ['name']), CsvSink)
+    with pytest.raises(ValueError):
+        open_sink(str(tmp_path / 'inventory.xlsx'), ['name'])
+
+def test_parquet_round_trip(fleet_records, tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'inventory.parquet')
+    sink = open_sink(path, INVENTORY_FIELDS, INVENTORY_COLUMN_TYPES)
+    with contextlib.redirect_stdout(io.StringIO()):
+        list(tee_to_sinks(fleet_records, [sink]))
+    records = list(iter_snapshot(path))
+    assert [record['name'] for record in records] == [record['name'] for record in fleet_records]
+    assert [record['disk_size_gb'] for record in records] == [record['disk_size_gb'] for record in fleet_records]
@@ -0,0 +1,67 @@
+import contextlib
+import io
+import logging
+
+from output import save_to_csv
+from sharding import _run_shard, merge_partials, project_shard, shard_path, shard_projects
+from sql_details import INVENTORY_COLUMN_TYPES, INVENTORY_FIELDS
+
+def _logging_collect(args):
+    print(f"collecting shard {args.shard_index}")
+    logging.getLogger('sql_details').warning("shard %d: metrics unavailable", args.shard_index)
+    return 0
+
+def test_shard_logging_goes_to_the_shard_log(tmp_path, capsys):
+    terminal = io.StringIO()
+    handler = logging.StreamHandler(terminal)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        log_path = tmp_path / 'inventory.shard-1-of-2.log'
+        assert _run_shard(_logging_collect, {'shard_index': 1, 'shard_count': 2}, str(log_path)) == 0
+        assert handler in root.handlers
+    finally:
+        root.removeHandler(handler)
+    
+    log = log_path.read_text()
+    assert "collecting shard 1" in log
+    assert "shard 1: metrics unavailable" in log
+    assert terminal.getvalue() == ''
+    assert capsys.readouterr() == ('', '')
+
+def test_projects_split_stably_into_disjoint_shards():
+    projects = [f"project-{i}" for i in range(200)]
+    shards = [shard_projects(projects, index, 4) for index in range(4)]
+    
+    assert sorted(sum(shards, [])) == sorted(projects)
+    assert all(shards)
+    assert all(project_shard(project_id, 4) == index for index, shard in enumerate(shards) for project_id in shard)
+    assert shard_projects(projects, 0, 1) == projects
+
+def test_shard_paths():
+    assert shard_path('inventory.csv', 0, 4) == 'inventory.shard-0-of-4.csv'
+    assert shard_path('out/inventory.jsonl.gz', 3, 4) == 'out/inventory.shard-3-of-4.jsonl.gz'
+    assert shard_path('cache', 1, 2) == 'cache.shard-1-of-2'
+    assert shard_path('', 1, 2) == ''
+
+def test_merged_partials_are_deduplicated_and_typed(fleet_records, tmp_path):
+    paths = []
+    for index in range(2):
+        path = str(tmp_path / shard_path('inventory.csv', index, 2))
+        records = [record for record in fleet_records if project_shard(record['project_id'], 2) == index]
+        with contextlib.redirect_stdout(io.StringIO()):
+            save_to_csv(records + fleet_records[:3], path, fieldnames=INVENTORY_FIELDS)
+        paths.append(path)
+    
+    stats = {}
+    merged = list(merge_partials(paths, INVENTORY_COLUMN_TYPES, stats))
+    assert stats == {'read': len(fleet_records) + 6, 'duplicates': 6}
+    assert sorted((record['project_id'], record['name']) for record in merged) == \
+        sorted((record['project_id'], record['name']) for record in fleet_records)
+    
+    original = {(record['project_id'], record['name']): record for record in fleet_records}
+    for record in merged:
+        expected = original[(record['project_id'], record['name'])]
+        assert record['disk_size_gb'] == expected['disk_size_gb']
+        if expected['cpu_util'] is not None:
+            assert abs(record['cpu_util'] - expected['cpu_util']) < 1e-4
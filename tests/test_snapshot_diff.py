@@ -0,0 +1,97 @@
+import contextlib
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from inventory_db import InventoryDatabase
+from output import save_to_csv, open_sink, tee_to_sinks
+from snapshot_diff import diff_snapshots, iter_snapshot, main
+from sql_details import INVENTORY_COLUMN_TYPES, INVENTORY_FIELDS
+
+def _changes(old, new, **options):
+    return {(change.change, change.name): change for change in diff_snapshots(old, new, **options)}
+
+def _next_run(records):
+    """records as a later run sees them: one resized, one removed, one added and new metrics for all."""
+    records = [dict(record, cpu_util=0.5) for record in records[1:]]
+    records[0] = dict(records[0], tier='db-custom-8-30720')
+    records.append(dict(records[-1], name='sql-new'))
+    return records
+
+def test_added_removed_and_resized(fleet_records):
+    old = fleet_records
+    new = _next_run(old)
+    changes = _changes(old, new)
+    
+    assert set(changes) == {('removed', old[0]['name']), ('modified', new[0]['name']), ('added', 'sql-new')}
+    resized = changes[('modified', new[0]['name'])]
+    assert resized.resized and set(resized.fields) == {'tier'}
+    assert resized.to_dict()['fields']['tier'] == {'old': old[1]['tier'], 'new': 'db-custom-8-30720'}
+
+def test_metrics_are_compared_only_on_request(fleet_records):
+    new = [dict(record, cpu_util=0.5) for record in fleet_records]
+    assert not _changes(fleet_records, new)
+    assert all(set(change.fields) == {'cpu_util'} for change in _changes(fleet_records, new, ignore=frozenset()).values())
+
+def test_csv_and_typed_records_compare_equal(fleet_records, tmp_path):
+    path = str(tmp_path / 'inventory.csv')
+    with contextlib.redirect_stdout(io.StringIO()):
+        save_to_csv(fleet_records, path, fieldnames=INVENTORY_FIELDS)
+    assert not _changes(iter_snapshot(path), fleet_records, ignore=frozenset())
+    assert not _changes(fleet_records, iter_snapshot(path), ignore=frozenset())
+
+def _write(records, path):
+    sink = open_sink(path, INVENTORY_FIELDS, INVENTORY_COLUMN_TYPES)
+    for _ in tee_to_sinks(records, [sink]):
+        pass
+
+def test_typed_values_match_their_text(fleet_records):
+    typed = [dict(record, create_time=datetime(2024, 7, 23, 8, 50, 47, tzinfo=timezone.utc), backup_enabled=True)
+             for record in fleet_records]
+    csv_text = [dict(record, create_time='2024-07-23T08:50:47.000000Z', backup_enabled='True') for record in fleet_records]
+    database_text = [dict(record, create_time='2024-07-23T08:50:47+00:00') for record in typed]
+    assert not _changes(typed, csv_text, ignore=frozenset())
+    assert not _changes(database_text, csv_text, ignore=frozenset())
+    
+    later = [dict(record, create_time='2024-07-23T08:50:48Z', backup_enabled='False') for record in csv_text[:1]]
+    changes = _changes(typed[:1], later)
+    assert set(changes[('modified', later[0]['name'])].fields) == {'create_time', 'backup_enabled'}
+
+def test_csv_and_parquet_copies_compare_equal(fleet_records, tmp_path):
+    pytest.importorskip('pyarrow')
+    paths = [str(tmp_path / name) for name in ('inventory.csv', 'inventory.parquet')]
+    for path in paths:
+        _write(fleet_records, path)
+    assert not _changes(iter_snapshot(paths[0]), iter_snapshot(paths[1]), ignore=frozenset())
+    assert not _changes(iter_snapshot(paths[1]), iter_snapshot(paths[0]), ignore=frozenset())
+
+def test_database_run_matches_its_csv(fleet_records, tmp_path):
+    _write(fleet_records, str(tmp_path / 'inventory.csv'))
+    _write(fleet_records, str(tmp_path / 'inventory.db'))
+    database = InventoryDatabase(str(tmp_path / 'inventory.db'))
+    try:
+        run = database.runs()[0][0]
+        assert not _changes(database.iter_run(run), iter_snapshot(str(tmp_path / 'inventory.csv')), ignore=frozenset())
+    finally:
+        database.close()
+
+def test_database_runs_diff(fleet_records, tmp_path, capsys):
+    path = str(tmp_path / 'inventory.db')
+    for records in (fleet_records, _next_run(fleet_records)):
+        _write(records, path)
+    
+    output = tmp_path / 'changes.jsonl'
+    assert main(['--db', path, '--output', str(output)]) == 0
+    changes = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(change['change'] for change in changes) == ['added', 'modified', 'removed']
+    assert "1 added, 1 removed, 1 modified (1 resized)" in capsys.readouterr().err
+    
+    database = InventoryDatabase(path)
+    try:
+        old_run = min(run[0] for run in database.runs())
+        assert sorted((record['project_id'], record['name']) for record in database.iter_run(old_run)) == \
+            sorted((record['project_id'], record['name']) for record in fleet_records)
+    finally:
+        database.close()
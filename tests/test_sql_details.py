@@ -0,0 +1,55 @@
+import pytest
+
+import sql_details
+from sql_details import INVENTORY_FIELDS, METRIC_COLUMNS
+
+def _details(records):
+    return [{field: value for field, value in record.items() if field not in METRIC_COLUMNS} for record in records]
+
+@pytest.mark.parametrize('max_workers, chunk_size', [(1, 500), (8, 7)])
+def test_records_follow_the_search_order(fake_fleet, collect, max_workers, chunk_size):
+    fleet, _ = fake_fleet(3, 12)
+    records = collect(fleet, max_workers=max_workers, chunk_size=chunk_size)
+    
+    expected = [(project_id, resource['name']) for project_id in fleet.projects for resource in fleet.instances[project_id]]
+    assert [(record['project_id'], record['name']) for record in records] == expected
+    assert all(list(record) == INVENTORY_FIELDS for record in records)
+
+def test_batched_and_per_instance_collection_agree(fake_fleet, collect):
+    fleet, backend = fake_fleet(2, 6)
+    batched = collect(fleet)
+    batched_requests = backend.requests
+    single = collect(fleet, batch_metrics=False, batch_details=False)
+    
+    assert _details(single) == _details(batched)
+    assert [record['cpu_util'] is None for record in single] == [record['cpu_util'] is None for record in batched]
+    assert backend.requests - batched_requests > batched_requests
+
+def test_records_carry_the_fleet_settings(fake_fleet, collect):
+    fleet, _ = fake_fleet(1, 8)
+    resources = {resource['name']: resource for resource in fleet.instances[fleet.projects[0]]}
+    for record in collect(fleet, percentiles=True):
+        resource = resources[record['name']]
+        assert record['tier'] == resource['settings']['tier']
+        assert record['database_version'] == resource['databaseVersion']
+        assert record['disk_size_gb'] == int(resource['settings']['dataDiskSizeGb'])
+        if (record['project_id'], record['name']) in fleet.profiles:
+            assert record['cpu_util_p50'] <= record['cpu_util_p95'] <= record['cpu_util_p99'] <= record['cpu_util_max']
+        else:
+            assert record['cpu_util'] is None
+
+def test_one_thread_pool_serves_the_whole_run(fake_fleet, collect, monkeypatch):
+    pools = []
+    
+    class CountingExecutor(sql_details.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            pools.append(self)
+    
+    monkeypatch.setattr(sql_details, 'ThreadPoolExecutor', CountingExecutor)
+    fleet, _ = fake_fleet(4, 6)
+    collect(fleet, max_workers=4, chunk_size=5, percentiles=True)
+    assert len(pools) == 1 and pools[0]._shutdown
+    
+    collect(fleet, max_workers=1)
+    assert len(pools) == 1
@@ -0,0 +1,40 @@
+import json
+
+import telemetry
+from api_scheduler import call_api
+from telemetry import Tracer
+
+def test_disabled_telemetry_is_a_no_op():
+    assert telemetry.get_tracer() is None
+    with telemetry.span('collect'):
+        telemetry.count('details.failed_instances')
+    assert telemetry.get_tracer() is None
+
+def test_latency_histogram():
+    tracer = Tracer()
+    for milliseconds in [3] * 90 + [150] * 9 + [4000]:
+        tracer.record_rpc('sqladmin', 'instances.get', 0.0, milliseconds / 1000)
+    tracer.record_rpc('sqladmin', 'instances.get', 0.0, 0.001, error=True)
+    
+    stats = tracer.rpcs[('sqladmin', 'instances.get')].to_dict()
+    assert stats['count'] == 101 and stats['errors'] == 1
+    assert stats['p50_ms'] == 5 and stats['p95_ms'] == 200 and stats['p99_ms'] == 200
+    assert abs(stats['max_ms'] - 4000) < 1e-6
+
+def test_trace_of_a_collection(fake_fleet, collect, tmp_path, capsys):
+    tracer = telemetry.enable()
+    fleet, _ = fake_fleet(2, 5)
+    collect(fleet)
+    call_api('sqladmin', lambda: None, method='ping')
+    
+    assert {'details', 'metrics', 'build_records'} <= set(tracer.phases)
+    assert tracer.rpcs[('sqladmin', 'ping')].count == 1
+    assert any(api == 'monitoring' for api, _ in tracer.rpcs)
+    
+    path = tmp_path / 'trace.json'
+    tracer.export(str(path))
+    document = json.loads(path.read_text())
+    assert all(event['ph'] == 'X' and event['dur'] >= 0 for event in document['traceEvents'])
+    assert document['otherData']['rpcs']['sqladmin.ping']['count'] == 1
+    tracer.print_summary()
+    assert "=== Run Telemetry ===" in capsys.readouterr().out
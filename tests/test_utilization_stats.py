@@ -0,0 +1,42 @@
+import numpy as np
+
+from utilization_stats import PERCENTILES, compute_fleet_utilization, series_stats
+
+def test_stats_match_numpy_on_ragged_rows():
+    rng = np.random.default_rng(1)
+    rows = [rng.random(length) for length in (1, 2, 7, 288, 2016)]
+    matrix = np.full((len(rows), 2016), np.nan)
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = row
+    counts = np.array([len(row) for row in rows])
+    
+    stats = series_stats(matrix, counts)
+    for i, row in enumerate(rows):
+        assert np.isclose(stats['mean'][i], row.mean())
+        assert np.isclose(stats['max'][i], row.max())
+        for q in PERCENTILES:
+            assert np.isclose(stats[f"p{q}"][i], np.percentile(row, q))
+
+def test_empty_rows_are_nan():
+    matrix = np.array([[0.5, np.nan], [np.nan, np.nan]])
+    stats = series_stats(matrix, np.array([1, 0]))
+    assert all(column[0] == 0.5 and np.isnan(column[1]) for column in stats.values())
+    
+    stats = series_stats(np.empty((2, 0)), np.array([0, 0]))
+    assert all(np.isnan(column).all() for column in stats.values())
+
+def test_fleet_utilization_by_instance():
+    series = {
+        ('project-a', 'sql-1', 'cpu_util'): [0.1, 0.2, 0.3],
+        ('project-a', 'sql-1', 'memory_util'): [0.5],
+        ('project-b', 'sql-1', 'cpu_util'): [0.9, 0.7],
+        ('project-b', 'sql-2', 'cpu_util'): []
+    }
+    fleet = compute_fleet_utilization(series)
+    
+    assert set(fleet) == {('project-a', 'sql-1'), ('project-b', 'sql-1')}
+    assert np.isclose(fleet[('project-a', 'sql-1')]['cpu_util'], 0.2)
+    assert np.isclose(fleet[('project-a', 'sql-1')]['cpu_util:p50'], 0.2)
+    assert np.isclose(fleet[('project-a', 'sql-1')]['memory_util:max'], 0.5)
+    assert np.isclose(fleet[('project-b', 'sql-1')]['cpu_util:p95'], np.percentile([0.9, 0.7], 95))
+    assert compute_fleet_utilization({}) == {}